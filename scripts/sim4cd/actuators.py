@@ -5,7 +5,6 @@
 # Forces and torques generated by an actuator (ESC/motor/propeller)
 
 from math import pi, sin
-import time
 import numpy as np
 import math_utils as MU
 import polynomial as POLY
@@ -36,9 +35,6 @@ class prop_actuator:
         self.cmd = 0 # PWM command [0.0, 1.0] for the actuator
         self.motor_kv = self.volt_to_speed[1]/(2*pi)*60 # Kv of the actuators motor TODO: Not used, remove?
 
-        # Initialize the last time variable for time step computation
-        self.last_time = time.time()
-
         # Define polynomials for the actuator curves
         # self.poly_volt_to_speed = POLY.polynomial([0,self.volt_to_speed,0])
         # self.poly_speed_to_thrust = POLY.polynomial([0,self.speed_to_thrust,0])
@@ -59,30 +55,28 @@ class prop_actuator:
             act_id (int): Id of the actuator whose parameters will be loaded
         """
 
-        self.spin = params.get_parameter_value(f"ACT{act_id}_SPIN")
-        self.time_cte = params.get_parameter_value(f"ACT{act_id}_TIME_CTE")
-        self.Jr = params.get_parameter_value(f"ACT{act_id}_MOI_ROTOR")
-        self.volt_to_speed = []
-        self.speed_to_thrust = []
-        self.speed_to_torque = []
-        self.torque_to_current = []
-        for i in [0,1,2]:
-            self.volt_to_speed.append( params.get_parameter_value(f"ACT{act_id}_VOLT2SPEED_{i}") )
-            self.speed_to_thrust.append( params.get_parameter_value(f"ACT{act_id}_SPEED2THRUST_{i}") )
-            self.speed_to_torque.append( -self.spin*params.get_parameter_value(f"ACT{act_id}_SPEED2TORQUE_{i}") )
-            self.torque_to_current.append( params.get_parameter_value(f"ACT{act_id}_TORQUE2AMPS_{i}") )
+        act = params.snapshot().actuators
+        self.spin = float(act.spin[act_id])
+        self.time_cte = float(act.time_cte[act_id])
+        self.Jr = float(act.moi_rotor[act_id])
+        # Polynomial coefficients (lists of 3 values)
+        self.volt_to_speed = act.volt_to_speed[act_id].tolist()
+        self.speed_to_thrust = act.speed_to_thrust[act_id].tolist()
+        self.speed_to_torque = (-self.spin*act.speed_to_torque[act_id]).tolist()
+        self.torque_to_current = act.torque_to_current[act_id].tolist()
 
 
         return
 
 
-    def actuator_sim_step(self, cmd_, V_):
+    def actuator_sim_step(self, cmd_, V_, dt):
         """
         Perform the dynamic integration step for the actuator
 
         Parameters:
             cmd_ (float): PWM value (from 0 to 1) for the actuator
             V_ (float): Voltage in the output of the battery [V]
+            dt (float): Time step given by the simulation clock [s]
 
         Returns:
             self.force_map() (float): Force the actuator is producing on the vehicle [N]
@@ -94,14 +88,6 @@ class prop_actuator:
         # Set the received battery voltage
         self.bat_voltage = V_
 
-        # Compute the simulation time step
-        time_now = time.time()
-        dt = time_now-self.last_time
-        self.last_time = time_now
-        # Reset actuator it it was not receiving commands for a while TODO: check necessity
-        if(dt > 1):
-            self.reset()
-        
         # Compute the new angular position given the current speed
         self.position = self.position + self.speed*dt
         # Compute the new speed given the first order dynamics
@@ -314,4 +300,186 @@ class prop_actuator:
         # Compute the (3-axis) noise on the angular velocity
         current_noise = noise_amplitude*noise_phase*gyro_noise_distribution
 
-        return current_noise # [rad/s]
\ No newline at end of file
+        return current_noise # [rad/s]
+
+
+class actuator_bank:
+    """
+    Class that represents the whole set of propulsion actuators of a vehicle
+    It simulates the same model of prop_actuator for all of the actuators at once, with the states stored as arrays of shape (n_act,)
+    """
+
+    def __init__(self, params, positions, directions):
+        """
+        Constructor for the actuator_bank class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object
+            positions (numpy.ndarray): Positions of the actuators in the body frame, shape (n_act,3) [m]
+            directions (numpy.ndarray): Unit directions of propulsion of the actuators in the body frame, shape (n_act,3)
+        """
+
+        # Number of actuators
+        self.n_act = positions.shape[0]
+
+        # Load model parameters
+        self.load_parameters(params)
+
+        # Geometry of the actuators
+        self.set_geometry(positions, directions)
+
+        self.speed = np.zeros(self.n_act) # rotation speed # [rad/s]
+        self.position = np.zeros(self.n_act) # angular position # [rad]
+        self.current = np.zeros(self.n_act) # current being consumed by each actuator # [A]
+        self.force = np.zeros(self.n_act) # force being produced by each actuator # [N]
+        self.torque = np.zeros(self.n_act) # torque being produced by each actuator # [Nm]
+        self.cmd = np.zeros(self.n_act) # PWM command [0.0, 1.0] for each actuator
+
+        # Asymmetry vectors of the noise induced on the different axis (see prop_actuator)
+        self.acc_noise_distribution = MU.normalize(np.array([0.9, 1.2, 1.1]))
+        self.gyro_noise_distribution = MU.normalize(np.array([1.5, 0.6, 0.75]))
+
+
+    def load_parameters(self, params):
+        """
+        Load parameters for all of the actuators and store them in arrays (one element or row per actuator)
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
+        """
+
+        # Rows of the first n_act actuators of the snapshot (copied, so the bank owns its arrays)
+        act = params.snapshot().actuators
+        n = self.n_act
+        self.spin = act.spin[0:n].copy()
+        self.time_cte = act.time_cte[0:n].copy()
+        self.Jr = act.moi_rotor[0:n].copy()
+        # Polynomial coefficients, shape (n_act,3)
+        self.volt_to_speed = act.volt_to_speed[0:n].copy()
+        self.speed_to_thrust = act.speed_to_thrust[0:n].copy()
+        self.speed_to_torque = -self.spin[:,None]*act.speed_to_torque[0:n]
+        self.torque_to_current = act.torque_to_current[0:n].copy()
+
+
+    def set_geometry(self, positions, directions):
+        """
+        Set the positions and directions of the actuators
+
+        Parameters:
+            positions (numpy.ndarray): Positions of the actuators in the body frame, shape (n_act,3) [m]
+            directions (numpy.ndarray): Unit directions of propulsion of the actuators in the body frame, shape (n_act,3)
+        """
+
+        self.directions = directions
+        # Pre-compute the moment arms that map the forces of the actuators to torques on the body
+        self.moment_arms = np.cross(positions, directions)
+
+
+    def sim_step(self, cmds_, V_, dt):
+        """
+        Perform the dynamic integration step for all of the actuators
+
+        Parameters:
+            cmds_ (numpy.ndarray): PWM values (from 0 to 1) for the actuators, shape (n_act,)
+            V_ (float): Voltage in the output of the battery [V]
+            dt (float): Time step given by the simulation clock [s]
+
+        Returns:
+            total_force (numpy.ndarray): Collective force the actuators apply to the vehicle body [N]
+            total_torque (numpy.ndarray): Collective torque the actuators apply to the vehicle body [Nm]
+        """
+
+        # Set the received commands
+        self.cmd = cmds_
+
+        # Compute the new angular positions given the current speeds
+        self.position = self.position + self.speed*dt
+        # Compute the new speeds given the first order dynamics towards the stabilization speeds
+        speed_ss = POLY.eval_rows(self.volt_to_speed, self.cmd*V_)
+        self.speed = ((self.time_cte-dt)/self.time_cte)*self.speed + (dt/self.time_cte)*speed_ss
+
+        # Compute the forces, torques and currents of the actuators
+        self.force = POLY.eval_rows(self.speed_to_thrust, self.speed)
+        self.torque = POLY.eval_rows(self.speed_to_torque, self.speed)
+        self.current = POLY.eval_rows(self.torque_to_current, np.abs(self.torque))
+
+        # Collective force and torque (the forces act along the directions and through the moment arms)
+        total_force = self.force@self.directions
+        total_torque = self.force@self.moment_arms + self.torque@self.directions
+
+        return total_force, total_torque
+
+
+    def reset(self):
+        """
+        Reset the actuators by setting their rotational speeds to 0
+        """
+
+        self.speed = np.zeros(self.n_act)
+
+
+    def get_total_current(self):
+        """
+        Get the combined current used by all of the actuators
+
+        Returns:
+            (float): Total current being consumed by all of the actuators [A]
+        """
+
+        return self.current.sum()
+
+
+    def gyroscopic_torque(self, omega):
+        """
+        Compute the gyroscopic effect due to the spinning actuators as an equivalent torque for a rigid body
+
+        Parameters:
+            omega (numpy.ndarray): Vehicle angular velocity (3-axis) in the body frame [rad/s]
+
+        Returns:
+            Tg (numpy.ndarray): Torque in the body frame that represents the gyroscopic effect [Nm]
+        """
+
+        # Total signed angular momentum of the actuators
+        L = (self.spin*self.speed*self.Jr).sum()
+
+        # Same as prop_actuator/vehicle_geometry: the momentum is taken along the direction of the first actuator
+        Tg = -L*np.cross(omega, self.directions[0])
+
+        return Tg
+
+
+    def noise_phase_sum(self):
+        """
+        Compute the sum of the speed weighted phases of the noise the actuators induce on the vehicle
+
+        Returns:
+            (float): Sum over the actuators of speed*phase [rad/s]
+        """
+
+        # Influence of the angular positions on the instantaneous noise TODO: improve spectrum
+        phase = np.sin(self.position) + np.sin(2*self.position)/2 + np.sin(3*self.position)/5
+
+        return self.speed@phase
+
+
+    def acc_induced_noise(self):
+        """
+        Compute the combined noise the actuators induce on the vehicle's acceleration
+
+        Returns:
+            (numpy.ndarray): Noise induced on the vehicle's (3-axis) acceleration [m/s2]
+        """
+
+        return (self.noise_phase_sum()/280)*self.acc_noise_distribution # TODO: improve amplitude map
+
+
+    def gyro_induced_noise(self):
+        """
+        Compute the combined noise the actuators induce on the vehicle's angular speed
+
+        Returns:
+            (numpy.ndarray): Noise induced on the vehicle's (3-axis) rotational speed [rad/s]
+        """
+
+        return (self.noise_phase_sum()/1450)*self.gyro_noise_distribution # TODO: improve amplitude map
@@ -4,12 +4,16 @@
 # Battery modeling
 
 from math import pi, sin
-import time
 import numpy as np
 # import math_utils as MU
 import polynomial as POLY
 
 
+# Parameter of the polynomial that maps the SOC (State Of Charge) to a single LiPo cell voltage
+# Based on data available at: Gandolfo, Daniel, et al. "Dynamic model of lithium polymer battery–load resistor method for electric parameters identification." Journal of the Energy Institute 88.4 (2015): 470-479.
+CELL_VOLTAGE_COEFFICIENTS = [2.5881836050934073, 19.977045504620776, -140.6535733701412, 515.4239704625197, -1057.4258331010678, 1226.7602703659068, -750.1861137479827, 187.73276915201495]
+
+
 class battery:
     """
     Class that represents a battery
@@ -26,8 +30,10 @@ class battery:
         # Load model parameters
         self.load_parameters(params)
 
-        # Initialize the last time variable for time step computation
-        self.last_time = time.time()
+        # Initialize the State Of Charge variable
+        self.soc = self.init_charge/100             # value from 0 to 1
+        # Initialize the quarge of the battery
+        self.q = self.soc * self.full_charge*3.6    # Coulomb [A*s]
 
 
     def load_parameters(self, params):
@@ -38,32 +44,26 @@ class battery:
             params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
         """
 
-        self.full_charge = params.get_parameter_value("BAT_FULL_CHARGE")          # [mAh]
-        self.init_charge = params.get_parameter_value("BAT_INIT_CHARGE")          # [%]
-        self.n_cells = params.get_parameter_value("BAT_N_CELLS")                  #
-        self.idle_current = params.get_parameter_value("PWR_IDLE_CURRENT")        # [A]
-        self.internal_R = params.get_parameter_value("BAT_INTERNAL_RES")          # [Ohms]
-        self.discharge_rate = params.get_parameter_value("BAT_DISCHARGE_RATE")    #
-        
-        # Initialize the State Of Charge variable
-        self.soc = self.init_charge/100             # value from 0 to 1
-        # Initialize the quarge of the battery
-        self.q = self.soc * self.full_charge*3.6    # Coulomb [A*s]
+        bat = params.snapshot().battery
+        self.full_charge = bat.full_charge          # [mAh]
+        self.init_charge = bat.init_charge          # [%]
+        self.n_cells = bat.n_cells                  #
+        self.idle_current = bat.idle_current        # [A]
+        self.internal_R = bat.internal_res          # [Ohms]
+        self.discharge_rate = bat.discharge_rate    #
 
-        # Parameter of the polynomial that maps the SOC (State Of Charge) to a single LiPo cell voltage
-        # Based on data available at: Gandolfo, Daniel, et al. "Dynamic model of lithium polymer battery–load resistor method for electric parameters identification." Journal of the Energy Institute 88.4 (2015): 470-479.
-        volt_constants = [2.5881836050934073, 19.977045504620776, -140.6535733701412, 515.4239704625197, -1057.4258331010678, 1226.7602703659068, -750.1861137479827, 187.73276915201495]
         # Define a polynomial to compute the LiPo cell voltage
-        self.poly_cell_voltage = POLY.polynomial(volt_constants)
+        self.poly_cell_voltage = POLY.polynomial(CELL_VOLTAGE_COEFFICIENTS)
 
 
-    def battery_sim_step(self, I_):
+    def battery_sim_step(self, I_, dt):
         """
         Perform the integration step for the battery
 
         Parameters:
             I_ (float): Extra current drown by the powered system [A]
                         Does not count for the idle current
+            dt (float): Time step given by the simulation clock [s]
 
         Returns:
             Vout (float): Voltage in the output of the battery [V]
@@ -72,11 +72,6 @@ class battery:
         # Set the total current based on the current drown by the motors
         self.I = I_ + self.idle_current
 
-        # Compute the simulation time step
-        time_now = time.time()
-        dt = time_now-self.last_time
-        self.last_time = time_now
-        
         # Update the amount of charge left based on the current
         self.q = self.q - self.I*dt
         # Update the normalized state of charge 
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Accuracy versus cost benchmark of the rigid body integrators
+# Flies the same scripted scenarios with every integrator and several time steps, and compares the trajectories against a fine step Runge-Kutta 4 reference
+#   maneuver: take off, maneuvers and landing with the full model (the error includes the discretization of the actuators and of the ground contact)
+#   tumble: free flight with the actuators at steady state and an initial angular velocity (the error is dominated by the rigid body integrator)
+#   landing: drop with the motors off onto the stiff landing controller (shows the largest stable time step)
+
+import sys
+import os
+import time
+import numpy as np
+
+import parameter_server as PRM
+import dynamics as DYN
+import integrators as INT
+
+
+# Duration of each scenario [s]
+SCENARIOS = {'maneuver': 8.0, 'tumble': 4.0, 'landing': 4.0}
+# Interval between the samples compared against the reference (multiple of all of the tested steps) [s]
+SAMPLE_INTERVAL = 0.032
+# Time step of the reference trajectory [s]
+DT_REFERENCE = 0.0001
+# Time steps tested [s]
+DT_LIST = [0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.032]
+
+
+def commands(scenario, t, act_num):
+    """
+    Scripted actuator commands of each scenario
+
+    Parameters:
+        scenario (str): Name of the scenario
+        t (float): Simulated time [s]
+        act_num (int): Number of actuators of the vehicle
+
+    Returns:
+        cmd (numpy.ndarray): PWM values (from 0 to 1) for each actuator
+    """
+
+    if scenario == 'maneuver':
+        # Climb, roll and yaw maneuvers and then motors off to land
+        if t < 5.0:
+            cmd = np.full(act_num, 0.6 if t > 1.0 else 0.7)
+            cmd[0] = cmd[0] + 0.03*np.sin(3*t)
+            cmd[1] = cmd[1] + 0.02*np.cos(2*t)
+        else:
+            cmd = np.zeros(act_num)
+    elif scenario == 'tumble':
+        # Constant commands with a small asymmetry
+        cmd = np.full(act_num, 0.6)
+        cmd[0] = 0.62
+        cmd[2] = 0.61
+    else:
+        # Motors off
+        cmd = np.zeros(act_num)
+
+    return cmd
+
+
+def setup(scenario, quad):
+    """
+    Set the initial conditions of a scenario
+
+    Parameters:
+        scenario (str): Name of the scenario
+        quad (<dynamics.vehicle_dynamics>): Vehicle at its default initial state (landed)
+    """
+
+    if scenario == 'tumble':
+        # Bring the actuators to steady state with the same fine step in every run
+        for k in range(500):
+            quad.vehicle_geo.vehicle_sim_step(commands(scenario, 0, quad.vehicle_geo.act_num), 0.001)
+        # Release the vehicle in the air with an initial angular velocity
+        quad.status = 1
+        quad.p = np.array([0.0, 0.0, 100.0])
+        quad.w = np.array([1.0, -0.5, 2.0])
+    elif scenario == 'landing':
+        # Release the vehicle slightly above the ground while moving and rotating
+        quad.status = 1
+        quad.p = np.array([0.0, 0.0, 2.0])
+        quad.v = np.array([1.0, 0.0, 0.0])
+        quad.w = np.array([0.5, 0.3, 0.0])
+
+
+def fly(params, scenario, method, dt):
+    """
+    Fly one scenario
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Parameter server object
+        scenario (str): Name of the scenario
+        method (int): Integration method (see SIM_INTEGRATOR)
+        dt (float): Time step [s]
+
+    Returns:
+        samples (numpy.ndarray): Position and orientation (p, q) at every SAMPLE_INTERVAL, shape (n_samples,7)
+        elapsed (float): Wall time used by the integration [s]
+    """
+
+    params.set_parameter_value('SIM_INTEGRATOR', method)
+    quad = DYN.vehicle_dynamics(params)
+    act_num = quad.vehicle_geo.act_num
+    setup(scenario, quad)
+
+    n_steps = int(round(SCENARIOS[scenario]/dt))
+    sample_every = int(round(SAMPLE_INTERVAL/dt))
+    samples = []
+
+    t0 = time.perf_counter()
+    with np.errstate(all='ignore'):
+        for k in range(n_steps):
+            quad.model_step(commands(scenario, k*dt, act_num), dt)
+            if (k+1) % sample_every == 0:
+                samples.append(np.concatenate([quad.p, quad.q]))
+    elapsed = time.perf_counter() - t0
+
+    return np.array(samples), elapsed
+
+
+def errors(samples, reference):
+    """
+    Compute the errors of a trajectory with respect to the reference
+
+    Parameters:
+        samples (numpy.ndarray): Trajectory samples, shape (n_samples,7)
+        reference (numpy.ndarray): Reference samples, shape (n_samples,7)
+
+    Returns:
+        pos_error (float): Maximum position error [m]
+        att_error (float): Maximum attitude error [deg]
+    """
+
+    with np.errstate(all='ignore'):
+        pos_error = np.sqrt(((samples[:,0:3]-reference[:,0:3])**2).sum(axis=1)).max()
+        # Angle of the relative rotation between the two attitudes
+        dot = np.abs((samples[:,3:7]*reference[:,3:7]).sum(axis=1)).clip(0, 1)
+        att_error = np.degrees(2*np.arccos(dot)).max()
+
+    if not np.isfinite(pos_error):
+        pos_error = np.inf
+    if not np.isfinite(att_error):
+        att_error = np.inf
+
+    return pos_error, att_error
+
+
+
+if __name__ == "__main__":
+
+    # Usage: python3 bench_integrators.py [params.json] [position tolerance in meters]
+    param_file_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    params = PRM.parameter_server(param_file_name)
+
+    for scenario in SCENARIOS:
+        print(f"\n\33[1mScenario: {scenario}\33[0m (reference: rk4 with dt = {DT_REFERENCE} s)")
+        reference, _ = fly(params, scenario, INT.RK4, DT_REFERENCE)
+
+        print(f"{'integrator':>14s} {'dt [s]':>8s} {'pos err [m]':>12s} {'att err [deg]':>14s} {'cost [s/s]':>11s}")
+        largest_dt = {}
+        for method in INT.INTEGRATORS:
+            name = INT.NAMES[method]
+            for dt in DT_LIST:
+                samples, elapsed = fly(params, scenario, method, dt)
+                pos_error, att_error = errors(samples, reference)
+                # Cost as wall time per simulated second
+                cost = elapsed/SCENARIOS[scenario]
+                print(f"{name:>14s} {dt:8.4f} {pos_error:12.2e} {att_error:14.2e} {cost:11.4f}")
+                if pos_error < tolerance:
+                    largest_dt[name] = (dt, cost)
+
+        print(f"Largest time step with position error below {tolerance} m:")
+        for method in INT.INTEGRATORS:
+            name = INT.NAMES[method]
+            if name in largest_dt:
+                dt, cost = largest_dt[name]
+                print(f"{name:>14s}: dt = {dt} s, cost = {cost:.4f} s per simulated second")
+            else:
+                print(f"{name:>14s}: none")
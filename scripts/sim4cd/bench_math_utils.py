@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Benchmark of the quaternion kernels of math_utils
+# Checks that every fast kernel gives the same result of its reference function and compares their costs
+#   single: one quaternion and one vector, as in vehicle_dynamics, sensors and ros_viz
+#   batch: N quaternions and N vectors, as in swarm_dynamics, with and without preallocated outputs
+
+import sys
+import timeit
+import numpy as np
+
+import math_utils as MU
+
+
+# Number of random inputs used to check the equivalence
+N_CHECK = 1000
+# Number of calls of each function in the timing, split in N_REPEAT alternated runs
+N_CALLS = 20000
+N_REPEAT = 10
+# Number of rows of the batched inputs
+N_BATCH = 64
+
+
+def single_cases(q, u, w, q2, out3, out4):
+    """
+    Pairs of reference and fast functions for one quaternion
+
+    Parameters:
+        q, q2 (numpy.ndarray): Quaternions [qw, qx, qy, qz]
+        u (numpy.ndarray): Vector
+        w (numpy.ndarray): Angular velocity [wx, wy, wz]
+        out3, out4 (numpy.ndarray): Preallocated outputs of shapes (3,) and (4,)
+
+    Returns:
+        (list of tuple): Name, reference function and fast function of each case (functions without arguments)
+    """
+
+    return [
+        ("quat_mult", lambda: MU.quat_mult(q, q2), lambda: MU.quat_mult_fast(q, q2, out4)),
+        ("quat_apply_rot", lambda: MU.quat_apply_rot(q, u), lambda: MU.quat_apply_rot_fast(q, u, out3)),
+        ("quat_apply_rot(quat_conj)", lambda: MU.quat_apply_rot(MU.quat_conj(q), u), lambda: MU.quat_apply_inv_rot_fast(q, u, out3)),
+        ("quaternion_derivative", lambda: MU.quaternion_derivative(q, w), lambda: MU.quaternion_derivative_fast(q, w, out4)),
+    ]
+
+
+def batch_cases(q, u, w, q2, out3, out4):
+    """
+    Pairs of reference and fast functions for a set of quaternions (the reference is the batched function without preallocated output)
+
+    Parameters:
+        q, q2 (numpy.ndarray): Quaternions, shape (N,4)
+        u (numpy.ndarray): Vectors, shape (N,3)
+        w (numpy.ndarray): Angular velocities, shape (N,3)
+        out3, out4 (numpy.ndarray): Preallocated outputs of shapes (N,3) and (N,4)
+
+    Returns:
+        (list of tuple): Name, reference function and fast function of each case (functions without arguments)
+    """
+
+    return [
+        ("quat_mult_batch", lambda: MU.quat_mult_batch(q, q2), lambda: MU.quat_mult_batch(q, q2, out4)),
+        ("quat_apply_rot_batch", lambda: MU.quat_apply_rot_batch(q, u), lambda: MU.quat_apply_rot_batch(q, u, out3)),
+        ("quat_apply_rot_batch(quat_conj)", lambda: MU.quat_apply_rot_batch(MU.quat_conj_batch(q), u), lambda: MU.quat_apply_inv_rot_batch(q, u, out3)),
+        ("quaternion_derivative_batch", lambda: MU.quaternion_derivative_batch(q, w), lambda: MU.quaternion_derivative_batch(q, w, out4)),
+    ]
+
+
+def check_single(rng):
+    """
+    Compare the fast kernels against the reference functions on random inputs
+
+    Parameters:
+        rng (<numpy.random.Generator>): Random number generator
+
+    Returns:
+        errors (dict): Maximum absolute difference of each case
+    """
+
+    errors = {}
+    for k in range(N_CHECK):
+        # Unit quaternions, except for some of the inputs (the rotation formulas are valid for any quaternion)
+        q = rng.normal(size=4)
+        q2 = rng.normal(size=4)
+        if k % 2 == 0:
+            q = MU.normalize(q)
+            q2 = MU.normalize(q2)
+        u = rng.normal(size=3)*10
+        w = rng.normal(size=3)*5
+        for name, reference, fast in single_cases(q, u, w, q2, np.empty(3), np.empty(4)):
+            errors[name] = max(errors.get(name, 0), np.abs(reference() - fast()).max())
+
+    return errors
+
+
+def check_batch(rng):
+    """
+    Compare the batched kernels with preallocated outputs against the single quaternion reference functions
+
+    Parameters:
+        rng (<numpy.random.Generator>): Random number generator
+
+    Returns:
+        errors (dict): Maximum absolute difference of each case
+    """
+
+    q = MU.normalize_rows(rng.normal(size=(N_CHECK,4)))
+    q2 = MU.normalize_rows(rng.normal(size=(N_CHECK,4)))
+    u = rng.normal(size=(N_CHECK,3))*10
+    w = rng.normal(size=(N_CHECK,3))*5
+    out3 = np.empty((N_CHECK,3))
+    out4 = np.empty((N_CHECK,4))
+
+    references = {
+        "quat_mult_batch": np.array([MU.quat_mult(q[i], q2[i]) for i in range(N_CHECK)]),
+        "quat_apply_rot_batch": np.array([MU.quat_apply_rot(q[i], u[i]) for i in range(N_CHECK)]),
+        "quat_apply_rot_batch(quat_conj)": np.array([MU.quat_apply_rot(MU.quat_conj(q[i]), u[i]) for i in range(N_CHECK)]),
+        "quaternion_derivative_batch": np.array([MU.quaternion_derivative(q[i], w[i]) for i in range(N_CHECK)]),
+    }
+
+    errors = {}
+    for name, reference, fast in batch_cases(q, u, w, q2, out3, out4):
+        errors[name] = np.abs(references[name] - fast()).max()
+
+    return errors
+
+
+def timing(cases):
+    """
+    Measure the cost of the reference and fast functions of each case
+
+    Parameters:
+        cases (list of tuple): Name, reference function and fast function of each case
+
+    Returns:
+        (list of tuple): Name, cost of the reference and cost of the fast function of each case [s]
+    """
+
+    results = []
+    for name, reference, fast in cases:
+        # Alternate the two functions, so a slow period of the machine does not favour one of them
+        t_reference = t_fast = float('inf')
+        for k in range(N_REPEAT):
+            t_reference = min(t_reference, timeit.timeit(reference, number=N_CALLS//N_REPEAT)/(N_CALLS//N_REPEAT))
+            t_fast = min(t_fast, timeit.timeit(fast, number=N_CALLS//N_REPEAT)/(N_CALLS//N_REPEAT))
+        results.append((name, t_reference, t_fast))
+
+    return results
+
+
+
+if __name__ == "__main__":
+
+    # Usage: python3 bench_math_utils.py [tolerance]
+    tolerance = float(sys.argv[1]) if len(sys.argv) > 1 else 1e-12
+    rng = np.random.default_rng(0)
+
+    # Equivalence against the reference functions
+    print(f"\n\33[1mEquivalence\33[0m (maximum absolute difference over {N_CHECK} random inputs, tolerance {tolerance})")
+    errors = check_single(rng)
+    errors.update(check_batch(rng))
+    for name, error in errors.items():
+        color = "\33[92m" if error < tolerance else "\33[91m"
+        print(f"{color}{name:>32s}: {error:.2e}\33[0m")
+
+    # Cost of one quaternion
+    q = MU.normalize(np.array([0.9, 0.1, -0.2, 0.3]))
+    q2 = MU.normalize(np.array([0.5, -0.4, 0.6, 0.1]))
+    u = np.array([1.0, 2.0, 3.0])
+    w = np.array([0.3, -0.2, 1.5])
+    print(f"\n\33[1mSingle quaternion\33[0m")
+    print(f"{'function':>32s} {'reference [us]':>15s} {'fast [us]':>10s} {'speedup':>8s}")
+    for name, t_reference, t_fast in timing(single_cases(q, u, w, q2, np.empty(3), np.empty(4))):
+        print(f"{name:>32s} {t_reference*1e6:15.2f} {t_fast*1e6:10.2f} {t_reference/t_fast:7.1f}x")
+
+    # Cost of a batch
+    qb = np.tile(q, (N_BATCH,1))
+    q2b = np.tile(q2, (N_BATCH,1))
+    ub = np.tile(u, (N_BATCH,1))
+    wb = np.tile(w, (N_BATCH,1))
+    print(f"\n\33[1mBatch of {N_BATCH} quaternions\33[0m (reference: batched function without preallocated output)")
+    print(f"{'function':>32s} {'reference [us]':>15s} {'fast [us]':>10s} {'speedup':>8s}")
+    for name, t_reference, t_fast in timing(batch_cases(qb, ub, wb, q2b, np.empty((N_BATCH,3)), np.empty((N_BATCH,4)))):
+        print(f"{name:>32s} {t_reference*1e6:15.2f} {t_fast*1e6:10.2f} {t_reference/t_fast:7.1f}x")
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Benchmark suite of the simulator hot paths
+# Times the functions called at every step of the simulation loop, without ROS, PX4 or a GUI, and writes the results as JSON so they can be compared across releases
+#   math_utils: quaternion kernels used by the dynamics and by the sensors (single and batched)
+#   polynomial: evaluation of the actuator curves
+#   actuators: one prop_actuator and the vectorized actuator_bank
+#   vehicle: vehicle_sim_step (actuators and battery)
+#   dynamics: model_step (Python and, if Numba is installed, compiled)
+#   sensors: synthesis of every sensor measurement
+#   mavlink: encoding of the HIL messages into a null link (fast encoder and pymavlink)
+#   loop: one iteration of the sim4cd loop with the MAVLink messages written into a null link
+# The vehicle dependent cases run with 4 and 8 actuators
+
+import sys
+import os
+import json
+import copy
+import time
+import timeit
+import platform
+import subprocess
+import contextlib
+import numpy as np
+from pymavlink.dialects.v20 import ardupilotmega as mavlink2
+
+import parameter_server as PRM
+import math_utils as MU
+import polynomial as POLY
+import actuators as ACT
+import vehicle as VEH
+import dynamics as DYN
+import jit_dynamics as JIT
+import silsim_comm as COM
+import clock as CLK
+import timer as TIM
+
+
+# Version of the layout of the output file
+SCHEMA_VERSION = 1
+# Number of timing repetitions of each case (the best and the median are reported)
+REPEAT = 5
+# Minimum duration of one timing repetition [s]
+MIN_TIME = 0.2
+# Number of rows of the batched inputs
+N_BATCH = 64
+# Numbers of actuators of the vehicle dependent cases
+ACT_NUMS = [4, 8]
+# Commands applied to the vehicle (take off first, then hover)
+CMD_TAKEOFF = 0.7
+CMD_HOVER = 0.6
+
+
+class null_link:
+    """
+    Class that replaces the mavutil connection of px4_connection: it encodes every message but drops the bytes
+    """
+
+    def __init__(self):
+        """
+        Constructor for the null_link class
+        """
+
+        # MAVLink 2 object (protocol used by PX4), writing into this object
+        self.mav = mavlink2.MAVLink(self, srcSystem=1, srcComponent=1)
+        # Number of bytes written
+        self.bytes = 0
+
+
+    def write(self, buf):
+        """
+        Drop an encoded frame
+
+        Parameters:
+            buf (bytes): Encoded frame
+        """
+
+        self.bytes = self.bytes + len(buf)
+
+
+def vehicle_params(params, act_num):
+    """
+    Get a copy of the parameters with the requested number of actuators
+    The extra actuators of the 8 actuators vehicle are placed on a cross between the 4 default ones (same parameters of the motors)
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+        act_num (int): Number of actuators
+
+    Returns:
+        (<parameter_server.parameter_server>): Parameter server object of the vehicle
+    """
+
+    vehicle = copy.copy(params)
+    vehicle.data = copy.deepcopy(params.data)
+    vehicle.set_parameter_value('VEH_ACT_NUM', act_num)
+    vehicle.set_parameter_value('SIM_JIT_EN', False)
+    # Same noise in every run of the suite
+    vehicle.set_parameter_value('SIM_SEED', 0)
+    if act_num > 4:
+        arm = 0.2
+        cross = [(arm, 0.0), (0.0, arm), (-arm, 0.0), (0.0, -arm)]
+        for i in range(4, act_num):
+            x, y = cross[(i-4) % 4]
+            vehicle.set_parameter_value(f'VEH_ACT{i}_POS_X', x)
+            vehicle.set_parameter_value(f'VEH_ACT{i}_POS_Y', y)
+
+    return vehicle
+
+
+def flying_vehicle(params, dt):
+    """
+    Create a vehicle and fly it out of the ground, so the timed steps include the whole flight model
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Parameter server object of the vehicle
+        dt (float): Time step [s]
+
+    Returns:
+        quad (<dynamics.vehicle_dynamics>): Vehicle in flight
+        cmd (numpy.ndarray): Hover commands (8 values, as received from PX4)
+    """
+
+    quad = DYN.vehicle_dynamics(params)
+    for k in range(int(1.0/dt)):
+        quad.model_step(np.full(8, CMD_TAKEOFF), dt)
+
+    return quad, np.full(8, CMD_HOVER)
+
+
+def math_cases():
+    """
+    Cases of the math_utils kernels
+
+    Returns:
+        (list of tuple): Group, name, number of actuators and function without arguments of each case
+    """
+
+    q = MU.normalize(np.array([0.9, 0.1, -0.2, 0.3]))
+    q2 = MU.normalize(np.array([0.5, -0.4, 0.6, 0.1]))
+    u = np.array([1.0, 2.0, 3.0])
+    w = np.array([0.3, -0.2, 1.5])
+    out3 = np.empty(3)
+    out4 = np.empty(4)
+    qb = np.tile(q, (N_BATCH,1))
+    q2b = np.tile(q2, (N_BATCH,1))
+    ub = np.tile(u, (N_BATCH,1))
+    wb = np.tile(w, (N_BATCH,1))
+    out3b = np.empty((N_BATCH,3))
+    out4b = np.empty((N_BATCH,4))
+
+    return [
+        ('math_utils', 'quat_mult', None, lambda: MU.quat_mult(q, q2)),
+        ('math_utils', 'quat_mult_fast', None, lambda: MU.quat_mult_fast(q, q2, out4)),
+        ('math_utils', 'quat_apply_rot', None, lambda: MU.quat_apply_rot(q, u)),
+        ('math_utils', 'quat_apply_rot_fast', None, lambda: MU.quat_apply_rot_fast(q, u, out3)),
+        ('math_utils', 'quat_apply_inv_rot_fast', None, lambda: MU.quat_apply_inv_rot_fast(q, u, out3)),
+        ('math_utils', 'quaternion_derivative', None, lambda: MU.quaternion_derivative(q, w)),
+        ('math_utils', 'quaternion_derivative_fast', None, lambda: MU.quaternion_derivative_fast(q, w, out4)),
+        ('math_utils', 'normalize', None, lambda: MU.normalize(q)),
+        ('math_utils', f'quat_mult_batch[{N_BATCH}]', None, lambda: MU.quat_mult_batch(qb, q2b, out4b)),
+        ('math_utils', f'quat_apply_rot_batch[{N_BATCH}]', None, lambda: MU.quat_apply_rot_batch(qb, ub, out3b)),
+        ('math_utils', f'quaternion_derivative_batch[{N_BATCH}]', None, lambda: MU.quaternion_derivative_batch(qb, wb, out4b)),
+        ('math_utils', f'transform_points[{N_BATCH}]', None, lambda: MU.transform_points(u, q, ub, out3b)),
+    ]
+
+
+def model_cases(params):
+    """
+    Cases of the polynomial, the actuators, the vehicle and the dynamics
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+
+    Returns:
+        (list of tuple): Group, name, number of actuators and function without arguments of each case
+    """
+
+    dt = 1.0/params.get_parameter_value('SIM_STEP_HZ')
+    V = 16.0
+
+    poly = POLY.polynomial([0.1, 2.0, 0.5])
+    act = ACT.prop_actuator(params, 0)
+
+    cases = [
+        ('polynomial', 'eval', None, lambda: poly.eval(0.6)),
+        ('actuators', 'prop_actuator.actuator_sim_step', 1, lambda: act.actuator_sim_step(CMD_HOVER, V, dt)),
+    ]
+
+    for act_num in ACT_NUMS:
+        vehicle = vehicle_params(params, act_num)
+        geo = VEH.vehicle_geometry(vehicle)
+        cmds = np.full(act_num, CMD_HOVER)
+        quad, cmd = flying_vehicle(vehicle, dt)
+        cases = cases + [
+            ('actuators', 'actuator_bank.sim_step', act_num, lambda geo=geo, cmds=cmds: geo.actuators.sim_step(cmds, V, dt)),
+            ('vehicle', 'vehicle_sim_step', act_num, lambda geo=geo, cmds=cmds: geo.vehicle_sim_step(cmds, dt)),
+            ('dynamics', 'model_step', act_num, lambda quad=quad, cmd=cmd: quad.model_step(cmd, dt)),
+        ]
+
+        # Compiled physics step (compiled once before the timing)
+        if JIT.NUMBA_AVAILABLE:
+            vehicle.set_parameter_value('SIM_JIT_EN', True)
+            quad_jit, cmd = flying_vehicle(vehicle, dt)
+            cases.append(('dynamics', 'model_step_jit', act_num, lambda quad=quad_jit, cmd=cmd: quad.model_step(cmd, dt)))
+
+    return cases
+
+
+def sensor_cases(params):
+    """
+    Cases of the sensor synthesis (the vehicle getters used by the simulation loop)
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+
+    Returns:
+        (list of tuple): Group, name, number of actuators and function without arguments of each case
+    """
+
+    dt = 1.0/params.get_parameter_value('SIM_STEP_HZ')
+    cases = []
+    for act_num in ACT_NUMS:
+        quad, cmd = flying_vehicle(vehicle_params(params, act_num), dt)
+        cases = cases + [
+            ('sensors', 'get_acc', act_num, quad.get_acc),
+            ('sensors', 'get_gyro', act_num, quad.get_gyro),
+            ('sensors', 'get_mag', act_num, quad.get_mag),
+            ('sensors', 'get_baro', act_num, quad.get_baro),
+            ('sensors', 'get_gps', act_num, quad.get_gps),
+            ('sensors', 'get_ground_truth', act_num, quad.get_ground_truth),
+        ]
+
+    return cases
+
+
+def null_connection(fast_encoder):
+    """
+    Create a PX4 connection that writes into a null link
+
+    Parameters:
+        fast_encoder (bool): Use the preallocated encoder (True) or the pymavlink messages (False)
+
+    Returns:
+        (<silsim_comm.px4_connection>): Connection object
+    """
+
+    px4 = COM.px4_connection(fast_encoder=fast_encoder)
+    px4.vehicle = null_link()
+    px4.t_boot__us = int(time.time()*1e6 - 30e6)
+    if fast_encoder:
+        px4.encoder = COM.ENC.hil_encoder(px4.vehicle.mav)
+
+    return px4
+
+
+def mavlink_cases(params):
+    """
+    Cases of the MAVLink encoding of the HIL messages
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+
+    Returns:
+        (list of tuple): Group, name, number of actuators and function without arguments of each case
+    """
+
+    dt = 1.0/params.get_parameter_value('SIM_STEP_HZ')
+    quad, cmd = flying_vehicle(vehicle_params(params, 4), dt)
+    acc, gyro, mag, bar = quad.get_acc(), quad.get_gyro(), quad.get_mag(), quad.get_baro()
+    gps = quad.get_gps()
+    gt = quad.get_ground_truth()
+    time_usec = 123456789
+
+    cases = []
+    for fast_encoder, path in [(True, 'fast'), (False, 'pymavlink')]:
+        px4 = null_connection(fast_encoder)
+        cases = cases + [
+            ('mavlink', f'send_sensors[{path}]', None, lambda px4=px4: px4.send_sensors(acc, gyro, mag, bar, time_usec)),
+            ('mavlink', f'send_gps[{path}]', None, lambda px4=px4: px4.send_gps(gps, time_usec)),
+            ('mavlink', f'send_ground_truth[{path}]', None, lambda px4=px4: px4.send_ground_truth(gt, time_usec)),
+        ]
+    cases.append(('mavlink', 'send_heart_beat', None, px4.send_heart_beat))
+
+    return cases
+
+
+class loop_iteration:
+    """
+    Class that runs the work of one iteration of the sim4cd loop, with a clock as fast as possible and a null link instead of PX4
+    """
+
+    def __init__(self, params):
+        """
+        Constructor for the loop_iteration class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object of the vehicle
+        """
+
+        self.sens_hz = params.get_parameter_value('SIM_SENS_HZ')
+        self.gps_hz = params.get_parameter_value('SIM_GPS_HZ')
+        self.gt_hz = params.get_parameter_value('SIM_GT_HZ')
+        self.step_hz = params.get_parameter_value('SIM_STEP_HZ')
+
+        self.clock = CLK.sim_clock(self.step_hz, CLK.FASTER, 0)
+        self.quad, self.actuator_commands = flying_vehicle(params, 1.0/self.step_hz)
+        self.PX4 = null_connection(True)
+
+        # Same timers of sim4cd
+        self.timer_sensors = TIM.timer(frequency=self.sens_hz, slip_correction=True, clock=self.clock)
+        self.timer_gps = TIM.timer(frequency=self.gps_hz, slip_correction=True, clock=self.clock)
+        self.timer_gt = TIM.timer(frequency=self.gt_hz, slip_correction=True, clock=self.clock)
+
+
+    def step(self):
+        """
+        Run one iteration: physics step and the sensor, GPS and ground truth messages that are due
+        """
+
+        dt = self.clock.step()
+        time_usec = self.clock.get_time_us()
+        self.quad.model_step(self.actuator_commands, dt)
+
+        if(self.timer_sensors.tick()):
+            self.PX4.send_sensors(self.quad.get_acc(), self.quad.get_gyro(), self.quad.get_mag(), self.quad.get_baro(), time_usec)
+        if(self.timer_gps.tick()):
+            self.PX4.send_gps(self.quad.get_gps(), time_usec)
+        if(self.timer_gt.tick()):
+            self.PX4.send_ground_truth(self.quad.get_ground_truth(), time_usec)
+
+
+def loop_cases(params):
+    """
+    Cases of the full loop iteration
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+
+    Returns:
+        (list of tuple): Group, name, number of actuators and function without arguments of each case
+    """
+
+    cases = []
+    for act_num in ACT_NUMS:
+        loop = loop_iteration(vehicle_params(params, act_num))
+        cases.append(('loop', 'iteration', act_num, loop.step))
+
+    return cases
+
+
+def measure(function):
+    """
+    Measure the cost of one call of a function
+
+    Parameters:
+        function (function): Function without arguments
+
+    Returns:
+        (dict): Number of calls per repetition, and best, median and mean cost of one call over the repetitions [us]
+    """
+
+    timer = timeit.Timer(function)
+    # Number of calls that take at least MIN_TIME
+    number, elapsed = timer.autorange()
+    number = max(1, int(number*MIN_TIME/max(elapsed, 1e-9)))
+    times = np.array(timer.repeat(repeat=REPEAT, number=number))/number*1e6
+
+    return {
+        'number': number,
+        'repeat': REPEAT,
+        'best_us': float(times.min()),
+        'median_us': float(np.median(times)),
+        'mean_us': float(times.mean()),
+        'stdev_us': float(times.std()),
+    }
+
+
+def environment():
+    """
+    Describe the machine and the software versions of the run
+
+    Returns:
+        (dict): Description of the environment
+    """
+
+    # Commit of the repository, if available
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ''
+
+    # Version of Numba, if installed
+    try:
+        import numba
+        numba_version = numba.__version__
+    except ImportError:
+        numba_version = None
+
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numba_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_suite(params, pattern=None):
+    """
+    Run all of the benchmark cases
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Base parameter server object
+        pattern (str): Only run the cases whose group/name contains this text (all of them if None)
+
+    Returns:
+        (dict): Environment, settings and results of the run
+    """
+
+    results = []
+    builders = [lambda: math_cases(), lambda: model_cases(params), lambda: sensor_cases(params), lambda: mavlink_cases(params), lambda: loop_cases(params)]
+    with np.errstate(all='ignore'):
+        for builder in builders:
+            for group, name, act_num, function in builder():
+                if pattern is not None and pattern not in f"{group}/{name}":
+                    continue
+                result = {'group': group, 'name': name, 'act_num': act_num}
+                result.update(measure(function))
+                results.append(result)
+                label = f"{group}/{name}" + (f" ({act_num} act)" if act_num is not None else "")
+                print(f"{label:>54s} {result['best_us']:10.2f} {result['median_us']:10.2f}")
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'environment': environment(),
+        'settings': {'repeat': REPEAT, 'min_time': MIN_TIME, 'n_batch': N_BATCH, 'step_hz': params.get_parameter_value('SIM_STEP_HZ'), 'sens_hz': params.get_parameter_value('SIM_SENS_HZ')},
+        'results': results,
+    }
+
+
+
+if __name__ == "__main__":
+
+    # Usage: python3 benchmarks.py [results.json] [params.json] [filter]
+    #   results.json: output file ("-" or nothing to write the JSON on the standard output)
+    #   filter: only run the cases whose group/name contains this text (e.g. "dynamics" or "loop/")
+    # The progress messages are written on the standard error, so the standard output only carries the JSON
+    output_file_name = sys.argv[1] if len(sys.argv) > 1 else '-'
+    param_file_name = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')
+    pattern = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        params = PRM.parameter_server(param_file_name)
+        print(f"\33[1m{'case':>54s} {'best [us]':>10s} {'median [us]':>10s}\33[0m")
+        report = run_suite(params, pattern)
+
+    if output_file_name == '-':
+        print(json.dumps(report, indent=4))
+    else:
+        with open(output_file_name, "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"\33[92m[benchmarks] Saved results: {output_file_name}\33[0m", file=sys.stderr)
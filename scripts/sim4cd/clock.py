@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Fixed-step simulation clock
+# Single source of time for all of the simulated subsystems
+
+import time
+
+
+# Clock modes
+REALTIME = 0 # Simulated time follows the wall time
+FASTER = 1 # Simulated time runs SIM_SPEED_FACTOR times faster than the wall time (as fast as possible if 0)
+LOCKSTEP = 2 # Simulated time only advances when an external event requests a step
+
+
+class sim_clock:
+    """
+    Class that represents the simulation clock
+    It hands one fixed time step to every subsystem and paces the simulation against the wall time
+    """
+
+    def __init__(self, frequency, mode=REALTIME, speed_factor=1.0):
+        """
+        Constructor for the sim_clock class
+
+        Parameters:
+            frequency (float): Frequency of the simulation steps [Hz]
+            mode (int): Clock mode
+                0: Real time
+                1: Faster than real time
+                2: Lockstep
+            speed_factor (float): Ratio between simulated time and wall time in the faster than real time mode (0 means as fast as possible)
+        """
+
+        if mode not in [REALTIME, FASTER, LOCKSTEP]:
+            print(f"\33[91mInvalid clock mode {mode}. Exiting.\33[0m")
+            exit()
+
+        # Fixed time step [s]
+        self.dt = 1.0/frequency
+        # Clock mode
+        self.mode = mode
+        # Ratio between simulated and wall time (only used in the faster than real time mode)
+        self.speed_factor = speed_factor if mode == FASTER else 1.0
+
+        # Number of steps performed so far
+        self.steps = 0
+        # Current simulated time [s]
+        self.t = 0.0
+
+        # Wall time and step count used as reference for the pacing
+        self.wall_ref = None
+        self.steps_ref = 0
+
+        # Maximum lag behind the wall time before the pacing reference is reset [s]
+        self.max_lag = 0.1
+        # Number of times the clock could not keep up with the wall time
+        self.overruns = 0
+
+
+    def step(self):
+        """
+        Advance the simulated time by one fixed time step
+        In the real time and faster than real time modes, wait until the wall time catches up with the simulated time
+
+        Returns:
+            self.dt (float): Time step the subsystems must integrate [s]
+        """
+
+        # Pace the simulation against the wall time
+        if self.mode != LOCKSTEP and self.speed_factor > 0:
+            self.wait()
+
+        # Advance the simulated time (computed from the step count to avoid accumulating round off errors)
+        self.steps = self.steps + 1
+        self.t = self.steps*self.dt
+
+        return self.dt
+
+
+    def wait(self):
+        """
+        Sleep until the wall time reaches the deadline of the next step
+        In the lockstep mode, it can be used to pace the simulation in real time while the external steps are not available
+        """
+
+        time_now = time.time()
+
+        # Start the pacing reference on the first step
+        if self.wall_ref is None:
+            self.wall_ref = time_now
+            self.steps_ref = self.steps
+
+        # Compute the wall time in which the next step is due
+        deadline = self.wall_ref + (self.steps + 1 - self.steps_ref)*self.dt/self.speed_factor
+        delay = deadline - time_now
+
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > self.max_lag:
+            # The simulation fell too far behind, restart the reference instead of bursting to catch up
+            self.overruns = self.overruns + 1
+            self.wall_ref = time_now
+            self.steps_ref = self.steps
+
+
+    def get_time(self):
+        """
+        Get the current simulated time
+
+        Returns:
+            self.t (float): Simulated time since the start of the simulation [s]
+        """
+
+        return self.t
+
+
+    def get_time_us(self):
+        """
+        Get the current simulated time in microseconds
+
+        Returns:
+            (int): Simulated time since the start of the simulation [us]
+        """
+
+        return int(round(self.t*1e6))
+
+
+    def get_dt(self):
+        """
+        Get the fixed time step of the clock
+
+        Returns:
+            self.dt (float): Time step [s]
+        """
+
+        return self.dt
+
+
+    def get_steps(self):
+        """
+        Get the number of steps performed so far
+
+        Returns:
+            self.steps (int): Number of steps
+        """
+
+        return self.steps
+
+
+    def is_lockstep(self):
+        """
+        Check if the clock is in the lockstep mode
+
+        Returns:
+            (bool): True if the clock is in the lockstep mode
+        """
+
+        return self.mode == LOCKSTEP
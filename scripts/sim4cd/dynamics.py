@@ -4,12 +4,15 @@
 # Rigid body dynamics
 
 import numpy as np
-import time
 from math import pi, sin, cos
 
 import vehicle as VEH
 import sensors as SENS
 import math_utils as MU
+import integrators as INT
+import rng as RNG
+import jit_dynamics as JIT
+import param_snapshot as SNAP
 # import parameter_server as PRM
 
 
@@ -18,13 +21,14 @@ class vehicle_dynamics(object):
     Vehicle dynamics class based on a rigid body
     """
 
-    def __init__(self, dt_max_, params):
+    def __init__(self, params, vehicle_id=0, rng=None):
         """
         Constructor for the dynamics class
 
         Parameters:
-            dt_max_ (float): Maximum desirable value for the time step
             params (<parameter_server.parameter_server>): Parameter server object
+            vehicle_id (int): Index of the vehicle, used to select its random number streams
+            rng (<rng.rng_service>): Random number service (by default, one created with the SIM_SEED of params)
         """
 
         # integer representing the vehicle status
@@ -47,9 +51,6 @@ class vehicle_dynamics(object):
         self.Torque_b = np.array([0, 0, 0])
         self.total_force_w = np.array([0, 0, 0])
 
-        # Maximum desired simulation time step
-        self.dt_max = dt_max_
-
         # Define the vehicle geometry
         self.vehicle_geo = VEH.vehicle_geometry(params)
         # Initialize the commands variable
@@ -58,73 +59,96 @@ class vehicle_dynamics(object):
         # Initialize the list that contains the angular positions of the actuators
         self.angle_list = self.vehicle_geo.get_actuators_positions()
 
-        # Initialize the last time variable for time step computation
-        self.last_time = time.time()
-
         # Initialize the current landing pose information
         self.z_land = self.p[2]*1
         self.q_land = self.q*1
 
-        # Create a sensors object
-        self.sensors = SENS.sensors(params)
+        # Random number service of the simulation
+        self.rng = rng if rng is not None else RNG.from_params(params)
 
+        # Create a sensors object with the noise streams of this vehicle
+        self.sensors = SENS.sensors(params, self.rng.seed_sequence(f"vehicle/{vehicle_id}/sensors"))
+
+        # Compiled physics step (optional)
+        self.jit = None
+        if self.jit_en:
+            if JIT.NUMBA_AVAILABLE:
+                self.jit = JIT.jit_model(self)
+            else:
+                print("\33[93m[dynamics] Numba is not installed. Using the Python physics step\33[0m")
 
-    def model_step(self, cmd):
+
+    def model_step(self, cmd, dt):
         """
         Perform the dynamic integration step
 
         Parameters:
             cmd (numpy.ndarray): PWM values (from 0 to 1) for each actuator
+            dt (float): Time step given by the simulation clock [s]
         """
 
-        # Store the current actuator commands locally
-        self.cmds = cmd[0:4]
-
-        # Compute the (variable) time step
-        time_now = time.time()
-        dt = time_now-self.last_time
-        self.last_time = time_now
+        # Run the whole step in the compiled kernel, if enabled
+        if self.jit is not None:
+            self.jit.step(cmd, dt)
+            return
 
-        # # Throw a warning if the simulation is computationally heavy
-        # if(dt > self.dt_max):
-        #     print("\33[93m[Warning] simulation loop took too long to compute: %f ms\33[0m" % (dt*1000))
+        # Store the current actuator commands locally
+        self.cmds = cmd[0:self.vehicle_geo.act_num]
 
         # Compute the forces and torques that the actuators are applying to the vehicle body
-        self.Force_b, self.Torque_b = self.vehicle_geo.vehicle_sim_step(self.cmds)
+        self.Force_b, self.Torque_b = self.vehicle_geo.vehicle_sim_step(self.cmds, dt)
 
         # Deal with ground interaction during take off and landing
         self.check_ground_interaction()
 
+        # Compute non inertial forces acting on the drone at the beginning of the step (used by the accelerometer)
+        self.total_force_w = MU.quat_apply_rot_fast(self.q,self.Force_b) - self.drag_v*(self.v-self.wind_vw)
+
+        # Model integration (fixed time step) with the selected integrator
+        self.p, self.v, self.q, self.w = self.integrate(self.derivatives, self.p, self.v, self.q, self.w, dt)
+
+        # Update the list with the angular positions of the actuators
+        self.angle_list = self.vehicle_geo.get_actuators_positions()
+
+
+    def derivatives(self, p, v, q, w):
+        """
+        Compute the derivatives of the rigid body states
+        The forces and torques of the actuators (self.Force_b and self.Torque_b) are held constant during the step
+
+        Parameters:
+            p (numpy.ndarray): Position in the world frame [m]
+            v (numpy.ndarray): Velocity in the world frame [m/s]
+            q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
+            w (numpy.ndarray): Angular velocity in the body frame [rad/s]
+
+        Returns:
+            p_dot (numpy.ndarray): Derivative of the position [m/s]
+            v_dot (numpy.ndarray): Derivative of the velocity [m/s2]
+            q_dot (numpy.ndarray): Derivative of the orientation quaternion [1/s]
+            w_dot (numpy.ndarray): Derivative of the angular velocity [rad/s2]
+        """
+
         # Compute linear drag
-        f_drag = -self.drag_v*(self.v-self.wind_vw) #TODO: Add different drag for different directions and improve model
+        f_drag = -self.drag_v*(v-self.wind_vw) #TODO: Add different drag for different directions and improve model
         # Compute angular drag
-        T_drag = -self.drag_w*self.w #TODO: Add different drag for different directions and improve model
+        T_drag = -self.drag_w*w #TODO: Add different drag for different directions and improve model
 
         # Compute torque due to gyroscopic effect
-        Tg = self.vehicle_geo.gyroscopic_torque(self.w)
+        Tg = self.vehicle_geo.gyroscopic_torque(w)
 
         # Compute non inertial forces acting on the drone
-        self.total_force_w = MU.quat_apply_rot(self.q,self.Force_b) + f_drag
+        total_force_w = MU.quat_apply_rot_fast(q,self.Force_b) + f_drag
         # Compute kinematic acceleraion
-        acc_w = np.array([0,0,-self.g]) + self.total_force_w/self.m
+        acc_w = np.array([0,0,-self.g]) + total_force_w/self.m
 
         # Dynamic model
-        p_dot = self.v
+        p_dot = v
         v_dot = acc_w
-        q_dot = MU.quaternion_derivative(self.q,self.w)
-        w_dot = self.Jinv@(-np.cross(self.w,self.J@self.w) + self.Torque_b + T_drag + Tg) # TODO: check if .dot() works as @
-
-        # Model integration (variable time step)
-        self.p = self.p + p_dot*dt
-        self.v = self.v + v_dot*dt
-        self.q = self.q + q_dot*dt
-        self.w = self.w + w_dot*dt
-
-        # Update the list with the angular positions of the actuators
-        self.angle_list = self.vehicle_geo.get_actuators_positions()
+        q_dot = MU.quaternion_derivative_fast(q,w)
+        w_dot = self.Jinv@(-np.cross(w,self.J@w) + self.Torque_b + T_drag + Tg) # TODO: check if .dot() works as @
 
-        # Quaternion renormalization
-        self.q = MU.normalize(self.q)
+        return p_dot, v_dot, q_dot, w_dot
 
 
     def load_parameters(self, params):
@@ -135,31 +159,74 @@ class vehicle_dynamics(object):
             params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
         """
 
-        self.g = params.get_parameter_value('ENV_GRAVITY')
-        self.m = params.get_parameter_value('DYN_MASS')
-        self.drag_v = params.get_parameter_value('DYN_DRAG_V')
-        self.drag_w = params.get_parameter_value('DYN_DRAG_W')
-        Jxx = params.get_parameter_value('DYN_MOI_XX')
-        Jyy = params.get_parameter_value('DYN_MOI_YY')
-        Jzz = params.get_parameter_value('DYN_MOI_ZZ')
-        self.J = np.array([[Jxx, 0, 0],[0, Jyy, 0],[0, 0, Jzz]]) # Moment of inertia matrix
-        wind_vw_x = params.get_parameter_value('DYN_WIND_E')
-        wind_vw_y = params.get_parameter_value('DYN_WIND_N')
-        wind_vw_z = params.get_parameter_value('DYN_WIND_U')
-        self.wind_vw = np.array([wind_vw_x, wind_vw_y, wind_vw_z]) # Wind speed vector
-
-        init_pos_x = params.get_parameter_value('SIM_INIT_POS_X')
-        init_pos_y = params.get_parameter_value('SIM_INIT_POS_Y')
-        init_yaw = (pi/180)*params.get_parameter_value('SIM_INIT_YAW') # Converted to radians
-        self.p0 = np.array([init_pos_x,init_pos_y,0])
+        snap = params.snapshot()
+
+        # Rigid body parameters
+        self.load_body_parameters(params)
+
+        init_yaw = snap.sim.init_yaw
+        self.p0 = snap.sim.init_pos.copy()
         self.v0 = np.array([0,0,0])
         self.q0 = np.array([cos(init_yaw/2),0,0,sin(init_yaw/2)])
         self.w0 = np.array([0,0,0])
 
+        # Integration method
+        self.integrator = snap.sim.integrator
+        self.integrate = INT.get_integrator(self.integrator)
+
+        # Compiled physics step
+        self.jit_en = snap.sim.jit_en
+
+
+    def load_body_parameters(self, params):
+        """
+        Load the parameters of the rigid body and pre-compute the quantities derived from them
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
+        """
+
+        snap = params.snapshot()
+
+        self.g = snap.env.gravity
+        self.m = snap.dynamics.mass
+        self.drag_v = snap.dynamics.drag_v
+        self.drag_w = snap.dynamics.drag_w
+        self.J = np.diag(snap.dynamics.moi) # Moment of inertia matrix
+        self.wind_vw = snap.dynamics.wind.copy() # Wind speed vector
+
         # Pre-compute inverse of the moment of inertia matrix
         self.Jinv = MU.inv(self.J)
 
 
+    def reload_parameters(self, params, keys):
+        """
+        Apply new values of parameters while the vehicle is flying (between two steps), keeping its states
+        Only the quantities that depend on the changed parameters are recomputed
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object with the new values
+            keys (list of str): Names of the parameters that changed (the SIM_ parameters and VEH_ACT_NUM are not reloadable)
+        """
+
+        groups = SNAP.key_groups(keys)
+
+        # Rigid body (mass, drag, inertia, wind and gravity)
+        if len(groups & {'dynamics', 'env'}) > 0:
+            self.load_body_parameters(params)
+
+        # Sensors (noise, bias, origin and atmosphere)
+        if len(groups & {'sensors', 'env'}) > 0:
+            self.sensors.load_parameters(params)
+
+        # Actuators, geometry and battery
+        self.vehicle_geo.reload_parameters(params, keys)
+
+        # The compiled step keeps its own copy of the parameters
+        if self.jit is not None:
+            self.jit.load_parameters()
+
+
     def check_ground_interaction(self):
         """
         Check for interaction between the drone and the floor
@@ -198,7 +265,7 @@ class vehicle_dynamics(object):
                 w_align = w_align[1:4]
                 break_force_w = - self.m*self.v*20
                 break_force_w[2] = break_force_w[2]*5 + self.m*self.g - self.p[2]*500
-                self.Force_b = MU.quat_apply_rot(MU.quat_conj(self.q),break_force_w)
+                self.Force_b = MU.quat_apply_inv_rot_fast(self.q,break_force_w)
                 self.Torque_b = -self.J@self.w*10 - w_align*20
 
 
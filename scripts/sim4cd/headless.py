@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Headless simulation runner
+# Steps the vehicle model as fast as possible with a fixed clock, without ROS and without PX4
+# The actuator commands come from a file or from a Python callback, and the state and sensor traces are written to disk
+
+import sys
+import time
+import numpy as np
+
+import dynamics as DYN
+import swarm_dynamics as SWARM
+import parameter_server as PRM
+import timer as TIM
+import clock as CLK
+
+
+def load_commands(file_name):
+    """
+    Load a sequence of actuator commands from a file
+    Each row holds a time followed by the PWM commands (from 0 to 1) of the actuators: t, cmd0, cmd1, ...
+    The commands of a row are held until the time of the next row
+
+    Parameters:
+        file_name (str): Path of the file (.npy with a 2D array, or text/CSV with one row per line)
+
+    Returns:
+        commands (numpy.ndarray): Array with the rows of the file, shape (n_rows, 1 + n_act)
+    """
+
+    try:
+        if file_name.endswith('.npy'):
+            commands = np.load(file_name)
+        else:
+            commands = np.loadtxt(file_name, delimiter=',', ndmin=2)
+    except Exception as e:
+        print(f"\33[91m[headless] Could not load the commands file {file_name}: {str(e)}\33[0m")
+        exit()
+
+    if commands.ndim != 2 or commands.shape[1] < 2:
+        print(f"\33[91m[headless] The commands file {file_name} must have one row per time with the columns t, cmd0, cmd1, ...\33[0m")
+        exit()
+
+    return commands
+
+
+def sample_commands(commands, dt, n_steps=None):
+    """
+    Sample a sequence of timed commands at every step of the fixed clock (zero order hold)
+
+    Parameters:
+        commands (numpy.ndarray): Rows with a time followed by the commands, shape (n_rows, 1 + n_act)
+        dt (float): Time step of the clock [s]
+        n_steps (int): Number of steps to sample (by default, until the time of the last row)
+
+    Returns:
+        (numpy.ndarray): Commands applied at each step, shape (n_steps, n_act)
+    """
+
+    if n_steps is None:
+        n_steps = int(round(commands[-1,0]/dt)) + 1
+    t = np.arange(n_steps)*dt
+
+    # Index of the last row whose time was already reached at each step (small tolerance for round off)
+    idx = np.searchsorted(commands[:,0], t + 1e-9, side='right') - 1
+
+    return commands[np.clip(idx, 0, None), 1:]
+
+
+def save_traces(file_name, traces):
+    """
+    Save the traces of a run to a compressed numpy archive (one array per field)
+
+    Parameters:
+        file_name (str): Path of the output file (.npz)
+        traces (dict): Dictionary with the traces returned by headless_sim.run or headless_sim.run_batch
+    """
+
+    np.savez_compressed(file_name, **traces)
+    print(f"\33[92m[headless] Saved traces: {file_name}\33[0m")
+
+
+class headless_sim:
+    """
+    Class that runs scripted flights of the vehicle model without ROS and without PX4
+    """
+
+    def __init__(self, params):
+        """
+        Constructor for the headless_sim class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object
+        """
+
+        self.params = params
+
+        # Load model parameters
+        self.load_parameters(params)
+
+        # Fixed time step of the simulation clock [s]
+        self.dt = 1.0/self.step_hz
+
+
+    def load_parameters(self, params):
+        """
+        Load parameters for the headless simulation and store them in the instance variables
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
+        """
+
+        sim = params.snapshot().sim
+        self.step_hz = sim.step_hz
+        self.sens_hz = sim.sens_hz
+
+
+    def run(self, commands, duration=None):
+        """
+        Run one scripted flight
+
+        Parameters:
+            commands (numpy.ndarray or function): Actuator commands, either:
+                numpy.ndarray with the commands of each step, shape (n_steps, n_act)
+                function cmds = commands(t, p, v, q, w) called at every step with the simulated time and the vehicle states
+            duration (float): Duration of the flight, required when commands is a function [s]
+
+        Returns:
+            traces (dict): Dictionary of arrays with the traces
+                t, p, v, q, w, cmds, status: simulated time, states, applied commands and vehicle status at the end of each step
+                sens_t, acc, gyro, mag, baro: time and measurements of the sensors, sampled at SIM_SENS_HZ
+                seed: seed of the random number streams (the same seed and commands give the same traces)
+        """
+
+        # Number of steps of the flight
+        if callable(commands):
+            if duration is None:
+                print("\33[91m[headless] A duration is required when the commands come from a function. Exiting.\33[0m")
+                exit()
+            n_steps = int(round(duration/self.dt))
+        else:
+            commands = np.asarray(commands, dtype=float)
+            n_steps = commands.shape[0]
+
+        # Create the vehicle and the fixed clock (as fast as possible)
+        quad = DYN.vehicle_dynamics(self.params)
+        act_num = quad.vehicle_geo.act_num
+        clock = CLK.sim_clock(self.step_hz, CLK.FASTER, 0)
+        timer_sensors = TIM.timer(frequency=self.sens_hz, slip_correction=True, clock=clock)
+
+        # Preallocate the traces
+        t = np.zeros(n_steps)
+        p = np.zeros((n_steps,3))
+        v = np.zeros((n_steps,3))
+        q = np.zeros((n_steps,4))
+        w = np.zeros((n_steps,3))
+        cmds = np.zeros((n_steps,act_num))
+        status = np.zeros(n_steps, dtype=int)
+        n_sens = int(n_steps*self.sens_hz/self.step_hz) + 2
+        sens_t = np.zeros(n_sens)
+        acc = np.zeros((n_sens,3))
+        gyro = np.zeros((n_sens,3))
+        mag = np.zeros((n_sens,3))
+        baro = np.zeros(n_sens)
+
+        k_sens = 0
+        for k in range(n_steps):
+            # Commands of the step
+            if callable(commands):
+                cmd = commands(clock.get_time(), quad.p, quad.v, quad.q, quad.w)
+            else:
+                cmd = commands[k]
+            cmds[k] = np.asarray(cmd, dtype=float)[0:act_num]
+
+            # Advance the clock and the model
+            dt = clock.step()
+            quad.model_step(cmds[k], dt)
+
+            # Store the states
+            t[k] = clock.get_time()
+            p[k], v[k], q[k], w[k] = quad.get_states()
+            status[k] = quad.get_status()
+
+            # Sample the sensors
+            if(timer_sensors.tick() and k_sens < n_sens):
+                sens_t[k_sens] = t[k]
+                acc[k_sens] = quad.get_acc()
+                gyro[k_sens] = quad.get_gyro()
+                mag[k_sens] = quad.get_mag()
+                baro[k_sens] = quad.get_baro()
+                k_sens = k_sens + 1
+
+        traces = {'t': t, 'p': p, 'v': v, 'q': q, 'w': w, 'cmds': cmds, 'status': status,
+                  'sens_t': sens_t[:k_sens], 'acc': acc[:k_sens], 'gyro': gyro[:k_sens], 'mag': mag[:k_sens], 'baro': baro[:k_sens],
+                  'seed': quad.rng.seed}
+
+        return traces
+
+
+    def run_batch(self, commands, params_list=None):
+        """
+        Run several scripted flights at once, as a swarm of independent vehicles integrated in the same vectorized step
+
+        Parameters:
+            commands (numpy.ndarray): Commands of each flight at each step, shape (n_flights, n_steps, n_act)
+            params_list (list of <parameter_server.parameter_server>): One parameter server per flight (by default, the parameters of this runner for all of them)
+
+        Returns:
+            traces (dict): Same traces of run, with an extra leading axis for the flight
+        """
+
+        commands = np.asarray(commands, dtype=float)
+        n_flights, n_steps = commands.shape[0], commands.shape[1]
+        if params_list is None:
+            params_list = [self.params]*n_flights
+
+        # Create the vehicles and the fixed clock (as fast as possible)
+        swarm = SWARM.swarm_dynamics(params_list)
+        act_max = swarm.act_max
+        clock = CLK.sim_clock(self.step_hz, CLK.FASTER, 0)
+        timer_sensors = TIM.timer(frequency=self.sens_hz, slip_correction=True, clock=clock)
+
+        # Commands of all of the flights padded to the largest number of actuators
+        cmds = np.zeros((n_flights,n_steps,act_max))
+        n_act = min(act_max, commands.shape[2])
+        cmds[:,:,0:n_act] = commands[:,:,0:n_act]
+
+        # Preallocate the traces
+        t = np.zeros(n_steps)
+        p = np.zeros((n_flights,n_steps,3))
+        v = np.zeros((n_flights,n_steps,3))
+        q = np.zeros((n_flights,n_steps,4))
+        w = np.zeros((n_flights,n_steps,3))
+        status = np.zeros((n_flights,n_steps), dtype=int)
+        n_sens = int(n_steps*self.sens_hz/self.step_hz) + 2
+        sens_t = np.zeros(n_sens)
+        acc = np.zeros((n_flights,n_sens,3))
+        gyro = np.zeros((n_flights,n_sens,3))
+        mag = np.zeros((n_flights,n_sens,3))
+        baro = np.zeros((n_flights,n_sens))
+
+        k_sens = 0
+        for k in range(n_steps):
+            # Advance the clock and the model of all of the vehicles
+            dt = clock.step()
+            swarm.model_step(cmds[:,k], dt)
+
+            # Store the states
+            t[k] = clock.get_time()
+            p[:,k], v[:,k], q[:,k], w[:,k] = swarm.get_states()
+            status[:,k] = swarm.get_status()
+
+            # Sample the sensors
+            if(timer_sensors.tick() and k_sens < n_sens):
+                sens_t[k_sens] = t[k]
+                acc[:,k_sens], gyro[:,k_sens], mag[:,k_sens], baro[:,k_sens] = swarm.get_sensors()
+                k_sens = k_sens + 1
+
+        traces = {'t': t, 'p': p, 'v': v, 'q': q, 'w': w, 'cmds': cmds, 'status': status,
+                  'sens_t': sens_t[:k_sens], 'acc': acc[:,:k_sens], 'gyro': gyro[:,:k_sens], 'mag': mag[:,:k_sens], 'baro': baro[:,:k_sens],
+                  'seed': swarm.rng.seed}
+
+        return traces
+
+
+
+if __name__ == "__main__":
+    """
+    Headless simulator main function
+
+    Parameters:
+        param_file_name (str): Full path to the JSON config file
+        output_file_name (str): Full path of the output file (.npz)
+        commands_file_names (str): One or more files with the actuator commands (several files are run as a batch)
+    """
+
+    if len(sys.argv) < 4:
+        print("\33[91m[headless] Usage: headless.py params.json traces.npz commands.csv [more_commands.csv ...]\33[0m")
+        exit()
+    param_file_name = sys.argv[1]
+    output_file_name = sys.argv[2]
+    commands_file_names = sys.argv[3:]
+
+    # Load parameter file and create the runner
+    params = PRM.parameter_server(param_file_name)
+    sim = headless_sim(params)
+
+    # Sample all of the command files with the fixed clock (the shorter sequences hold their last command)
+    sequences = [load_commands(name) for name in commands_file_names]
+    n_steps = max(int(round(seq[-1,0]/sim.dt)) + 1 for seq in sequences)
+    n_act = max(seq.shape[1] - 1 for seq in sequences)
+    commands = np.zeros((len(sequences), n_steps, n_act))
+    for i, seq in enumerate(sequences):
+        commands[i,:,0:seq.shape[1]-1] = sample_commands(seq, sim.dt, n_steps)
+
+    # Run the flights
+    t0 = time.perf_counter()
+    if len(sequences) == 1:
+        traces = sim.run(commands[0])
+    else:
+        traces = sim.run_batch(commands)
+    elapsed = time.perf_counter() - t0
+    print(f"\33[94m[headless] {len(sequences)} flight(s) of {n_steps*sim.dt:.3f} s simulated in {elapsed:.3f} s ({len(sequences)*n_steps*sim.dt/elapsed:.1f}x real time)\33[0m")
+
+    # Save the traces
+    save_traces(output_file_name, traces)
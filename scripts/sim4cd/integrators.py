@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Numerical integrators for the rigid body dynamics
+# Each integrator advances the states (p, v, q, w) by one fixed time step given a function that computes their derivatives
+# The states can be single vectors (p of shape (3,), q of shape (4,)) or sets of vectors with one row per vehicle
+
+import numpy as np
+
+import math_utils as MU
+
+
+# Integration methods (values of SIM_INTEGRATOR)
+EULER = 0 # Explicit Euler
+SEMI_IMPLICIT = 1 # Semi-implicit (symplectic) Euler
+RK4 = 2 # Classic fourth order Runge-Kutta
+EXP_MAP = 3 # Semi-implicit Euler with the attitude updated by the quaternion exponential map
+
+
+def normalize_quat(q):
+    """
+    Renormalize the quaternion(s) along the last axis
+
+    Parameters:
+        q (numpy.ndarray): Quaternion(s) [qw, qx, qy, qz]
+
+    Returns:
+        (numpy.ndarray): Unit quaternion(s)
+    """
+
+    return q/np.sqrt((q*q).sum(axis=-1, keepdims=True))
+
+
+def euler_step(f, p, v, q, w, dt):
+    """
+    Explicit Euler step: all of the states are updated with the derivatives at the beginning of the step
+
+    Parameters:
+        f (function): Function f(p, v, q, w) that returns the derivatives (p_dot, v_dot, q_dot, w_dot)
+        p (numpy.ndarray): Position in the world frame [m]
+        v (numpy.ndarray): Velocity in the world frame [m/s]
+        q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
+        w (numpy.ndarray): Angular velocity in the body frame [rad/s]
+        dt (float): Time step [s]
+
+    Returns:
+        p, v, q, w (numpy.ndarray): States at the end of the step
+    """
+
+    p_dot, v_dot, q_dot, w_dot = f(p, v, q, w)
+
+    p = p + p_dot*dt
+    v = v + v_dot*dt
+    q = q + q_dot*dt
+    w = w + w_dot*dt
+
+    return p, v, normalize_quat(q), w
+
+
+def semi_implicit_step(f, p, v, q, w, dt):
+    """
+    Semi-implicit Euler step: the velocities are updated first and the new velocities are used to update the position and the attitude
+    Keeps the stiff contact forces stable for much larger steps than the explicit Euler (same arguments and returns as euler_step)
+    """
+
+    p_dot, v_dot, q_dot, w_dot = f(p, v, q, w)
+
+    v = v + v_dot*dt
+    w = w + w_dot*dt
+    p = p + v*dt
+    q = q + MU.quaternion_derivative_batch(q, w)*dt
+
+    return p, v, normalize_quat(q), w
+
+
+def rk4_step(f, p, v, q, w, dt):
+    """
+    Classic fourth order Runge-Kutta step, with the forces of the actuators held constant during the step (same arguments and returns as euler_step)
+    """
+
+    k1 = f(p, v, q, w)
+    k2 = f(p + k1[0]*(dt/2), v + k1[1]*(dt/2), q + k1[2]*(dt/2), w + k1[3]*(dt/2))
+    k3 = f(p + k2[0]*(dt/2), v + k2[1]*(dt/2), q + k2[2]*(dt/2), w + k2[3]*(dt/2))
+    k4 = f(p + k3[0]*dt, v + k3[1]*dt, q + k3[2]*dt, w + k3[3]*dt)
+
+    p = p + (k1[0] + 2*k2[0] + 2*k3[0] + k4[0])*(dt/6)
+    v = v + (k1[1] + 2*k2[1] + 2*k3[1] + k4[1])*(dt/6)
+    q = q + (k1[2] + 2*k2[2] + 2*k3[2] + k4[2])*(dt/6)
+    w = w + (k1[3] + 2*k2[3] + 2*k3[3] + k4[3])*(dt/6)
+
+    return p, v, normalize_quat(q), w
+
+
+def exp_map_step(f, p, v, q, w, dt):
+    """
+    Semi-implicit Euler step in which the attitude is rotated by the exponential map of the new angular velocity
+    The quaternion stays on the unit sphere by construction (same arguments and returns as euler_step)
+    """
+
+    p_dot, v_dot, q_dot, w_dot = f(p, v, q, w)
+
+    v = v + v_dot*dt
+    w = w + w_dot*dt
+    p = p + v*dt
+    # The angular velocity is in the body frame, so the incremental rotation is applied on the right
+    q = MU.quat_mult_batch(q, MU.quat_exp(w*dt))
+
+    return p, v, normalize_quat(q), w
+
+
+# Table of the available integrators
+INTEGRATORS = {
+    EULER: euler_step,
+    SEMI_IMPLICIT: semi_implicit_step,
+    RK4: rk4_step,
+    EXP_MAP: exp_map_step,
+}
+
+# Names of the integrators (used in logs and benchmarks)
+NAMES = {
+    EULER: "euler",
+    SEMI_IMPLICIT: "semi_implicit",
+    RK4: "rk4",
+    EXP_MAP: "exp_map",
+}
+
+
+def get_integrator(method):
+    """
+    Get the step function of an integration method
+
+    Parameters:
+        method (int): Integration method (see SIM_INTEGRATOR)
+
+    Returns:
+        (function): Step function with the signature step(f, p, v, q, w, dt)
+    """
+
+    if method not in INTEGRATORS:
+        print(f"\33[91mInvalid integrator {method}. Exiting.\33[0m")
+        exit()
+
+    return INTEGRATORS[method]
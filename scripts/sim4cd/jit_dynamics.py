@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Compiled physics step
+# Optional backend that compiles the full step of vehicle_dynamics (battery, actuators, ground interaction, forces and integration) with Numba
+# The kernel works on flat float64 arrays; vehicle_dynamics uses it when SIM_JIT_EN is set and Numba is installed, and keeps its pure Python path otherwise
+
+import numpy as np
+from math import sqrt, sin, cos
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Replacement of the numba.njit decorator when Numba is not installed (the functions run as plain Python)
+        """
+
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+import integrators as INT
+
+
+# Layout of the state vector
+P = 0 # Position in the world frame (3)
+V = 3 # Velocity in the world frame (3)
+Q = 6 # Orientation quaternion (4)
+W = 10 # Angular velocity in the body frame (3)
+STATUS = 13 # Vehicle status (0: landed, 1: flying, 2: landing)
+Z_LAND = 14 # Height of the last landing
+Q_LAND = 15 # Orientation quaternion of the landing (4)
+FORCE_B = 19 # Force applied to the body after the ground interaction (3)
+TORQUE_B = 22 # Torque applied to the body after the ground interaction (3)
+TOTAL_FORCE_W = 25 # Non inertial forces in the world frame at the beginning of the step (3)
+ACT_FORCE = 28 # Collective force of the actuators (3)
+ACT_TORQUE = 31 # Collective torque of the actuators (3)
+I_ACT = 34 # Total current of the actuators
+BAT_Q = 35 # Charge of the battery
+BAT_SOC = 36 # State of charge of the battery
+BAT_I = 37 # Current drawn from the battery
+BAT_E = 38 # Internal voltage of the battery
+BAT_V = 39 # Output voltage of the battery
+STATE_SIZE = 40
+
+# Layout of the actuators state, one row per variable and one column per actuator
+ACT_SPEED = 0
+ACT_POSITION = 1
+ACT_CURRENT = 2
+ACT_FORCE_I = 3
+ACT_TORQUE_I = 4
+ACT_CMD = 5
+ACT_STATE_SIZE = 6
+
+# Layout of the vehicle parameters
+PRM_G = 0
+PRM_M = 1
+PRM_DRAG_V = 2
+PRM_DRAG_W = 3
+PRM_J = 4 # Diagonal of the moment of inertia (3)
+PRM_JINV = 7 # Diagonal of the inverse of the moment of inertia (3)
+PRM_WIND = 10 # Wind velocity (3)
+PRM_BAT_FULL = 13
+PRM_BAT_CELLS = 14
+PRM_BAT_IDLE = 15
+PRM_BAT_R = 16
+PRM_SIZE = 17
+
+# Layout of the parameters of the actuators, one row per actuator
+APRM_TIME_CTE = 0
+APRM_JR = 1
+APRM_SPIN = 2
+APRM_VOLT2SPEED = 3 # Polynomial coefficients (3)
+APRM_SPEED2THRUST = 6 # (3)
+APRM_SPEED2TORQUE = 9 # (3)
+APRM_TORQUE2AMPS = 12 # (3)
+APRM_DIR = 15 # Direction of propulsion (3)
+APRM_ARM = 18 # Moment arm (3)
+APRM_SIZE = 21
+
+
+@njit(cache=True)
+def derivatives(x, x_dot, force_b, torque_b, params, L, axis):
+    """
+    Compute the derivatives of the rigid body states (same model of vehicle_dynamics.derivatives)
+
+    Parameters:
+        x (numpy.ndarray): States [p, v, q, w], shape (13,)
+        x_dot (numpy.ndarray): Array where the derivatives are written, shape (13,)
+        force_b (numpy.ndarray): Force of the actuators in the body frame [N]
+        torque_b (numpy.ndarray): Torque of the actuators in the body frame [Nm]
+        params (numpy.ndarray): Vehicle parameters
+        L (float): Total signed angular momentum of the actuators
+        axis (numpy.ndarray): Axis of the angular momentum of the actuators (direction of the first actuator)
+    """
+
+    m = params[PRM_M]
+    drag_v = params[PRM_DRAG_V]
+    drag_w = params[PRM_DRAG_W]
+    qw, qx, qy, qz = x[Q], x[Q+1], x[Q+2], x[Q+3]
+    wx, wy, wz = x[W], x[W+1], x[W+2]
+
+    # Force of the actuators rotated to the world frame
+    fx, fy, fz = force_b[0], force_b[1], force_b[2]
+    a = qw*qw - qx*qx - qy*qy - qz*qz
+    b = 2*(qx*fx + qy*fy + qz*fz)
+    rx = a*fx + b*qx + 2*qw*(qy*fz - qz*fy)
+    ry = a*fy + b*qy + 2*qw*(qz*fx - qx*fz)
+    rz = a*fz + b*qz + 2*qw*(qx*fy - qy*fx)
+
+    # Position and velocity (with the linear drag)
+    for k in range(3):
+        x_dot[P+k] = x[V+k]
+    x_dot[V] = (rx - drag_v*(x[V] - params[PRM_WIND]))/m
+    x_dot[V+1] = (ry - drag_v*(x[V+1] - params[PRM_WIND+1]))/m
+    x_dot[V+2] = -params[PRM_G] + (rz - drag_v*(x[V+2] - params[PRM_WIND+2]))/m
+
+    # Orientation
+    x_dot[Q] = 0.5*(-wx*qx - wy*qy - wz*qz)
+    x_dot[Q+1] = 0.5*(wx*qw + wz*qy - wy*qz)
+    x_dot[Q+2] = 0.5*(wy*qw - wz*qx + wx*qz)
+    x_dot[Q+3] = 0.5*(wz*qw + wy*qx - wx*qy)
+
+    # Angular velocity (gyroscopic effect of the body and of the actuators, and angular drag)
+    Jx, Jy, Jz = params[PRM_J], params[PRM_J+1], params[PRM_J+2]
+    tx = -(wy*Jz*wz - wz*Jy*wy) + torque_b[0] - drag_w*wx - L*(wy*axis[2] - wz*axis[1])
+    ty = -(wz*Jx*wx - wx*Jz*wz) + torque_b[1] - drag_w*wy - L*(wz*axis[0] - wx*axis[2])
+    tz = -(wx*Jy*wy - wy*Jx*wx) + torque_b[2] - drag_w*wz - L*(wx*axis[1] - wy*axis[0])
+    x_dot[W] = params[PRM_JINV]*tx
+    x_dot[W+1] = params[PRM_JINV+1]*ty
+    x_dot[W+2] = params[PRM_JINV+2]*tz
+
+
+@njit(cache=True)
+def normalize_quat(x):
+    """
+    Renormalize the quaternion of the states in place
+
+    Parameters:
+        x (numpy.ndarray): States [p, v, q, w], shape (13,)
+    """
+
+    norm = sqrt(x[Q]*x[Q] + x[Q+1]*x[Q+1] + x[Q+2]*x[Q+2] + x[Q+3]*x[Q+3])
+    for k in range(4):
+        x[Q+k] = x[Q+k]/norm
+
+
+@njit(cache=True)
+def integrate(x, force_b, torque_b, params, L, axis, dt, method):
+    """
+    Advance the rigid body states by one step in place (same methods of the integrators module)
+
+    Parameters:
+        x (numpy.ndarray): States [p, v, q, w], shape (13,)
+        force_b (numpy.ndarray): Force of the actuators in the body frame [N]
+        torque_b (numpy.ndarray): Torque of the actuators in the body frame [Nm]
+        params (numpy.ndarray): Vehicle parameters
+        L (float): Total signed angular momentum of the actuators
+        axis (numpy.ndarray): Axis of the angular momentum of the actuators
+        dt (float): Time step [s]
+        method (int): Integration method (see SIM_INTEGRATOR)
+    """
+
+    k1 = np.empty(13)
+    derivatives(x, k1, force_b, torque_b, params, L, axis)
+
+    if method == 2:
+        # Runge-Kutta 4
+        k2 = np.empty(13)
+        k3 = np.empty(13)
+        k4 = np.empty(13)
+        xs = np.empty(13)
+        for k in range(13):
+            xs[k] = x[k] + k1[k]*(dt/2)
+        derivatives(xs, k2, force_b, torque_b, params, L, axis)
+        for k in range(13):
+            xs[k] = x[k] + k2[k]*(dt/2)
+        derivatives(xs, k3, force_b, torque_b, params, L, axis)
+        for k in range(13):
+            xs[k] = x[k] + k3[k]*dt
+        derivatives(xs, k4, force_b, torque_b, params, L, axis)
+        for k in range(13):
+            x[k] = x[k] + (k1[k] + 2*k2[k] + 2*k3[k] + k4[k])*(dt/6)
+
+    elif method == 1 or method == 3:
+        # Semi-implicit Euler: the new velocities update the position and the attitude
+        for k in range(3):
+            x[V+k] = x[V+k] + k1[V+k]*dt
+            x[W+k] = x[W+k] + k1[W+k]*dt
+            x[P+k] = x[P+k] + x[V+k]*dt
+        qw, qx, qy, qz = x[Q], x[Q+1], x[Q+2], x[Q+3]
+        wx, wy, wz = x[W], x[W+1], x[W+2]
+        if method == 1:
+            x[Q] = qw + 0.5*(-wx*qx - wy*qy - wz*qz)*dt
+            x[Q+1] = qx + 0.5*(wx*qw + wz*qy - wy*qz)*dt
+            x[Q+2] = qy + 0.5*(wy*qw - wz*qx + wx*qz)*dt
+            x[Q+3] = qz + 0.5*(wz*qw + wy*qx - wx*qy)*dt
+        else:
+            # Exponential map of the rotation w*dt, applied on the right
+            angle = sqrt(wx*wx + wy*wy + wz*wz)*dt
+            ew = cos(angle/2)
+            s = 0.5*dt if angle == 0 else sin(angle/2)*dt/angle
+            ex, ey, ez = s*wx, s*wy, s*wz
+            x[Q] = qw*ew - qx*ex - qy*ey - qz*ez
+            x[Q+1] = qw*ex + qx*ew + qy*ez - qz*ey
+            x[Q+2] = qw*ey - qx*ez + qy*ew + qz*ex
+            x[Q+3] = qw*ez + qx*ey - qy*ex + qz*ew
+
+    else:
+        # Explicit Euler
+        for k in range(13):
+            x[k] = x[k] + k1[k]*dt
+
+    normalize_quat(x)
+
+
+@njit(cache=True)
+def physics_step(state, act_state, params, act_params, cell_coeffs, cmds, dt, method):
+    """
+    Perform the full simulation step of one vehicle in place (same model of vehicle_dynamics.model_step)
+
+    Parameters:
+        state (numpy.ndarray): Vehicle state, shape (STATE_SIZE,)
+        act_state (numpy.ndarray): Actuators state, shape (ACT_STATE_SIZE,n_act)
+        params (numpy.ndarray): Vehicle parameters, shape (PRM_SIZE,)
+        act_params (numpy.ndarray): Actuators parameters, shape (n_act,APRM_SIZE)
+        cell_coeffs (numpy.ndarray): Coefficients of the polynomial of the voltage of a battery cell
+        cmds (numpy.ndarray): PWM values (from 0 to 1) for each actuator, shape (n_act,)
+        dt (float): Time step given by the simulation clock [s]
+        method (int): Integration method (see SIM_INTEGRATOR)
+    """
+
+    n_act = act_state.shape[1]
+    m = params[PRM_M]
+    g = params[PRM_G]
+
+    # Battery, with the current of the actuators of the previous step
+    I = state[I_ACT] + params[PRM_BAT_IDLE]
+    state[BAT_I] = I
+    state[BAT_Q] = state[BAT_Q] - I*dt
+    soc = (state[BAT_Q]/3.6)/params[PRM_BAT_FULL]
+    state[BAT_SOC] = soc
+    power = 1.0
+    E_cell = 0.0
+    for c in cell_coeffs:
+        E_cell = E_cell + c*power
+        power = power*soc
+    state[BAT_E] = E_cell*params[PRM_BAT_CELLS]
+    V_out = state[BAT_E] - params[PRM_BAT_R]*I
+    state[BAT_V] = V_out
+
+    # Actuators (first order speed dynamics and polynomial maps)
+    force_b = np.zeros(3)
+    torque_b = np.zeros(3)
+    I_act = 0.0
+    L = 0.0
+    for i in range(n_act):
+        a = act_params[i]
+        act_state[ACT_CMD,i] = cmds[i]
+        act_state[ACT_POSITION,i] = act_state[ACT_POSITION,i] + act_state[ACT_SPEED,i]*dt
+        u = cmds[i]*V_out
+        speed_ss = (a[APRM_VOLT2SPEED+2]*u + a[APRM_VOLT2SPEED+1])*u + a[APRM_VOLT2SPEED]
+        time_cte = a[APRM_TIME_CTE]
+        speed = ((time_cte-dt)/time_cte)*act_state[ACT_SPEED,i] + (dt/time_cte)*speed_ss
+        force = (a[APRM_SPEED2THRUST+2]*speed + a[APRM_SPEED2THRUST+1])*speed + a[APRM_SPEED2THRUST]
+        torque = (a[APRM_SPEED2TORQUE+2]*speed + a[APRM_SPEED2TORQUE+1])*speed + a[APRM_SPEED2TORQUE]
+        abs_torque = abs(torque)
+        current = (a[APRM_TORQUE2AMPS+2]*abs_torque + a[APRM_TORQUE2AMPS+1])*abs_torque + a[APRM_TORQUE2AMPS]
+        act_state[ACT_SPEED,i] = speed
+        act_state[ACT_FORCE_I,i] = force
+        act_state[ACT_TORQUE_I,i] = torque
+        act_state[ACT_CURRENT,i] = current
+        for k in range(3):
+            force_b[k] = force_b[k] + force*a[APRM_DIR+k]
+            torque_b[k] = torque_b[k] + force*a[APRM_ARM+k] + torque*a[APRM_DIR+k]
+        I_act = I_act + current
+        L = L + a[APRM_SPIN]*speed*a[APRM_JR]
+    state[I_ACT] = I_act
+    for k in range(3):
+        state[ACT_FORCE+k] = force_b[k]
+        state[ACT_TORQUE+k] = torque_b[k]
+
+    # Ground interaction (same state machine of vehicle_dynamics.check_ground_interaction)
+    status = state[STATUS]
+    if status == 0:
+        if force_b[2] > m*g:
+            state[STATUS] = 1
+        else:
+            for k in range(3):
+                state[V+k] = 0.0
+                state[W+k] = 0.0
+                torque_b[k] = 0.0
+            force_b[0] = 0.0
+            force_b[1] = 0.0
+            force_b[2] = m*g
+
+    elif status == 1:
+        if state[P+2] < state[Z_LAND]:
+            state[STATUS] = 2
+            # The landing orientation keeps only the yaw (the roll and pitch components of the attitude are also cleared)
+            state[Q+1] = 0.0
+            state[Q+2] = 0.0
+            norm = sqrt(state[Q]*state[Q] + state[Q+3]*state[Q+3])
+            state[Q_LAND] = state[Q]/norm
+            state[Q_LAND+1] = 0.0
+            state[Q_LAND+2] = 0.0
+            state[Q_LAND+3] = state[Q+3]/norm
+
+    elif status == 2:
+        v_norm = sqrt(state[V]*state[V] + state[V+1]*state[V+1] + state[V+2]*state[V+2])
+        w_norm = sqrt(state[W]*state[W] + state[W+1]*state[W+1] + state[W+2]*state[W+2])
+        if v_norm < 0.001 and w_norm < 0.001 and state[Q+1] < 0.001 and state[Q+2] < 0.001:
+            state[STATUS] = 0
+            for k in range(3):
+                state[V+k] = 0.0
+                state[W+k] = 0.0
+                torque_b[k] = 0.0
+            state[Z_LAND] = state[P+2]
+            state[Q+1] = 0.0
+            state[Q+2] = 0.0
+            norm = sqrt(state[Q]*state[Q] + state[Q+3]*state[Q+3])
+            state[Q] = state[Q]/norm
+            state[Q+3] = state[Q+3]/norm
+            force_b[0] = 0.0
+            force_b[1] = 0.0
+            force_b[2] = m*g
+        else:
+            # Error between the landing attitude and the current one (conj(q_land)*q)
+            lw, lx, ly, lz = state[Q_LAND], -state[Q_LAND+1], -state[Q_LAND+2], -state[Q_LAND+3]
+            qw, qx, qy, qz = state[Q], state[Q+1], state[Q+2], state[Q+3]
+            aw = lw*qw - lx*qx - ly*qy - lz*qz
+            ax = lw*qx + lx*qw + ly*qz - lz*qy
+            ay = lw*qy - lx*qz + ly*qw + lz*qx
+            az = lw*qz + lx*qy - ly*qx + lz*qw
+            if aw < 0:
+                ax, ay, az = -ax, -ay, -az
+            # Braking force in the world frame, rotated to the body frame
+            bx = -m*state[V]*20
+            by = -m*state[V+1]*20
+            bz = -m*state[V+2]*20*5 + m*g - state[P+2]*500
+            a = qw*qw - qx*qx - qy*qy - qz*qz
+            b = 2*(qx*bx + qy*by + qz*bz)
+            force_b[0] = a*bx + b*qx - 2*qw*(qy*bz - qz*by)
+            force_b[1] = a*by + b*qy - 2*qw*(qz*bx - qx*bz)
+            force_b[2] = a*bz + b*qz - 2*qw*(qx*by - qy*bx)
+            torque_b[0] = -params[PRM_J]*state[W]*10 - ax*20
+            torque_b[1] = -params[PRM_J+1]*state[W+1]*10 - ay*20
+            torque_b[2] = -params[PRM_J+2]*state[W+2]*10 - az*20
+
+    for k in range(3):
+        state[FORCE_B+k] = force_b[k]
+        state[TORQUE_B+k] = torque_b[k]
+
+    # Non inertial forces at the beginning of the step (used by the accelerometer)
+    qw, qx, qy, qz = state[Q], state[Q+1], state[Q+2], state[Q+3]
+    fx, fy, fz = force_b[0], force_b[1], force_b[2]
+    a = qw*qw - qx*qx - qy*qy - qz*qz
+    b = 2*(qx*fx + qy*fy + qz*fz)
+    state[TOTAL_FORCE_W] = a*fx + b*qx + 2*qw*(qy*fz - qz*fy) - params[PRM_DRAG_V]*(state[V] - params[PRM_WIND])
+    state[TOTAL_FORCE_W+1] = a*fy + b*qy + 2*qw*(qz*fx - qx*fz) - params[PRM_DRAG_V]*(state[V+1] - params[PRM_WIND+1])
+    state[TOTAL_FORCE_W+2] = a*fz + b*qz + 2*qw*(qx*fy - qy*fx) - params[PRM_DRAG_V]*(state[V+2] - params[PRM_WIND+2])
+
+    # Rigid body integration (the momentum of the actuators is taken along the direction of the first actuator)
+    x = state[0:13]
+    integrate(x, force_b, torque_b, params, L, act_params[0,APRM_DIR:APRM_DIR+3], dt, method)
+
+
+class jit_model:
+    """
+    Class that runs the model_step of a vehicle_dynamics object with the compiled kernel
+    The states stay in the attributes of the vehicle (and of its actuators and battery), which become views of the flat arrays of the kernel
+    """
+
+    def __init__(self, quad):
+        """
+        Constructor for the jit_model class
+
+        Parameters:
+            quad (<dynamics.vehicle_dynamics>): Vehicle whose step will be compiled
+        """
+
+        self.quad = quad
+        self.geo = quad.vehicle_geo
+        self.act = quad.vehicle_geo.actuators
+        self.bat = quad.vehicle_geo.battery
+        self.n_act = self.geo.act_num
+
+        # Flat arrays of the kernel
+        self.state = np.zeros(STATE_SIZE)
+        self.act_state = np.zeros((ACT_STATE_SIZE,self.n_act))
+        self.cmds = np.zeros(self.n_act)
+
+        # Array attributes and their views in the flat arrays
+        self.array_views = [
+            (quad, 'p', self.state[P:P+3]),
+            (quad, 'v', self.state[V:V+3]),
+            (quad, 'q', self.state[Q:Q+4]),
+            (quad, 'w', self.state[W:W+3]),
+            (quad, 'q_land', self.state[Q_LAND:Q_LAND+4]),
+            (quad, 'Force_b', self.state[FORCE_B:FORCE_B+3]),
+            (quad, 'Torque_b', self.state[TORQUE_B:TORQUE_B+3]),
+            (quad, 'total_force_w', self.state[TOTAL_FORCE_W:TOTAL_FORCE_W+3]),
+            (self.geo, 'total_force', self.state[ACT_FORCE:ACT_FORCE+3]),
+            (self.geo, 'total_torque', self.state[ACT_TORQUE:ACT_TORQUE+3]),
+            (self.act, 'speed', self.act_state[ACT_SPEED]),
+            (self.act, 'position', self.act_state[ACT_POSITION]),
+            (self.act, 'current', self.act_state[ACT_CURRENT]),
+            (self.act, 'force', self.act_state[ACT_FORCE_I]),
+            (self.act, 'torque', self.act_state[ACT_TORQUE_I]),
+        ]
+        # Scalar attributes and their indexes in the state vector
+        self.scalar_indexes = [
+            (quad, 'status', STATUS),
+            (quad, 'z_land', Z_LAND),
+            (self.geo, 'I_actuators', I_ACT),
+            (self.bat, 'q', BAT_Q),
+            (self.bat, 'soc', BAT_SOC),
+            (self.bat, 'I', BAT_I),
+            (self.bat, 'E', BAT_E),
+            (self.bat, 'V', BAT_V),
+        ]
+
+        # Load the current states and parameters of the vehicle
+        for obj, name, view in self.array_views:
+            view[:] = getattr(obj, name)
+        self.load_parameters()
+
+
+    def load_parameters(self):
+        """
+        Pack the parameters of the vehicle, its actuators and its battery into the flat arrays of the kernel
+        Must be called again if the parameters of the vehicle change
+        """
+
+        quad, act, bat = self.quad, self.act, self.bat
+
+        self.params = np.zeros(PRM_SIZE)
+        self.params[PRM_G] = quad.g
+        self.params[PRM_M] = quad.m
+        self.params[PRM_DRAG_V] = quad.drag_v
+        self.params[PRM_DRAG_W] = quad.drag_w
+        self.params[PRM_J:PRM_J+3] = np.diag(quad.J)
+        self.params[PRM_JINV:PRM_JINV+3] = np.diag(quad.Jinv)
+        self.params[PRM_WIND:PRM_WIND+3] = quad.wind_vw
+        self.params[PRM_BAT_FULL] = bat.full_charge
+        self.params[PRM_BAT_CELLS] = bat.n_cells
+        self.params[PRM_BAT_IDLE] = bat.idle_current
+        self.params[PRM_BAT_R] = bat.internal_R
+
+        self.act_params = np.zeros((self.n_act,APRM_SIZE))
+        self.act_params[:,APRM_TIME_CTE] = act.time_cte
+        self.act_params[:,APRM_JR] = act.Jr
+        self.act_params[:,APRM_SPIN] = act.spin
+        self.act_params[:,APRM_VOLT2SPEED:APRM_VOLT2SPEED+3] = act.volt_to_speed
+        self.act_params[:,APRM_SPEED2THRUST:APRM_SPEED2THRUST+3] = act.speed_to_thrust
+        self.act_params[:,APRM_SPEED2TORQUE:APRM_SPEED2TORQUE+3] = act.speed_to_torque
+        self.act_params[:,APRM_TORQUE2AMPS:APRM_TORQUE2AMPS+3] = act.torque_to_current
+        self.act_params[:,APRM_DIR:APRM_DIR+3] = act.directions
+        self.act_params[:,APRM_ARM:APRM_ARM+3] = act.moment_arms
+
+        self.cell_coeffs = np.array(bat.poly_cell_voltage.c, dtype=float)
+        self.method = quad.integrator
+
+
+    def step(self, cmd, dt):
+        """
+        Perform the step of the vehicle with the compiled kernel (same behavior of vehicle_dynamics.model_step)
+
+        Parameters:
+            cmd (numpy.ndarray): PWM values (from 0 to 1) for each actuator
+            dt (float): Time step given by the simulation clock [s]
+        """
+
+        # Bring in the attributes that were replaced since the last step (e.g. a reset of the position)
+        for obj, name, view in self.array_views:
+            value = getattr(obj, name)
+            if value is not view:
+                view[:] = value
+        for obj, name, index in self.scalar_indexes:
+            self.state[index] = getattr(obj, name, 0.0)
+        self.cmds[:] = cmd[0:self.n_act]
+
+        physics_step(self.state, self.act_state, self.params, self.act_params, self.cell_coeffs, self.cmds, dt, self.method)
+
+        # Expose the new states through the attributes of the vehicle
+        for obj, name, view in self.array_views:
+            setattr(obj, name, view)
+        for obj, name, index in self.scalar_indexes:
+            setattr(obj, name, self.state[index])
+        self.quad.status = int(self.state[STATUS])
+        self.quad.cmds = self.cmds
+        self.geo.cmds = self.cmds
+        self.act.cmd = self.cmds
+        self.quad.angle_list = self.act.position
+
+
+
+if __name__ == "__main__":
+
+    # Check the compiled step against the pure Python step and measure their costs
+    # Usage: python3 jit_dynamics.py [params.json]
+    import sys
+    import os
+    import time
+    import parameter_server as PRM
+    import dynamics as DYN
+
+    param_file_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')
+    params = PRM.parameter_server(param_file_name)
+    print(f"Numba available: {NUMBA_AVAILABLE}")
+    dt = 0.001
+
+    # Take off, fly and land again
+    def commands(k, act_num):
+        level = 0.8 if k < 800 else (0.5 if k < 6000 else 0.0)
+        cmd = np.full(act_num, level)
+        cmd[0] = cmd[0] + 0.01*np.sin(k*0.01)
+        return cmd
+
+    for method in INT.INTEGRATORS:
+        params.set_parameter_value('SIM_INTEGRATOR', method)
+        reference = DYN.vehicle_dynamics(params)
+        quad = DYN.vehicle_dynamics(params)
+        model = jit_model(quad)
+        error = 0
+        for k in range(11000):
+            cmd = commands(k, quad.vehicle_geo.act_num)
+            reference.model_step(cmd, dt)
+            model.step(cmd, dt)
+            error = max(error, np.abs(np.concatenate(reference.get_states()) - np.concatenate(quad.get_states())).max())
+        print(f"{INT.NAMES[method]:>14s}: maximum difference to the Python step {error:.3e}, final status {reference.get_status()} {quad.get_status()}, battery {reference.vehicle_geo.battery.V:.6f} {quad.vehicle_geo.battery.V:.6f} V")
+
+    # Cost of one step while flying
+    params.set_parameter_value('SIM_INTEGRATOR', INT.EULER)
+    cmd = np.full(8, 0.62)
+    for name in ['python', 'kernel', 'jit_model']:
+        quad = DYN.vehicle_dynamics(params)
+        model = jit_model(quad)
+        steps = 20000
+        t0 = time.perf_counter()
+        if name == 'python':
+            for k in range(steps):
+                quad.model_step(cmd, dt)
+        elif name == 'kernel':
+            for k in range(steps):
+                physics_step(model.state, model.act_state, model.params, model.act_params, model.cell_coeffs, model.cmds, dt, 0)
+        else:
+            for k in range(steps):
+                model.step(cmd, dt)
+        print(f"{name:>10s}: {(time.perf_counter()-t0)/steps*1e6:8.2f} us/step")
@@ -222,4 +222,350 @@ def quat2rpy(q):
 
     rpy = np.array([phi, theta, psi])
 
-    return rpy
\ No newline at end of file
+    return rpy
+
+def quat_conj_batch(q_in, out=None):
+    """
+    Return the conjugates of a set of quaternions
+
+    Parameters:
+        q_in (numpy.ndarray): Input quaternions, one per row, shape (N,4) [qw, qx, qy, qz]
+        out (numpy.ndarray): Optional array of shape (N,4) where the result is written (it must not be q_in)
+
+    Returns:
+        q_conj (numpy.ndarray): The conjugates of the quaternions, shape (N,4)
+    """
+
+    q_conj = np.negative(q_in, out=out)
+    q_conj[:,0] = q_in[:,0]
+
+    return q_conj
+
+
+def quat_mult_batch(q1, q2, out=None):
+    """
+    Perform the quaternion multiplication (Hamilton product) of two sets of quaternions, row by row
+    Also works with single quaternions of shape (4,)
+
+    Parameters:
+        q1 (numpy.ndarray): First quaternions, shape (N,4) [qw, qx, qy, qz]
+        q2 (numpy.ndarray): Second quaternions, shape (N,4) [qw, qx, qy, qz]
+        out (numpy.ndarray): Optional array of shape (N,4) where the result is written (it must not be q1 or q2)
+
+    Returns:
+        q_result (numpy.ndarray): The products q1*q2, shape (N,4)
+    """
+
+    w1, x1, y1, z1 = q1[...,0], q1[...,1], q1[...,2], q1[...,3]
+    w2, x2, y2, z2 = q2[...,0], q2[...,1], q2[...,2], q2[...,3]
+
+    q_result = np.empty(np.broadcast(q1, q2).shape) if out is None else out
+    q_result[...,0] = w1*w2 - x1*x2 - y1*y2 - z1*z2
+    q_result[...,1] = w1*x2 + x1*w2 + y1*z2 - z1*y2
+    q_result[...,2] = w1*y2 - x1*z2 + y1*w2 + z1*x2
+    q_result[...,3] = w1*z2 + x1*y2 - y1*x2 + z1*w2
+
+    return q_result
+
+
+def cross_batch(a, b, out=None):
+    """
+    Compute the cross products of two sets of 3D vectors, row by row
+    Explicit version of numpy.cross, much cheaper for the small arrays used in the simulation
+
+    Parameters:
+        a (numpy.ndarray): First vectors, shape (N,3)
+        b (numpy.ndarray): Second vectors, shape (N,3)
+        out (numpy.ndarray): Optional array of shape (N,3) where the result is written (it must not be a or b)
+
+    Returns:
+        c (numpy.ndarray): The cross products a x b, shape (N,3)
+    """
+
+    a0, a1, a2 = a[:,0], a[:,1], a[:,2]
+    b0, b1, b2 = b[:,0], b[:,1], b[:,2]
+
+    c = np.empty(np.broadcast(a, b).shape) if out is None else out
+    c[:,0] = a1*b2 - a2*b1
+    c[:,1] = a2*b0 - a0*b2
+    c[:,2] = a0*b1 - a1*b0
+
+    return c
+
+
+def quat_apply_rot_batch(q_in, u_in, out=None):
+    """
+    Apply the rotations represented by a set of unit quaternions to a set of vectors, row by row
+    Uses the expanded form of q*u*q_conj: v = u + 2*qw*(r x u) + 2*r x (r x u), with r = [qx, qy, qz]
+
+    Parameters:
+        q_in (numpy.ndarray): Unit quaternions, shape (N,4) [qw, qx, qy, qz]
+        u_in (numpy.ndarray): Vectors to which the rotations will be applied to, shape (N,3)
+        out (numpy.ndarray): Optional array of shape (N,3) where the result is written (it must not be u_in)
+
+    Returns:
+        v (numpy.ndarray): Rotated vectors, shape (N,3)
+    """
+
+    # t = 2*(r x u) is the only temporary: the second cross product is written directly into the output
+    r = q_in[:,1:4]
+    t = cross_batch(r, u_in)
+    t *= 2
+    v = cross_batch(r, t, out)
+    v += u_in
+    t *= q_in[:,0:1]
+    v += t
+
+    return v
+
+
+def quat_apply_inv_rot_batch(q_in, u_in, out=None):
+    """
+    Apply the inverse of the rotations represented by a set of unit quaternions to a set of vectors, row by row
+    Same as quat_apply_rot_batch(quat_conj_batch(q_in), u_in), without building the conjugates: v = u - 2*qw*(r x u) + 2*r x (r x u)
+
+    Parameters:
+        q_in (numpy.ndarray): Unit quaternions, shape (N,4) [qw, qx, qy, qz]
+        u_in (numpy.ndarray): Vectors to which the inverse rotations will be applied to, shape (N,3)
+        out (numpy.ndarray): Optional array of shape (N,3) where the result is written (it must not be u_in)
+
+    Returns:
+        v (numpy.ndarray): Rotated vectors, shape (N,3)
+    """
+
+    r = q_in[:,1:4]
+    t = cross_batch(r, u_in)
+    t *= 2
+    v = cross_batch(r, t, out)
+    v += u_in
+    t *= q_in[:,0:1]
+    v -= t
+
+    return v
+
+
+def quaternion_derivative_batch(q, w, out=None):
+    """
+    Calculate the derivatives of a set of quaternions given their angular velocities
+    Also works with a single quaternion of shape (4,)
+
+    Parameters:
+        q (numpy.ndarray): Input quaternions, shape (N,4) [qw, qx, qy, qz]
+        w (numpy.ndarray): Angular velocities in the body frames, shape (N,3) [wx, wy, wz]
+        out (numpy.ndarray): Optional array of shape (N,4) where the result is written (it must not be q)
+
+    Returns:
+        q_dot (numpy.ndarray): The derivatives of the quaternions, shape (N,4)
+    """
+
+    # Same as quaternion_derivative: q_dot = 0.5*q*[0, w]
+    qw, qx, qy, qz = q[...,0], q[...,1], q[...,2], q[...,3]
+    wx, wy, wz = w[...,0], w[...,1], w[...,2]
+
+    q_dot = np.empty(q.shape) if out is None else out
+    q_dot[...,0] = 0.5*(-wx*qx - wy*qy - wz*qz)
+    q_dot[...,1] = 0.5*(wx*qw + wz*qy - wy*qz)
+    q_dot[...,2] = 0.5*(wy*qw - wz*qx + wx*qz)
+    q_dot[...,3] = 0.5*(wz*qw + wy*qx - wx*qy)
+
+    return q_dot
+
+
+def normalize_rows(u, abs_value=1.0):
+    """
+    Normalize each row of a matrix
+
+    Parameters:
+        u (numpy.ndarray): Matrix whose rows will be normalized to the norm abs_value, shape (N,M)
+        abs_value (float): Norm of the normalized rows
+
+    Returns:
+        (numpy.ndarray): Normalized (to the norm abs_value) version of u
+    """
+
+    return abs_value*u/np.sqrt((u*u).sum(axis=1, keepdims=True))
+
+
+def transform_points(p, q, points, out=None):
+    """
+    Map a set of points of a rigid body from its body frame to the world frame, given the pose of the body
+    All of the points are rotated with a single multiplication by the rotation matrix of q (instead of one quat_apply_rot per point)
+
+    Parameters:
+        p (numpy.ndarray): Position of the body in the world frame [x, y, z]
+        q (numpy.ndarray): Unit quaternion of the orientation of the body in the world frame [qw, qx, qy, qz]
+        points (numpy.ndarray): Points in the body frame, shape (N,3)
+        out (numpy.ndarray): Optional array of shape (N,3) where the result is written (it must not be points)
+
+    Returns:
+        points_w (numpy.ndarray): Points in the world frame, shape (N,3)
+    """
+
+    R = quat2rotm(q)
+    points_w = np.matmul(points, R.T, out=out)
+    points_w += p
+
+    return points_w
+
+
+def transform_poses(p, q, points, orientations, points_out=None, orientations_out=None):
+    """
+    Map a set of poses attached to a rigid body (e.g. the parts of a visualization) from its body frame to the world frame
+
+    Parameters:
+        p (numpy.ndarray): Position of the body in the world frame [x, y, z]
+        q (numpy.ndarray): Unit quaternion of the orientation of the body in the world frame [qw, qx, qy, qz]
+        points (numpy.ndarray): Positions in the body frame, shape (N,3)
+        orientations (numpy.ndarray): Orientations with respect to the body, shape (N,4) [qw, qx, qy, qz]
+        points_out (numpy.ndarray): Optional array of shape (N,3) where the positions are written
+        orientations_out (numpy.ndarray): Optional array of shape (N,4) where the orientations are written
+
+    Returns:
+        points_w (numpy.ndarray): Positions in the world frame, shape (N,3)
+        orientations_w (numpy.ndarray): Orientations in the world frame, shape (N,4)
+    """
+
+    points_w = transform_points(p, q, points, points_out)
+    orientations_w = quat_mult_batch(q, orientations, orientations_out)
+
+    return points_w, orientations_w
+
+
+
+def quat_exp(r):
+    """
+    Compute the quaternion that represents a rotation vector (exponential map)
+    Works with a single vector of shape (3,) or with a set of vectors of shape (N,3)
+
+    Parameters:
+        r (numpy.ndarray): Rotation vectors (axis times angle) [rad]
+
+    Returns:
+        q (numpy.ndarray): Unit quaternions [qw, qx, qy, qz] equivalent to the rotation vectors
+    """
+
+    angle = np.sqrt((r*r).sum(axis=-1, keepdims=True))
+
+    q = np.empty(r.shape[:-1] + (4,))
+    q[...,0:1] = np.cos(angle/2)
+    # sin(angle/2)/angle written with sinc, so it is well defined for null rotations
+    q[...,1:4] = 0.5*np.sinc(angle/(2*pi))*r
+
+    return q
+
+
+# Fast kernels for single quaternions and vectors
+# Same results of the functions above (kept as the reference), computed with Python floats and without intermediate arrays
+# The inputs must be numpy arrays, and the results can be written to preallocated arrays with the out parameter
+
+def quat_mult_fast(q1, q2, out=None):
+    """
+    Perform quaternion multiplication (Hamilton product), same as quat_mult
+
+    Parameters:
+        q1 (numpy.ndarray): First quaternion [qw, qx, qy, qz].
+        q2 (numpy.ndarray): Second quaternion [qw, qx, qy, qz].
+        out (numpy.ndarray): Optional array of shape (4,) where the result is written (it can be q1 or q2)
+
+    Returns:
+        q_result (numpy.ndarray): The result of quaternion multiplication.
+    """
+
+    w1, x1, y1, z1 = q1.tolist()
+    w2, x2, y2, z2 = q2.tolist()
+
+    if out is None:
+        out = np.empty(4)
+    out[0] = w1*w2 - x1*x2 - y1*y2 - z1*z2
+    out[1] = w1*x2 + x1*w2 + y1*z2 - z1*y2
+    out[2] = w1*y2 - x1*z2 + y1*w2 + z1*x2
+    out[3] = w1*z2 + x1*y2 - y1*x2 + z1*w2
+
+    return out
+
+
+def quat_apply_rot_fast(q_in, u_in, out=None):
+    """
+    Apply the rotation represented by a quaternion to a vector, same as quat_apply_rot
+    Uses the expanded form of q*u*q_conj: v = (qw^2 - r.r)*u + 2*(r.u)*r + 2*qw*(r x u), with r = [qx, qy, qz] (valid for non unit quaternions too)
+
+    Parameters:
+        q_in (numpy.ndarray): Quaternion [qw, qx, qy, qz].
+        u_in (numpy.ndarray): Vector to which the rotation q_in will be applied to
+        out (numpy.ndarray): Optional array of shape (3,) where the result is written (it can be u_in)
+
+    Returns:
+        v (numpy.ndarray): Result of the application of q_in to u_in
+    """
+
+    w, x, y, z = q_in.tolist()
+    ux, uy, uz = u_in.tolist()
+
+    # Coefficients of the expanded form
+    a = w*w - x*x - y*y - z*z
+    b = 2*(x*ux + y*uy + z*uz)
+    w2 = 2*w
+
+    if out is None:
+        out = np.empty(3)
+    out[0] = a*ux + b*x + w2*(y*uz - z*uy)
+    out[1] = a*uy + b*y + w2*(z*ux - x*uz)
+    out[2] = a*uz + b*z + w2*(x*uy - y*ux)
+
+    return out
+
+
+def quat_apply_inv_rot_fast(q_in, u_in, out=None):
+    """
+    Apply the inverse of the rotation represented by a quaternion to a vector, same as quat_apply_rot(quat_conj(q_in), u_in)
+
+    Parameters:
+        q_in (numpy.ndarray): Quaternion [qw, qx, qy, qz].
+        u_in (numpy.ndarray): Vector to which the inverse of the rotation q_in will be applied to
+        out (numpy.ndarray): Optional array of shape (3,) where the result is written (it can be u_in)
+
+    Returns:
+        v (numpy.ndarray): Result of the application of the conjugate of q_in to u_in
+    """
+
+    w, x, y, z = q_in.tolist()
+    ux, uy, uz = u_in.tolist()
+
+    # Coefficients of the expanded form, with the vector part of the quaternion negated
+    a = w*w - x*x - y*y - z*z
+    b = 2*(x*ux + y*uy + z*uz)
+    w2 = -2*w
+
+    if out is None:
+        out = np.empty(3)
+    out[0] = a*ux + b*x + w2*(y*uz - z*uy)
+    out[1] = a*uy + b*y + w2*(z*ux - x*uz)
+    out[2] = a*uz + b*z + w2*(x*uy - y*ux)
+
+    return out
+
+
+def quaternion_derivative_fast(q, w, out=None):
+    """
+    Calculate the derivative of a quaternion given a quaternion and an angular velocity, same as quaternion_derivative
+
+    Parameters:
+        q (numpy.ndarray): Input quaternion [qw, qx, qy, qz].
+        w (numpy.ndarray): Angular velocity in the body frame [wx, wy, wz].
+        out (numpy.ndarray): Optional array of shape (4,) where the result is written (it can be q)
+
+    Returns:
+        q_dot (numpy.ndarray): The derivative of the quaternion [qw_dot, qx_dot, qy_dot, qz_dot].
+    """
+
+    qw, qx, qy, qz = q.tolist()
+    wx, wy, wz = w.tolist()
+
+    if out is None:
+        out = np.empty(4)
+    out[0] = 0.5*(-wx*qx - wy*qy - wz*qz)
+    out[1] = 0.5*(wx*qw + wz*qy - wy*qz)
+    out[2] = 0.5*(wy*qw - wz*qx + wx*qz)
+    out[3] = 0.5*(wz*qw + wy*qx - wx*qy)
+
+    return out
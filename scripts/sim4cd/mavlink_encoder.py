@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Fast MAVLink encoder for the high rate HIL messages
+# Packs HIL_SENSOR, HIL_GPS and HIL_STATE_QUATERNION into preallocated buffers without going through the generic pymavlink path
+
+import sys
+import struct
+
+# C implementation of the checksum (installed with pymavlink), much faster than the Python loop
+try:
+    from fastcrc import crc16
+    FASTCRC_AVAILABLE = True
+except ImportError:
+    FASTCRC_AVAILABLE = False
+
+
+# MAVLink frame markers
+PROTOCOL_MARKER_V1 = 0xFE
+PROTOCOL_MARKER_V2 = 0xFD
+
+
+def x25_table():
+    """
+    Compute the lookup table of the X.25 (CRC-16/MCRF4XX) checksum used by MAVLink
+
+    Returns:
+        table (list of int): Table with the checksum contribution of each byte value
+    """
+
+    table = []
+    for x in range(256):
+        t = (x ^ (x << 4)) & 0xFF
+        table.append(((t << 8) ^ (t << 3) ^ (t >> 4)) & 0xFFFF)
+
+    return table
+
+
+# Lookup table of the checksum
+X25_TABLE = x25_table()
+
+
+def x25_crc(buf, start, end, crc_extra):
+    """
+    Compute the MAVLink checksum of a slice of a buffer
+
+    Parameters:
+        buf (bytearray): Buffer with the message frame
+        start (int): Index of the first byte included in the checksum
+        end (int): Index after the last byte included in the checksum
+        crc_extra (int): CRC extra byte of the message type
+
+    Returns:
+        crc (int): 16 bits checksum
+    """
+
+    table = X25_TABLE
+    if FASTCRC_AVAILABLE:
+        crc = crc16.mcrf4xx(memoryview(buf)[start:end], 0xFFFF)
+    else:
+        crc = 0xFFFF
+        for b in buf[start:end]:
+            crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    crc = (crc >> 8) ^ table[(crc ^ crc_extra) & 0xFF]
+
+    return crc
+
+
+class message_layout:
+    """
+    Class that stores the precompiled layout of one MAVLink message type
+    """
+
+    def __init__(self, msg_class, mavlink2):
+        """
+        Constructor for the message_layout class
+
+        Parameters:
+            msg_class (class): pymavlink message class (e.g. MAVLink_hil_sensor_message)
+            mavlink2 (bool): Use the MAVLink 2 (True) or the MAVLink 1 (False) framing
+        """
+
+        self.msg_id = msg_class.id
+        self.crc_extra = msg_class.crc_extra
+        # Payload packer with the fields in the wire order (already sorted by size by pymavlink)
+        self.payload = struct.Struct(msg_class.unpacker.format)
+        # Number of packed values in the selected dialect (MAVLink 1 does not carry the extension fields)
+        self.n_values = len(self.payload.unpack(bytes(self.payload.size)))
+
+        # Header packer
+        if mavlink2:
+            self.header = struct.Struct("<BBBBBBBHB")
+        else:
+            self.header = struct.Struct("<BBBBBB")
+        self.hdr_len = self.header.size
+
+        # Preallocated buffer for the whole frame (header + payload + checksum)
+        self.buf = bytearray(self.hdr_len + self.payload.size + 2)
+        self.view = memoryview(self.buf)
+
+
+class hil_encoder:
+    """
+    Class that encodes the HIL messages sent to PX4 at high rate
+    The sequence number is shared with the pymavlink object so both paths can be mixed in the same link
+    """
+
+    def __init__(self, mav):
+        """
+        Constructor for the hil_encoder class
+
+        Parameters:
+            mav (<pymavlink.dialects.*.MAVLink>): MAVLink object of the connection (used for the dialect, system ids and sequence number)
+        """
+
+        self.mav = mav
+
+        # Get the dialect module used by the connection
+        dialect = sys.modules[type(mav).__module__]
+        self.mavlink2 = float(dialect.WIRE_PROTOCOL_VERSION) == 2.0
+
+        # Precompile the layouts of the encoded messages
+        self.sensor = message_layout(dialect.MAVLink_hil_sensor_message, self.mavlink2)
+        self.gps = message_layout(dialect.MAVLink_hil_gps_message, self.mavlink2)
+        self.state_quaternion = message_layout(dialect.MAVLink_hil_state_quaternion_message, self.mavlink2)
+
+        # Checksum packer
+        self.crc_packer = struct.Struct("<H")
+
+
+    def is_supported(self):
+        """
+        Check if the fast path can encode the messages of the connection
+
+        Returns:
+            (bool): False if the link requires signed messages (not supported by the fast path)
+        """
+
+        return not self.mav.signing.sign_outgoing
+
+
+    def pack(self, layout, values):
+        """
+        Pack a message into its preallocated buffer
+
+        Parameters:
+            layout (<message_layout>): Layout of the message type
+            values (tuple): Values of all of the fields in the wire order (extension fields included)
+
+        Returns:
+            (memoryview): Frame ready to be written on the link
+        """
+
+        mav = self.mav
+        buf = layout.buf
+        hdr_len = layout.hdr_len
+
+        # Pack the payload
+        layout.payload.pack_into(buf, hdr_len, *values[:layout.n_values])
+        plen = layout.payload.size
+
+        # Pack the header
+        if self.mavlink2:
+            # MAVLink 2 strips the trailing zeros of the payload
+            while plen > 1 and buf[hdr_len + plen - 1] == 0:
+                plen = plen - 1
+            layout.header.pack_into(buf, 0, PROTOCOL_MARKER_V2, plen, 0, 0, mav.seq, mav.srcSystem, mav.srcComponent, layout.msg_id & 0xFFFF, layout.msg_id >> 16)
+        else:
+            layout.header.pack_into(buf, 0, PROTOCOL_MARKER_V1, plen, mav.seq, mav.srcSystem, mav.srcComponent, layout.msg_id)
+
+        # Append the checksum
+        end = hdr_len + plen
+        self.crc_packer.pack_into(buf, end, x25_crc(buf, 1, end, layout.crc_extra))
+
+        # Update the link sequence number and statistics
+        mav.seq = (mav.seq + 1) % 256
+        mav.total_packets_sent = mav.total_packets_sent + 1
+        mav.total_bytes_sent = mav.total_bytes_sent + end + 2
+
+        return layout.view[:end + 2]
+
+
+    def hil_sensor(self, time_usec, xacc, yacc, zacc, xgyro, ygyro, zgyro, xmag, ymag, zmag, abs_pressure, diff_pressure, pressure_alt, temperature, fields_updated, the_id=0):
+        """
+        Encode a HIL_SENSOR message (see the MAVLink documentation for the description of the fields)
+
+        Returns:
+            (memoryview): Encoded frame
+        """
+
+        return self.pack(self.sensor, (time_usec, xacc, yacc, zacc, xgyro, ygyro, zgyro, xmag, ymag, zmag, abs_pressure, diff_pressure, pressure_alt, temperature, fields_updated, the_id))
+
+
+    def hil_gps(self, time_usec, fix_type, lat, lon, alt, eph, epv, vel, vn, ve, vd, cog, satellites_visible, the_id=0, yaw=0):
+        """
+        Encode a HIL_GPS message (see the MAVLink documentation for the description of the fields)
+
+        Returns:
+            (memoryview): Encoded frame
+        """
+
+        return self.pack(self.gps, (time_usec, lat, lon, alt, eph, epv, vel, vn, ve, vd, cog, fix_type, satellites_visible, the_id, yaw))
+
+
+    def hil_state_quaternion(self, time_usec, attitude_quaternion, rollspeed, pitchspeed, yawspeed, lat, lon, alt, vx, vy, vz, ind_airspeed, true_airspeed, xacc, yacc, zacc):
+        """
+        Encode a HIL_STATE_QUATERNION message (see the MAVLink documentation for the description of the fields)
+
+        Returns:
+            (memoryview): Encoded frame
+        """
+
+        qw, qx, qy, qz = attitude_quaternion
+
+        return self.pack(self.state_quaternion, (time_usec, qw, qx, qy, qz, rollspeed, pitchspeed, yawspeed, lat, lon, alt, vx, vy, vz, ind_airspeed, true_airspeed, xacc, yacc, zacc))
+
+
+
+if __name__ == "__main__":
+
+    # Compare the fast encoder against pymavlink (reference) for both protocol versions
+    from pymavlink.dialects.v10 import ardupilotmega as mavlink1
+    from pymavlink.dialects.v20 import ardupilotmega as mavlink2
+
+    sensor = (123456789, 0.1, -0.2, 9.8, 0.01, -0.02, 0.03, 0.2, 0.01, -0.4, 1013.2, 0.0, 12.5, 40.0, 7167)
+    gps = (123456789, 3, 404489850, -798980250, 372000, 10, 12, 65535, -25, 13, 4, 65535, 10)
+    gt = (123456789, [0.9, 0.1, -0.1, 0.4], 0.1, 0.2, -0.3, 404489850, -798980250, 372, 12, -5, 3, 13, 13, 0, 0, 0)
+
+    for dialect in [mavlink1, mavlink2]:
+        mav = dialect.MAVLink(None, srcSystem=1, srcComponent=1)
+        encoder = hil_encoder(mav)
+        decoder = dialect.MAVLink(None)
+        for name, values in [('hil_sensor', sensor), ('hil_gps', gps), ('hil_state_quaternion', gt)]:
+            # Reference encoding with the same sequence number
+            seq = mav.seq
+            reference = bytes(getattr(mav, name+'_encode')(*values).pack(mav))
+            mav.seq = seq
+            frame = bytes(getattr(encoder, name)(*values))
+            msg = decoder.parse_buffer(frame)[0]
+            print(f"v{dialect.WIRE_PROTOCOL_VERSION} {name:22s} identical: {frame == reference}  decoded: {msg.get_type()} seq {msg.get_seq()}")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Block noise source
+# Draws large blocks of random samples at once and serves them in small slices, to avoid the overhead of one RNG call per sensor sample
+
+import threading
+import numpy as np
+
+
+class noise_buffer:
+    """
+    Class that serves random samples from large pre-drawn blocks of a numpy Generator
+    The sequence of samples only depends on the generator (or seed), so it is the same with or without the background refill
+    """
+
+    def __init__(self, generator=None, distribution='normal', block_size=4096, background=False):
+        """
+        Constructor for the noise_buffer class
+
+        Parameters:
+            generator (<numpy.random.Generator> or int or <numpy.random.SeedSequence>): Generator of the stream, or seed used to create it (not reproducible if None)
+            distribution (str): Distribution of the samples
+                'normal': standard normal (mean 0, standard deviation 1)
+                'uniform': uniform in [0, 1)
+            block_size (int): Number of samples drawn at once
+            background (bool): Draw the next block on a background thread (True) or when the current block runs out (False)
+        """
+
+        if distribution not in ['normal', 'uniform']:
+            print(f"\33[91mInvalid noise distribution {distribution}. Exiting.\33[0m")
+            exit()
+
+        # Random number generator of the stream
+        if isinstance(generator, np.random.Generator):
+            self.rng = generator
+        else:
+            self.rng = np.random.default_rng(generator)
+
+        self.distribution = distribution
+        self.block_size = block_size
+
+        # Current block and index of the next sample to be served
+        # The first block is drawn on the first request, so unused streams do not allocate memory
+        self.block = np.zeros(0)
+        self.index = self.block_size
+
+        # Background refill: the next block is drawn by a worker thread while the current one is being served
+        self.background = background
+        self.next_block = None
+        self.thread = None
+
+
+    def draw_block(self):
+        """
+        Draw a new block of samples from the generator
+
+        Returns:
+            (numpy.ndarray): Block of block_size samples
+        """
+
+        if self.distribution == 'normal':
+            return self.rng.standard_normal(self.block_size)
+        return self.rng.random(self.block_size)
+
+
+    def start_refill(self):
+        """
+        Start drawing the next block on a background thread
+        """
+
+        def refill():
+            self.next_block = self.draw_block()
+
+        self.thread = threading.Thread(target=refill, daemon=True)
+        self.thread.start()
+
+
+    def swap_block(self):
+        """
+        Replace the exhausted block by the next one
+        """
+
+        if self.background:
+            # Wait for the block being drawn in the background (the first one is drawn here) and start drawing the following one
+            if self.thread is None:
+                self.block = self.draw_block()
+            else:
+                self.thread.join()
+                self.block = self.next_block
+            self.start_refill()
+        else:
+            self.block = self.draw_block()
+        self.index = 0
+
+
+    def draw(self, n):
+        """
+        Get the next n samples of the stream
+
+        Parameters:
+            n (int): Number of samples
+
+        Returns:
+            samples (numpy.ndarray): Array with n samples (it may be a view of the internal block, so it must not be modified)
+        """
+
+        end = self.index + n
+        if end <= self.block_size:
+            samples = self.block[self.index:end]
+            self.index = end
+            return samples
+
+        # The samples span two blocks (or more, if n is larger than a block)
+        parts = [self.block[self.index:]]
+        missing = n - len(parts[0])
+        while missing > 0:
+            self.swap_block()
+            take = min(missing, self.block_size)
+            parts.append(self.block[0:take])
+            self.index = take
+            missing = missing - take
+
+        return np.concatenate(parts)
+
+
+    def draw_one(self):
+        """
+        Get the next sample of the stream
+
+        Returns:
+            (float): One sample
+        """
+
+        if self.index >= self.block_size:
+            self.swap_block()
+        sample = self.block[self.index]
+        self.index = self.index + 1
+
+        return float(sample)
+
+
+
+if __name__ == "__main__":
+
+    # Check the reproducibility and the cost per sample against one RNG call per sample
+    import time
+
+    # Same seed gives the same stream, with or without the background refill and for any slicing
+    a = noise_buffer(42, block_size=1000)
+    b = noise_buffer(42, block_size=1000, background=True)
+    sa = np.concatenate([a.draw(3) for i in range(2000)] + [[a.draw_one()]])
+    sb = np.concatenate([b.draw(7) for i in range(857)] + [b.draw(2)])
+    print("Reproducible:", np.array_equal(sa, sb), np.array_equal(sa, np.random.default_rng(42).standard_normal(6001)))
+
+    n = 100000
+    buffer = noise_buffer(0)
+    t0 = time.perf_counter()
+    for i in range(n):
+        buffer.draw(3)
+    t_buffer = (time.perf_counter()-t0)/n
+    t0 = time.perf_counter()
+    for i in range(n):
+        np.random.normal(loc=0.0, scale=[0.1, 0.1, 0.1], size=3)
+    t_numpy = (time.perf_counter()-t0)/n
+    print(f"3 samples per call: noise_buffer {t_buffer*1e6:.2f} us, np.random.normal {t_numpy*1e6:.2f} us")
@@ -39,12 +39,54 @@ data["SIM_ROS_EN"] ={
     "type":          "bool",
     "unit":          "[ ]"}
 data["SIM_ROS_HZ"] ={
-    "description":   "Frequency of publication of sim data in ROS topics.",
+    "description":   "Frequency at which the state of the simulation is handed to the ROS publisher. Upper limit of the rates of the topics (SIM_ROS_ODOM_HZ, SIM_ROS_GT_HZ, SIM_ROS_POSE_HZ and SIM_ROS_MARKER_HZ).",
     "value":         20,
     "default":       20,
     "options":       [],
     "type":          "int",
     "unit":          "[Hz]"}
+data["SIM_ROS_ODOM_HZ"] ={
+    "description":   "Frequency of publication of the odometry topic (/drone/odom). If 0, the topic is not published. Limited by SIM_ROS_HZ.",
+    "value":         20.0,
+    "default":       20.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[Hz]"}
+data["SIM_ROS_GT_HZ"] ={
+    "description":   "Frequency of publication of the ground truth topic (/drone/gt). If 0, the topic is not published. Limited by SIM_ROS_HZ.",
+    "value":         20.0,
+    "default":       20.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[Hz]"}
+data["SIM_ROS_POSE_HZ"] ={
+    "description":   "Frequency of publication of the pose topic (/drone/pose). If 0, the topic is not published. Limited by SIM_ROS_HZ.",
+    "value":         20.0,
+    "default":       20.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[Hz]"}
+data["SIM_ROS_MARKER_HZ"] ={
+    "description":   "Frequency of publication of the markers that represent the vehicle in RViz (/drone/robot). If 0, the markers are not published. Limited by SIM_ROS_HZ.",
+    "value":         5.0,
+    "default":       5.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[Hz]"}
+data["SIM_ROS_MARKER_LOD"] ={
+    "description":   "Level of detail of the markers that represent the vehicle in RViz. 0: body, heading, arms and propellers. 1: body and heading only.",
+    "value":         0,
+    "default":       0,
+    "options":       [0, 1],
+    "type":          "int",
+    "unit":          "[ ]"}
+data["SIM_ROS_THREAD_EN"] ={
+    "description":   "Flag to publish the ROS topics from a dedicated thread. The simulation loop only writes the latest state into a double buffer and never waits for rospy.",
+    "value":         True,
+    "default":       True,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
 data["SIM_SENS_HZ"] ={
     "description":   "Frequency of publication of sensor data through MAVLINK. Includes IMU, magnetometer and barometer.",
     "value":         800,
@@ -108,7 +150,130 @@ data["SIM_INIT_YAW"] ={
     "options":       [],
     "type":          "float",
     "unit":          "[degrees]"}
+data["SIM_STEP_HZ"] ={
+    "description":   "Frequency of the fixed step simulation clock. Every physics step advances the simulated time by 1/SIM_STEP_HZ seconds.",
+    "value":         1000,
+    "default":       1000,
+    "options":       [],
+    "type":          "int",
+    "unit":          "[Hz]"}
+data["SIM_CLOCK_MODE"] ={
+    "description":   "Mode of the simulation clock.\n(0): Real time. The simulated time follows the wall time.\n(1): Faster than real time. The simulated time runs SIM_SPEED_FACTOR times faster than the wall time.\n(2): Lockstep. The simulated time only advances when a new step is requested.",
+    "value":         0,
+    "default":       0,
+    "options":       [0, 1, 2],
+    "type":          "int",
+    "unit":          "[ ]"}
+data["SIM_SPEED_FACTOR"] ={
+    "description":   "Ratio between the simulated time and the wall time when SIM_CLOCK_MODE is set to faster than real time. A value of 0 runs the simulation as fast as possible.",
+    "value":         1.0,
+    "default":       1.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[ ]"}
+data["SIM_LOCKSTEP_TIMEOUT"] ={
+    "description":   "Maximum time the simulator waits for the actuator controls from PX4 in the lockstep mode (SIM_CLOCK_MODE = 2) before checking the connection again. Value in seconds.",
+    "value":         0.1,
+    "default":       0.1,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[s]"}
+
+data["SIM_PX4_PORT"] ={
+    "description":   "TCP port in which the simulator waits for the connection of PX4. In the multi-vehicle mode, the vehicle i uses the port SIM_PX4_PORT + i.",
+    "value":         4560,
+    "default":       4560,
+    "options":       [],
+    "type":          "int",
+    "unit":          "[ ]"}
+
+data["SIM_INTEGRATOR"] ={
+    "description":   "Method used to integrate the rigid body dynamics.\n(0): Explicit Euler.\n(1): Semi-implicit Euler. The velocities are updated first and then used to update the position and attitude.\n(2): Runge-Kutta 4.\n(3): Semi-implicit Euler with the attitude updated by the quaternion exponential map.",
+    "value":         0,
+    "default":       0,
+    "options":       [0, 1, 2, 3],
+    "type":          "int",
+    "unit":          "[ ]"}
+
+data["SIM_SEED"] ={
+    "description":   "Seed of all of the random number streams of the simulator (sensor noise of every vehicle). Runs with the same seed and the same inputs give identical outputs. A negative value draws a new seed at every start.",
+    "value":         -1,
+    "default":       -1,
+    "options":       [],
+    "type":          "int",
+    "unit":          "[ ]"}
 
+data["SIM_JIT_EN"] ={
+    "description":   "Flag to run the physics step of the vehicle with the compiled (Numba) kernel. Falls back to the Python step if Numba is not installed.",
+    "value":         False,
+    "default":       False,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
+
+data["SIM_PROF_EN"] ={
+    "description":   "Flag to enable the profiler of the simulation loop. The duration of each stage of the loop is measured and a summary (p50, p99, max and overruns of the sensor period 1/SIM_SENS_HZ) is printed periodically and at exit.",
+    "value":         False,
+    "default":       False,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
+
+data["SIM_PROF_PERIOD"] ={
+    "description":   "Interval between the summaries printed by the profiler of the simulation loop. If 0, the summary is only printed at exit.",
+    "value":         10.0,
+    "default":       10.0,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[s]"}
+
+data["SIM_REC_EN"] ={
+    "description":   "Flag to enable the flight recorder. The state of the vehicle, of the actuators and of the battery, the sensor outputs and the received actuator commands are appended at every step to a columnar binary log in the logs folder of the package.",
+    "value":         False,
+    "default":       False,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
+
+data["SIM_REC_CHUNK"] ={
+    "description":   "Number of steps stored in each chunk of the flight recorder. The full chunks are written to disk by a background thread.",
+    "value":         4096,
+    "default":       4096,
+    "options":       [],
+    "type":          "int",
+    "unit":          "[ ]"}
+
+data["SIM_RELOAD_EN"] ={
+    "description":   "Flag to reload the parameter file while the simulator runs. The file is checked every SIM_RELOAD_PERIOD seconds, and the valid changes are applied between two steps. The SIM_ parameters and VEH_ACT_NUM are only read at start up.",
+    "value":         False,
+    "default":       False,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
+
+data["SIM_RELOAD_PERIOD"] ={
+    "description":   "Interval between two checks of the parameter file when SIM_RELOAD_EN is enabled.",
+    "value":         0.5,
+    "default":       0.5,
+    "options":       [],
+    "type":          "float",
+    "unit":          "[s]"}
+
+data["SIM_BUS_EN"] ={
+    "description":   "Flag to write the state of every step into a shared memory block named sim4cd_<SIM_PX4_PORT>, which local processes can read without ROS (see state_bus.py).",
+    "value":         False,
+    "default":       False,
+    "options":       [True, False],
+    "type":          "bool",
+    "unit":          "[ ]"}
+
+data["SIM_BUS_SLOTS"] ={
+    "description":   "Number of steps kept in the shared memory state bus when SIM_BUS_EN is enabled (history available to the readers).",
+    "value":         4096,
+    "default":       4096,
+    "options":       [],
+    "type":          "int",
+    "unit":          "[ ]"}
 
 
 # Environmental params
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Typed parameter snapshot
+# Validates the parameters of a JSON parameter file against their type and options metadata and packs them once into frozen dataclasses,
+# with the per-axis and per-actuator parameters stacked into read-only numpy arrays (e.g. actuator positions with shape (n_act,3))
+# The subsystems read the fields of the snapshot instead of looking up string keys such as f'VEH_ACT{i}_POS_{d}'
+# Every problem of a parameter file is reported at once, instead of exiting at the first missing or invalid parameter
+
+import math
+import numpy as np
+from dataclasses import dataclass
+
+
+# Python types accepted for each type of the metadata (an integer is also a valid float)
+TYPES = {'bool': (bool,), 'int': (int,), 'float': (float, int)}
+# Value used in place of an invalid one, so the rest of the checks can still run (the snapshot is not built)
+FALLBACKS = {'bool': False, 'int': 0, 'float': 0.0}
+# Axes of the vector parameters
+AXES_XYZ = ['X', 'Y', 'Z']
+AXES_ENU = ['E', 'N', 'U']
+# Group of the snapshot that reads each parameter, by prefix of its name (the first match is used)
+GROUP_PREFIXES = [('SIM_', 'sim'), ('ENV_', 'env'), ('DYN_', 'dynamics'), ('SENS_', 'sensors'), ('BAT_', 'battery'), ('PWR_IDLE_CURRENT', 'battery'),
+                  ('ACT', 'actuators'), ('VEH_', 'vehicle'), ('VIZ_', 'viz')]
+
+
+@dataclass(frozen=True)
+class sim_params:
+    """
+    Parameters of the simulation loop and of the communication with PX4 (SIM_*)
+    """
+
+    ros_en: bool
+    ros_hz: float
+    ros_thread_en: bool
+    ros_odom_hz: float
+    ros_gt_hz: float
+    ros_pose_hz: float
+    ros_marker_hz: float
+    ros_marker_lod: int
+    sens_hz: float
+    gps_hz: float
+    gt_en: bool
+    gt_hz: float
+    print_en: bool
+    print_hz: float
+    step_hz: float
+    clock_mode: int
+    speed_factor: float
+    lockstep_timeout: float
+    px4_port: int
+    prof_en: bool
+    prof_period: float
+    rec_en: bool
+    rec_chunk: int
+    reload_en: bool
+    reload_period: float
+    bus_en: bool
+    bus_slots: int
+    seed: int
+    integrator: int
+    jit_en: bool
+    init_pos: np.ndarray    # Initial position [x, y, 0] [m]
+    init_yaw: float         # Initial yaw [rad]
+
+
+@dataclass(frozen=True)
+class env_params:
+    """
+    Environmental constants (ENV_*)
+    """
+
+    pres_sea: float     # Sea level standard atmospheric pressure [hPa]
+    gravity: float      # Earth-surface gravitational acceleration [m/s2]
+    mol_mass: float     # Molar mass of dry air [kg/mol]
+    tmp_sea: float      # Sea level standard temperature [K]
+    gas_cte: float      # Universal gas constant [J/(mol*K)]
+
+
+@dataclass(frozen=True)
+class dynamics_params:
+    """
+    Rigid body parameters of the vehicle (DYN_*)
+    """
+
+    mass: float         # [kg]
+    drag_v: float       # Linear drag coefficient
+    drag_w: float       # Angular drag coefficient
+    moi: np.ndarray     # Diagonal of the moment of inertia matrix [Jxx, Jyy, Jzz] [kg*m2]
+    wind: np.ndarray    # Wind speed [E, N, U] [m/s]
+
+
+@dataclass(frozen=True)
+class sensor_params:
+    """
+    Parameters of the simulated sensors (SENS_*)
+    """
+
+    lat_origin: float       # [deg]
+    lon_origin: float       # [deg]
+    alt_origin: float       # [m]
+    mag_field: np.ndarray   # Local Earth magnetic field [E, N, U] [G]
+    acc_std: np.ndarray     # [m/s2]
+    gyro_std: np.ndarray    # [rad/s]
+    mag_std: np.ndarray     # [G]
+    gps_std_xy: float       # [m]
+    gps_std_z: float        # [m]
+    bar_std: float          # [hPa]
+    acc_bias: np.ndarray    # [m/s2]
+    gyro_bias: np.ndarray   # [rad/s]
+    mag_bias: np.ndarray    # [G]
+
+
+@dataclass(frozen=True)
+class battery_params:
+    """
+    Parameters of the battery (BAT_* and PWR_IDLE_CURRENT)
+    """
+
+    full_charge: float      # [mAh]
+    init_charge: float      # [%]
+    n_cells: int
+    idle_current: float     # [A]
+    internal_res: float     # [Ohm]
+    discharge_rate: float
+
+
+@dataclass(frozen=True)
+class actuator_params:
+    """
+    Parameters of every actuator defined in the file (ACT{i}_*), one row per actuator
+    """
+
+    n: int                          # Number of actuators defined in the file
+    spin: np.ndarray                # Spin direction (1 or -1), shape (n,)
+    time_cte: np.ndarray            # Time constant [s], shape (n,)
+    moi_rotor: np.ndarray           # Moment of inertia of the rotor [kg*m2], shape (n,)
+    volt_to_speed: np.ndarray       # Polynomial coefficients, shape (n,3)
+    speed_to_thrust: np.ndarray     # Polynomial coefficients, shape (n,3)
+    speed_to_torque: np.ndarray     # Polynomial coefficients (not multiplied by the spin), shape (n,3)
+    torque_to_current: np.ndarray   # Polynomial coefficients, shape (n,3)
+
+
+@dataclass(frozen=True)
+class vehicle_params:
+    """
+    Geometry of the vehicle (VEH_*)
+    """
+
+    act_num: int                # Number of actuators of the vehicle
+    positions: np.ndarray       # Positions of the actuators in the body frame, shape (act_num,3) [m]
+    directions: np.ndarray      # Directions of propulsion of the actuators in the body frame (not normalized), shape (act_num,3)
+
+
+@dataclass(frozen=True)
+class viz_params:
+    """
+    Dimensions of the representation of the vehicle in the visualizations (VIZ_*)
+    """
+
+    size: np.ndarray            # Size of the box that represents the body [m], shape (3,)
+    act_bases: np.ndarray       # Positions of the bases of the arms that hold the actuators in the body frame, shape (act_num,3) [m]
+
+
+@dataclass(frozen=True)
+class snapshot:
+    """
+    Typed and validated values of all of the parameters used by the simulator
+    """
+
+    sim: sim_params
+    env: env_params
+    dynamics: dynamics_params
+    sensors: sensor_params
+    battery: battery_params
+    actuators: actuator_params
+    vehicle: vehicle_params
+    viz: viz_params
+
+
+def key_group(key):
+    """
+    Find the group of the snapshot that reads a parameter
+
+    Parameters:
+        key (str): Name of the parameter
+
+    Returns:
+        (str): Name of the group (e.g. 'battery'), None if the simulator does not read the parameter (e.g. PWR_EFF, only used by the GUI)
+    """
+
+    for prefix, group in GROUP_PREFIXES:
+        if key.startswith(prefix):
+            return group
+
+    return None
+
+
+def key_groups(keys):
+    """
+    Find the groups of the snapshot that read a set of parameters
+
+    Parameters:
+        keys (list of str): Names of the parameters
+
+    Returns:
+        (set of str): Names of the groups
+    """
+
+    return {key_group(key) for key in keys} - {None}
+
+
+def read_only(array):
+    """
+    Make an array of the snapshot read-only, so the subsystems cannot modify the shared values by accident
+
+    Parameters:
+        array (numpy.ndarray): Array
+
+    Returns:
+        (numpy.ndarray): Same array, not writeable
+    """
+
+    array.flags.writeable = False
+
+    return array
+
+
+class reader:
+    """
+    Class that reads the values of a parameter dictionary and collects the problems found, instead of stopping at the first one
+    """
+
+    def __init__(self, data, invalid=None):
+        """
+        Constructor for the reader class
+
+        Parameters:
+            data (dict): Parameters and their attributes, as loaded from the JSON parameter file
+            invalid (set of str): Parameters already reported as invalid (see check_entries)
+        """
+
+        self.data = data
+        self.errors = []
+        self.invalid = set(invalid) if invalid is not None else set()
+
+
+    def value(self, key):
+        """
+        Read the value of a parameter
+
+        Parameters:
+            key (str): Name of the parameter
+
+        Returns:
+            (float or int or bool): Value of the parameter (a fallback of its type if it is missing or invalid, the problem is stored in self.errors)
+        """
+
+        p = self.data.get(key)
+        if not isinstance(p, dict) or 'value' not in p:
+            self.errors.append(f"{key}: missing parameter")
+            self.invalid.add(key)
+            return 0
+        if key in self.invalid:
+            return FALLBACKS.get(p.get('type'), 0)
+
+        return p['value']
+
+
+    def array(self, keys):
+        """
+        Read the values of a set of parameters into a read-only array
+
+        Parameters:
+            keys (list of str or list of list of str): Names of the parameters (a nested list gives a 2D array)
+
+        Returns:
+            (numpy.ndarray): Values of the parameters
+        """
+
+        if len(keys) > 0 and isinstance(keys[0], list):
+            values = np.array([[self.value(key) for key in row] for row in keys], dtype=float)
+        else:
+            values = np.array([self.value(key) for key in keys], dtype=float)
+
+        return read_only(values)
+
+
+    def check(self, condition, message, keys=()):
+        """
+        Store a problem if a condition is not met
+
+        Parameters:
+            condition (bool): Condition that must be met
+            message (str): Description of the problem
+            keys (list of str): Parameters used by the condition (it is skipped if any of them was already reported as invalid)
+        """
+
+        if any(key in self.invalid for key in keys):
+            return
+        if not condition:
+            self.errors.append(message)
+
+
+def check_entries(data):
+    """
+    Check every parameter of a dictionary against its own type and options metadata
+
+    Parameters:
+        data (dict): Parameters and their attributes, as loaded from the JSON parameter file
+
+    Returns:
+        errors (list of str): Description of every problem found
+        invalid (set of str): Names of the parameters with problems
+    """
+
+    errors = []
+    invalid = set()
+    for key, p in data.items():
+        n_errors = len(errors)
+        if not isinstance(p, dict) or 'value' not in p or 'type' not in p:
+            errors.append(f"{key}: the parameter must have a value and a type")
+        elif p['type'] not in TYPES:
+            errors.append(f"{key}: unknown type {p['type']} (expected one of {list(TYPES)})")
+        # bool is a subclass of int in Python, so it is rejected explicitly for the numeric types
+        elif not isinstance(p['value'], TYPES[p['type']]) or (p['type'] != 'bool' and isinstance(p['value'], bool)):
+            errors.append(f"{key}: value {p['value']!r} is not of type {p['type']}")
+        else:
+            value = p['value']
+            if p['type'] == 'float' and not math.isfinite(value):
+                errors.append(f"{key}: value {value!r} is not finite")
+            options = p.get('options', [])
+            if len(options) > 0 and value not in options:
+                errors.append(f"{key}: value {value!r} is not one of the options {options}")
+        if len(errors) > n_errors:
+            invalid.add(key)
+
+    return errors, invalid
+
+
+def build(data):
+    """
+    Build the snapshot of a parameter dictionary
+
+    Parameters:
+        data (dict): Parameters and their attributes, as loaded from the JSON parameter file
+
+    Returns:
+        snap (<snapshot>): Snapshot of the parameters (None if any problem was found)
+        errors (list of str): Description of every problem found
+    """
+
+    # Parameters that do not match their own metadata are read as a fallback value and left out of the range checks
+    errors, invalid = check_entries(data)
+    r = reader(data, invalid)
+    r.errors = errors
+
+    sim = sim_params(
+        ros_en=r.value('SIM_ROS_EN'),
+        ros_hz=r.value('SIM_ROS_HZ'),
+        ros_thread_en=r.value('SIM_ROS_THREAD_EN'),
+        ros_odom_hz=r.value('SIM_ROS_ODOM_HZ'),
+        ros_gt_hz=r.value('SIM_ROS_GT_HZ'),
+        ros_pose_hz=r.value('SIM_ROS_POSE_HZ'),
+        ros_marker_hz=r.value('SIM_ROS_MARKER_HZ'),
+        ros_marker_lod=r.value('SIM_ROS_MARKER_LOD'),
+        sens_hz=r.value('SIM_SENS_HZ'),
+        gps_hz=r.value('SIM_GPS_HZ'),
+        gt_en=r.value('SIM_GT_EN'),
+        gt_hz=r.value('SIM_GT_HZ'),
+        print_en=r.value('SIM_PRINT_EN'),
+        print_hz=r.value('SIM_PRINT_HZ'),
+        step_hz=r.value('SIM_STEP_HZ'),
+        clock_mode=r.value('SIM_CLOCK_MODE'),
+        speed_factor=r.value('SIM_SPEED_FACTOR'),
+        lockstep_timeout=r.value('SIM_LOCKSTEP_TIMEOUT'),
+        px4_port=r.value('SIM_PX4_PORT'),
+        prof_en=r.value('SIM_PROF_EN'),
+        prof_period=r.value('SIM_PROF_PERIOD'),
+        rec_en=r.value('SIM_REC_EN'),
+        rec_chunk=r.value('SIM_REC_CHUNK'),
+        reload_en=r.value('SIM_RELOAD_EN'),
+        reload_period=r.value('SIM_RELOAD_PERIOD'),
+        bus_en=r.value('SIM_BUS_EN'),
+        bus_slots=r.value('SIM_BUS_SLOTS'),
+        seed=r.value('SIM_SEED'),
+        integrator=r.value('SIM_INTEGRATOR'),
+        jit_en=r.value('SIM_JIT_EN'),
+        init_pos=read_only(np.array([r.value('SIM_INIT_POS_X'), r.value('SIM_INIT_POS_Y'), 0.0])),
+        init_yaw=(math.pi/180)*r.value('SIM_INIT_YAW'),
+    )
+
+    env = env_params(
+        pres_sea=r.value('ENV_PRES_SEA'),
+        gravity=r.value('ENV_GRAVITY'),
+        mol_mass=r.value('ENV_MOL_MASS'),
+        tmp_sea=r.value('ENV_TMP_SEA'),
+        gas_cte=r.value('ENV_GAS_CTE'),
+    )
+
+    dynamics = dynamics_params(
+        mass=r.value('DYN_MASS'),
+        drag_v=r.value('DYN_DRAG_V'),
+        drag_w=r.value('DYN_DRAG_W'),
+        moi=r.array([f'DYN_MOI_{d}{d}' for d in AXES_XYZ]),
+        wind=r.array([f'DYN_WIND_{d}' for d in AXES_ENU]),
+    )
+
+    sensors = sensor_params(
+        lat_origin=r.value('SENS_LAT_ORIGIN'),
+        lon_origin=r.value('SENS_LON_ORIGIN'),
+        alt_origin=r.value('SENS_ALT_ORIGIN'),
+        mag_field=r.array([f'SENS_MAG_FIELD_{d}' for d in AXES_ENU]),
+        acc_std=r.array([f'SENS_ACC_STD_{d}' for d in AXES_XYZ]),
+        gyro_std=r.array([f'SENS_GYRO_STD_{d}' for d in AXES_XYZ]),
+        mag_std=r.array([f'SENS_MAG_STD_{d}' for d in AXES_XYZ]),
+        gps_std_xy=r.value('SENS_GPS_STD_XY'),
+        gps_std_z=r.value('SENS_GPS_STD_Z'),
+        bar_std=r.value('SENS_BAR_STD'),
+        acc_bias=r.array([f'SENS_ACC_BIAS_{d}' for d in AXES_XYZ]),
+        gyro_bias=r.array([f'SENS_GYRO_BIAS_{d}' for d in AXES_XYZ]),
+        mag_bias=r.array([f'SENS_MAG_BIAS_{d}' for d in AXES_XYZ]),
+    )
+
+    battery = battery_params(
+        full_charge=r.value('BAT_FULL_CHARGE'),
+        init_charge=r.value('BAT_INIT_CHARGE'),
+        n_cells=r.value('BAT_N_CELLS'),
+        idle_current=r.value('PWR_IDLE_CURRENT'),
+        internal_res=r.value('BAT_INTERNAL_RES'),
+        discharge_rate=r.value('BAT_DISCHARGE_RATE'),
+    )
+
+    # Actuators defined in the file (ACT0, ACT1, ... without gaps)
+    n = 0
+    while f'ACT{n}_SPIN' in data:
+        n = n + 1
+    ids = range(n)
+    actuators = actuator_params(
+        n=n,
+        spin=r.array([f'ACT{i}_SPIN' for i in ids]),
+        time_cte=r.array([f'ACT{i}_TIME_CTE' for i in ids]),
+        moi_rotor=r.array([f'ACT{i}_MOI_ROTOR' for i in ids]),
+        volt_to_speed=r.array([[f'ACT{i}_VOLT2SPEED_{k}' for k in range(3)] for i in ids]).reshape(n,3),
+        speed_to_thrust=r.array([[f'ACT{i}_SPEED2THRUST_{k}' for k in range(3)] for i in ids]).reshape(n,3),
+        speed_to_torque=r.array([[f'ACT{i}_SPEED2TORQUE_{k}' for k in range(3)] for i in ids]).reshape(n,3),
+        torque_to_current=r.array([[f'ACT{i}_TORQUE2AMPS_{k}' for k in range(3)] for i in ids]).reshape(n,3),
+    )
+
+    # Geometry of the actuators of the vehicle
+    act_num = r.value('VEH_ACT_NUM')
+    r.check(act_num <= n, f"VEH_ACT_NUM: the vehicle has {act_num} actuators but only {n} are defined (ACT0 to ACT{n-1})", ['VEH_ACT_NUM'])
+    act_ids = range(min(act_num, n))
+    vehicle = vehicle_params(
+        act_num=act_num,
+        positions=r.array([[f'VEH_ACT{i}_POS_{d}' for d in AXES_XYZ] for i in act_ids]).reshape(-1,3),
+        directions=r.array([[f'VEH_ACT{i}_DIR_{d}' for d in AXES_XYZ] for i in act_ids]).reshape(-1,3),
+    )
+
+    viz = viz_params(
+        size=r.array([f'VIZ_SIZE_{d}' for d in AXES_XYZ]),
+        act_bases=r.array([[f'VIZ_ACT{i}_BASE_{d}' for d in AXES_XYZ] for i in act_ids]).reshape(-1,3),
+    )
+
+    # Physical ranges
+    for name, value in [('SIM_STEP_HZ', sim.step_hz), ('SIM_SENS_HZ', sim.sens_hz), ('SIM_GPS_HZ', sim.gps_hz), ('SIM_GT_HZ', sim.gt_hz), ('SIM_RELOAD_PERIOD', sim.reload_period), ('SIM_BUS_SLOTS', sim.bus_slots),
+                        ('DYN_MASS', dynamics.mass), ('BAT_FULL_CHARGE', battery.full_charge), ('BAT_N_CELLS', battery.n_cells), ('ENV_MOL_MASS', env.mol_mass), ('ENV_GRAVITY', env.gravity)]:
+        r.check(value > 0, f"{name}: value {value!r} must be positive", [name])
+    for name, value in [('SIM_ROS_ODOM_HZ', sim.ros_odom_hz), ('SIM_ROS_GT_HZ', sim.ros_gt_hz), ('SIM_ROS_POSE_HZ', sim.ros_pose_hz), ('SIM_ROS_MARKER_HZ', sim.ros_marker_hz)]:
+        r.check(value >= 0, f"{name}: value {value!r} must not be negative", [name])
+    for d, value in zip(AXES_XYZ, dynamics.moi):
+        r.check(value > 0, f"DYN_MOI_{d}{d}: value {value!r} must be positive", [f'DYN_MOI_{d}{d}'])
+    for i in range(n):
+        r.check(actuators.time_cte[i] > 0, f"ACT{i}_TIME_CTE: value {actuators.time_cte[i]!r} must be positive", [f'ACT{i}_TIME_CTE'])
+    for i in act_ids:
+        r.check(np.any(vehicle.directions[i] != 0), f"VEH_ACT{i}_DIR_*: the direction of actuator {i} is a null vector", [f'VEH_ACT{i}_DIR_{d}' for d in AXES_XYZ])
+
+    if len(r.errors) > 0:
+        return None, r.errors
+
+    return snapshot(sim=sim, env=env, dynamics=dynamics, sensors=sensors, battery=battery, actuators=actuators, vehicle=vehicle, viz=viz), []
+
+
+
+if __name__ == "__main__":
+
+    # Build the snapshot of the default parameter file, check that a broken file reports all of its problems and compare the costs
+    import os
+    import sys
+    import copy
+    import timeit
+    import parameter_server as PRM
+
+    param_file_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')
+    params = PRM.parameter_server(param_file_name)
+
+    snap, errors = build(params.data)
+    print(f"Errors: {errors}")
+    print(f"Actuator positions:\n{snap.vehicle.positions}")
+
+    broken = copy.deepcopy(params.data)
+    broken['DYN_MASS']['value'] = -1.0
+    broken['SIM_INTEGRATOR']['value'] = 7
+    broken['SIM_GT_EN']['value'] = 1
+    broken['VEH_ACT_NUM']['value'] = 8
+    del broken['SENS_BAR_STD']
+    snap, errors = build(broken)
+    print(f"Broken file: {len(errors)} problems")
+    for error in errors:
+        print(f"    {error}")
+    assert snap is None and len(errors) == 4
+
+    # Values of the wrong type are reported with the rest of the problems, without range errors built on top of them
+    for changes in [{'DYN_MASS': "1.0", 'VEH_ACT_NUM': "4", 'SIM_INIT_YAW': "0", 'ACT0_TIME_CTE': None, 'VEH_ACT1_DIR_Z': [1.0], 'SIM_STEP_HZ': True},
+                    {'VEH_ACT_NUM': 4.0, 'DYN_MOI_XX': "0.02", 'SIM_ROS_ODOM_HZ': "20"}]:
+        wrong = copy.deepcopy(params.data)
+        for key, value in changes.items():
+            wrong[key]['value'] = value
+        snap, errors = build(wrong)
+        print(f"Wrong types {list(changes)}: {len(errors)} problems")
+        for error in errors:
+            print(f"    {error}")
+        assert snap is None and len(errors) == len(changes)
+        for key in changes:
+            assert any(error.startswith(f"{key}: value ") and "is not of type" in error for error in errors), key
+
+    t_build = min(timeit.repeat(lambda: build(params.data), number=100, repeat=3))/100
+    print(f"Cost of building the snapshot: {t_build*1e3:.2f} ms")
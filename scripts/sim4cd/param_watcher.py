@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Live reload of the parameter file
+# A background thread polls the JSON file of a parameter server, validates the changed values with param_snapshot, and keeps them pending
+# The simulation loop applies the pending values between two steps (see poll), so a step never sees a mix of old and new parameters
+
+import os
+import copy
+import json
+import time
+import threading
+
+import param_snapshot as SNAP
+
+
+# Groups of the snapshot that the vehicle model applies while it runs (see vehicle_dynamics.reload_parameters)
+# The other groups (sim, viz) and the parameters the simulator does not read are only used when it starts
+RELOADABLE_GROUPS = ('env', 'dynamics', 'sensors', 'battery', 'actuators', 'vehicle')
+# Parameters of reloadable groups that still require a restart
+RESTART_KEYS = ('VEH_ACT_NUM',)
+
+
+def needs_restart(key):
+    """
+    Check if a parameter can only be changed by restarting the simulator
+
+    Parameters:
+        key (str): Name of the parameter
+
+    Returns:
+        (bool): True if the parameter is not reloadable
+    """
+
+    return SNAP.key_group(key) not in RELOADABLE_GROUPS or key in RESTART_KEYS
+
+
+def changed_keys(old_data, new_data):
+    """
+    Find the parameters whose value differs between two parameter dictionaries (parameters that only exist in new_data are ignored)
+
+    Parameters:
+        old_data (dict): Parameters and their attributes, as stored by parameter_server
+        new_data (dict): Parameters and their attributes, as read from the JSON file
+
+    Returns:
+        (list of str): Names of the changed parameters, sorted
+    """
+
+    keys = []
+    for key, p in new_data.items():
+        if key in old_data and isinstance(p, dict) and p.get('value') != old_data[key].get('value'):
+            keys.append(key)
+
+    return sorted(keys)
+
+
+class param_watcher:
+    """
+    Class that watches the JSON file of a parameter server and hands the validated changes to the simulation loop
+    """
+
+    def __init__(self, params, period=0.5):
+        """
+        Constructor for the param_watcher class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object whose file is watched
+            period (float): Interval between two checks of the file [s]
+        """
+
+        self.params = params
+        self.period = period
+
+        # Validated parameters waiting for the loop: (data, snapshot, changed keys) or None
+        self.lock = threading.Lock()
+        self.pending = None
+        # Changed parameters that can not be applied while the simulator runs, reported by the loop (each new value once)
+        self.ignored = []
+        self.reported = {}
+        # Number of reloads applied
+        self.reloads = 0
+
+        # Modification time and size of the file, to detect changes without reading it
+        self.stamp = self.file_stamp()
+        # Stamp of the last version of the file that could not be parsed (reported once)
+        self.bad_stamp = None
+
+        # Start the thread that polls the file
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+
+    def file_stamp(self):
+        """
+        Get the modification time and the size of the watched file
+
+        Returns:
+            (tuple): Modification time [ns] and size [bytes] (None if the file can not be accessed)
+        """
+
+        try:
+            status = os.stat(self.params.json_path)
+        except OSError:
+            return None
+
+        return (status.st_mtime_ns, status.st_size)
+
+
+    def watch(self):
+        """
+        Check the file every period seconds and validate its new versions (runs on the background thread)
+        """
+
+        while True:
+            time.sleep(self.period)
+            stamp = self.file_stamp()
+            if stamp is None or stamp == self.stamp:
+                continue
+
+            # An editor may still be writing the file: if it can not be parsed, it is read again in the next period
+            try:
+                with open(self.params.json_path, 'r') as file:
+                    new_data = json.load(file)
+            except Exception as e:
+                if stamp != self.bad_stamp:
+                    print(f"\33[93m[param_watcher] Could not read {self.params.json_path}: {str(e)}\33[0m")
+                    self.bad_stamp = stamp
+                continue
+            self.stamp = stamp
+
+            self.check(new_data)
+
+
+    def check(self, new_data):
+        """
+        Validate the changes of a new version of the file and store them for the loop
+        The changes are merged on top of the running parameters (or of the ones still pending), and rejected as a whole if any value is invalid
+
+        Parameters:
+            new_data (dict): Parameters and their attributes, as read from the JSON file
+        """
+
+        with self.lock:
+            base = self.pending[0] if self.pending is not None else self.params.data
+        keys = changed_keys(base, new_data)
+
+        # The parameters read only at start up keep their running values
+        restart = [key for key in keys if needs_restart(key) and self.reported.get(key, base[key]['value']) != new_data[key]['value']]
+        if len(restart) > 0:
+            self.reported.update({key: new_data[key]['value'] for key in restart})
+            with self.lock:
+                self.ignored = sorted(set(self.ignored) | set(restart))
+        keys = [key for key in keys if not needs_restart(key)]
+        if len(keys) == 0:
+            return
+
+        # Running parameters with the new values
+        data = copy.deepcopy(base)
+        for key in keys:
+            data[key]['value'] = new_data[key]['value']
+
+        # Validate the whole set before accepting any of its values
+        snap, errors = SNAP.build(data)
+        if len(errors) > 0:
+            print(f"\33[91m[param_watcher] Rejected the new values of {self.params.json_path} ({len(errors)} invalid parameters). The running parameters are kept:\33[0m")
+            for error in errors:
+                print(f"\33[91m    {error}\33[0m")
+            return
+
+        with self.lock:
+            if self.pending is not None:
+                keys = sorted(set(keys) | set(self.pending[2]))
+            self.pending = (data, snap, keys)
+
+
+    def poll(self):
+        """
+        Apply the pending changes to the parameter server (called by the simulation loop between two steps)
+
+        Returns:
+            keys (list of str): Names of the changed parameters (None if there was no change)
+        """
+
+        # Cheap check for the common case (reading the attributes does not need the lock)
+        if self.pending is None and len(self.ignored) == 0:
+            return None
+
+        with self.lock:
+            pending = self.pending
+            ignored = self.ignored
+            self.pending = None
+            self.ignored = []
+
+        if len(ignored) > 0:
+            print(f"\33[93m[param_watcher] Not reloaded, the simulator must be restarted to apply: {', '.join(ignored)}\33[0m")
+        if pending is None:
+            return None
+        data, snap, keys = pending
+
+        old_data = self.params.data
+        self.params.replace_data(data, snap)
+        self.reloads = self.reloads + 1
+
+        changes = ', '.join(f"{key} {old_data[key]['value']} -> {data[key]['value']}" for key in keys)
+        print(f"\33[94m[param_watcher] Reloaded {len(keys)} parameters: {changes}\33[0m")
+
+        return keys
+
+
+
+if __name__ == "__main__":
+
+    # Edit a copy of a parameter file while a vehicle hovers, and check that the changes reach the model
+    # Usage: python3 param_watcher.py [params.json]
+    import sys
+    import tempfile
+    import numpy as np
+    import parameter_server as PRM
+    import dynamics as DYN
+    import jit_dynamics as JIT
+
+    source_file_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')
+    with open(source_file_name, 'r') as file:
+        data = json.load(file)
+    file_name = os.path.join(tempfile.mkdtemp(prefix='sim4cd_params_'), 'sim_params.json')
+    with open(file_name, 'w') as file:
+        json.dump(data, file, indent=4)
+
+    params = PRM.parameter_server(file_name)
+    watcher = param_watcher(params, period=0.05)
+    quad = DYN.vehicle_dynamics(params)
+    cmd = np.full(8, 0.8)
+    print(f"Compiled step: {quad.jit is not None}")
+
+    def edit(changes):
+        # Write a new version of the file and step the vehicle until the watcher hands it over
+        for key, value in changes.items():
+            data[key]['value'] = value
+        with open(file_name, 'w') as file:
+            json.dump(data, file, indent=4)
+        for k in range(2000):
+            keys = watcher.poll()
+            if keys is not None:
+                quad.reload_parameters(params, keys)
+                return keys
+            quad.model_step(cmd, 0.001)
+            time.sleep(0.001)
+        return None
+
+    for k in range(500):
+        quad.model_step(cmd, 0.001)
+    print(f"Wind {quad.wind_vw}, mass {quad.m}, Jinv[0,0] {quad.Jinv[0,0]:.3f}, baro noise {quad.sensors.bar_noise_std}")
+
+    t0 = time.perf_counter()
+    idle_current = 2*data['PWR_IDLE_CURRENT']['value'] + 0.5
+    keys = edit({'DYN_WIND_E': 3.0, 'DYN_MOI_XX': 2*data['DYN_MOI_XX']['value'], 'SENS_BAR_STD': 0.5, 'PWR_IDLE_CURRENT': idle_current, 'SIM_STEP_HZ': 500, 'VIZ_SIZE_X': 1.0})
+    print(f"Applied {keys} after {time.perf_counter()-t0:.3f} s")
+    print(f"Wind {quad.wind_vw}, mass {quad.m}, Jinv[0,0] {quad.Jinv[0,0]:.3f}, baro noise {quad.sensors.bar_noise_std}, idle current {quad.vehicle_geo.battery.idle_current}, step rate {params.snapshot().sim.step_hz}")
+    # The parameters that need a restart are reported and keep their running values
+    assert keys == ['DYN_MOI_XX', 'DYN_WIND_E', 'PWR_IDLE_CURRENT', 'SENS_BAR_STD']
+    assert quad.vehicle_geo.battery.idle_current == idle_current and params.snapshot().sim.step_hz != 500 and params.snapshot().viz.size[0] != 1.0
+    if quad.jit is not None:
+        assert quad.jit.params[JIT.PRM_BAT_IDLE] == idle_current
+
+    # An invalid value is rejected and the running parameters are kept
+    keys = edit({'DYN_MASS': -1.0})
+    print(f"Invalid file applied: {keys is not None}, mass {quad.m}")
+    print(f"Reloads: {watcher.reloads}, altitude {quad.p[2]:.3f} m, status {quad.get_status()}")
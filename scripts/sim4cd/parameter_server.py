@@ -6,6 +6,8 @@
 import json
 import os
 
+import param_snapshot as SNAP
+
 class parameter_server(object):
     """
     Parameter server class.
@@ -22,6 +24,8 @@ class parameter_server(object):
         self.json_path = json_path_
         # Load JSON file with parameters
         self.data = self.load_file()
+        # Typed snapshot of the parameters (built on the first request and after every change)
+        self.snapshot_cache = None
 
     def get_parameter(self, key):
         """
@@ -63,6 +67,58 @@ class parameter_server(object):
         return value
 
 
+    def set_parameter_value(self, key, value):
+        """
+        Set the current value of a given parameter (only in memory, the JSON file is not modified).
+
+        Parameters:
+            key (str): String with the name of the parameter whose value is to be set.
+            value (variable type *): New value of the parameter. *Type options are: float, int, bool
+        """
+        try:
+            # Try to write the parameter value
+            self.data[key]["value"] = value
+            self.snapshot_cache = None
+        except:
+            # Throw an error and exit if it was not possible to write the parameter
+            print("\33[91mCould not set value of parameter "+key+", does it exist?\33[0m")
+            exit()
+
+
+    def replace_data(self, data, snap=None):
+        """
+        Replace all of the parameters at once (e.g. with a new version of the JSON file, see param_watcher)
+
+        Parameters:
+            data (dict): Dictionary with the list of parameters and its attributes
+            snap (<param_snapshot.snapshot>): Snapshot already built from data (built on the next request if None)
+        """
+
+        self.data = data
+        self.snapshot_cache = snap
+
+
+    def snapshot(self):
+        """
+        Get the typed and validated snapshot of the parameters (see param_snapshot)
+        If the parameters have problems, all of them are reported and the program exits
+
+        Returns:
+            (<param_snapshot.snapshot>): Snapshot of the current values of the parameters
+        """
+
+        if self.snapshot_cache is None:
+            snap, errors = SNAP.build(self.data)
+            if len(errors) > 0:
+                print(f"\33[91m[parameter_server] {len(errors)} invalid parameters in {self.json_path}:\33[0m")
+                for error in errors:
+                    print(f"\33[91m    {error}\33[0m")
+                exit()
+            self.snapshot_cache = snap
+
+        return self.snapshot_cache
+
+
     def load_file(self):
         """
         Load the parameter stored in the variable self.json_path
@@ -70,4 +70,24 @@ class polynomial:
             self.N (int): Order of the polynomial
         """
 
-        return self.N
\ No newline at end of file
+        return self.N
+
+
+def eval_rows(coefficients, u):
+    """
+    Compute the values of a set of polynomials of the same order at once (Horner's method)
+
+    Parameters:
+        coefficients (numpy.ndarray): Coefficients of the polynomials, one polynomial per row
+            [[c0, c1, c2, ...], ...]
+        u (numpy.ndarray): Parameters in which each polynomial will be evaluated, one per row of coefficients
+
+    Returns:
+        p (numpy.ndarray): Values p(u) of each polynomial at its parameter
+    """
+
+    p = coefficients[..., -1]*1
+    for i in range(coefficients.shape[-1]-2, -1, -1):
+        p = p*u + coefficients[..., i]
+
+    return p
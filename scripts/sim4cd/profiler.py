@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Loop profiler
+# Times each stage of the simulation loop and keeps the durations in ring buffers (recent samples) and in HDR style histograms (whole run)
+# The main loop is the only writer, so the summary can be read from another thread without locks (a summary may miss the samples being written)
+
+import time
+import threading
+import numpy as np
+
+
+class ring_buffer:
+    """
+    Class that keeps the last samples of a series in a fixed size array
+    """
+
+    def __init__(self, size=4096):
+        """
+        Constructor for the ring_buffer class
+
+        Parameters:
+            size (int): Number of samples kept
+        """
+
+        # Plain list, cheaper than a numpy array for writing one sample at a time
+        self.data = [0]*size
+        self.size = size
+        # Total number of samples written (the next sample goes to index count % size)
+        self.count = 0
+
+
+    def push(self, value):
+        """
+        Write a sample, overwriting the oldest one if the buffer is full
+
+        Parameters:
+            value (int): Sample
+        """
+
+        self.data[self.count % self.size] = value
+        self.count = self.count + 1
+
+
+    def get_samples(self):
+        """
+        Get a copy of the samples in the buffer (not ordered in time)
+
+        Returns:
+            (numpy.ndarray): Samples in the buffer
+        """
+
+        return np.array(self.data[0:min(self.count, self.size)])
+
+
+class histogram:
+    """
+    Class that counts samples in logarithmic buckets with linear sub-buckets (same layout of an HDR histogram)
+    Each power of two is split in sub_buckets/2 buckets, so every recorded value is known with a relative error below 2/sub_buckets
+    """
+
+    def __init__(self, sub_bucket_bits=5, max_bits=40):
+        """
+        Constructor for the histogram class
+
+        Parameters:
+            sub_bucket_bits (int): Log2 of the number of sub-buckets (5: 32 sub-buckets, about 3% resolution)
+            max_bits (int): Log2 of the largest value that can be recorded (larger values are counted in the last bucket)
+        """
+
+        self.sub_bucket_bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.max_value = (1 << max_bits) - 1
+        self.counts = [0]*(self.index(self.max_value) + 1)
+        self.total = 0
+        self.max = 0
+
+
+    def index(self, value):
+        """
+        Compute the bucket of a value
+
+        Parameters:
+            value (int): Non negative value
+
+        Returns:
+            (int): Index of the bucket
+        """
+
+        exponent = value.bit_length() - self.sub_bucket_bits
+        if exponent <= 0:
+            return value
+
+        return exponent*self.half + (value >> exponent)
+
+
+    def bucket_limit(self, index):
+        """
+        Compute the largest value counted in a bucket
+
+        Parameters:
+            index (int): Index of the bucket
+
+        Returns:
+            (int): Largest value of the bucket
+        """
+
+        if index < 2*self.half:
+            return index
+        exponent = index//self.half - 1
+        mantissa = index - exponent*self.half
+
+        return ((mantissa + 1) << exponent) - 1
+
+
+    def record(self, value):
+        """
+        Count a value
+
+        Parameters:
+            value (int): Non negative value
+        """
+
+        value = min(max(value, 0), self.max_value)
+        self.counts[self.index(value)] += 1
+        self.total = self.total + 1
+        if value > self.max:
+            self.max = value
+
+
+    def percentile(self, p):
+        """
+        Compute a percentile of the recorded values (upper limit of the bucket that contains it)
+
+        Parameters:
+            p (float): Percentile, from 0 to 100
+
+        Returns:
+            (int): Value of the percentile (0 if nothing was recorded)
+        """
+
+        counts = np.array(self.counts)
+        total = counts.sum()
+        if total == 0:
+            return 0
+        index = int(np.searchsorted(np.cumsum(counts), max(1, int(np.ceil(total*p/100)))))
+
+        return min(self.bucket_limit(index), self.max)
+
+
+class loop_profiler:
+    """
+    Class that measures the duration of the stages of a loop and of the whole iterations
+    """
+
+    def __init__(self, budget, enabled=True, period=0, ring_size=4096):
+        """
+        Constructor for the loop_profiler class
+
+        Parameters:
+            budget (float): Maximum duration of the work of one iteration [s] (longer iterations are counted as overruns)
+            enabled (bool): Flag to enable the measurements (if disabled, the methods do nothing)
+            period (float): Interval between the summaries printed by a background thread [s] (no periodic summary if 0)
+            ring_size (int): Number of recent samples kept for each stage
+        """
+
+        self.enabled = enabled
+        self.budget_ns = int(budget*1e9)
+        self.ring_size = ring_size
+
+        # Histograms and ring buffers of each stage (created when the stage is first recorded)
+        self.histograms = {}
+        self.rings = {}
+        self.overruns = 0
+        self.iterations = 0
+
+        # Start time of the current iteration and time spent waiting for the clock in it
+        self.t_iteration = 0
+        self.t_wait = 0
+
+        # Background thread that prints the summary periodically
+        self.period = period
+        if self.enabled and self.period > 0:
+            self.thread = threading.Thread(target=self.print_periodically, daemon=True)
+            self.thread.start()
+
+
+    def now(self):
+        """
+        Get the current time of the profiler clock
+
+        Returns:
+            (int): Monotonic time [ns]
+        """
+
+        return time.perf_counter_ns()
+
+
+    def add_sample(self, stage, duration):
+        """
+        Store the duration of a stage
+
+        Parameters:
+            stage (str): Name of the stage
+            duration (int): Duration [ns]
+        """
+
+        if stage not in self.histograms:
+            self.histograms[stage] = histogram()
+            self.rings[stage] = ring_buffer(self.ring_size)
+        self.histograms[stage].record(duration)
+        self.rings[stage].push(duration)
+
+
+    def record(self, stage, t_start):
+        """
+        Store the duration of a stage that started at t_start
+
+        Parameters:
+            stage (str): Name of the stage
+            t_start (int): Start time of the stage, given by now() [ns]
+
+        Returns:
+            t_end (int): End time of the stage, that can be used as start time of the next one [ns]
+        """
+
+        t_end = time.perf_counter_ns()
+        if self.enabled:
+            self.add_sample(stage, t_end - t_start)
+
+        return t_end
+
+
+    def start_iteration(self):
+        """
+        Mark the beginning of an iteration of the loop
+
+        Returns:
+            (int): Start time of the iteration [ns]
+        """
+
+        self.t_iteration = time.perf_counter_ns()
+        self.t_wait = 0
+
+        return self.t_iteration
+
+
+    def record_wait(self, stage, t_start):
+        """
+        Store the duration of a stage spent waiting (for the clock or for PX4), which does not count for the overruns
+
+        Parameters:
+            stage (str): Name of the stage
+            t_start (int): Start time of the wait, given by now() [ns]
+
+        Returns:
+            t_end (int): End time of the wait [ns]
+        """
+
+        t_end = self.record(stage, t_start)
+        self.t_wait = self.t_wait + t_end - t_start
+
+        return t_end
+
+
+    def end_iteration(self):
+        """
+        Mark the end of an iteration of the loop, store its duration and check it against the budget
+        """
+
+        if not self.enabled:
+            return
+
+        total = time.perf_counter_ns() - self.t_iteration
+        busy = total - self.t_wait
+        self.add_sample('iteration', total)
+        self.add_sample('busy', busy)
+        self.iterations = self.iterations + 1
+        if busy > self.budget_ns:
+            self.overruns = self.overruns + 1
+
+
+    def summary(self):
+        """
+        Compute the statistics of every stage
+
+        Returns:
+            (dict): Statistics of each stage (count, p50, p99 and max of the whole run, and p99 of the recent samples) [us]
+        """
+
+        stats = {}
+        for stage in list(self.histograms):
+            hist = self.histograms[stage]
+            recent = self.rings[stage].get_samples()
+            stats[stage] = {
+                'count': hist.total,
+                'p50': hist.percentile(50)/1e3,
+                'p99': hist.percentile(99)/1e3,
+                'max': hist.max/1e3,
+                'recent_p99': float(np.percentile(recent, 99))/1e3 if len(recent) > 0 else 0.0,
+            }
+
+        return stats
+
+
+    def print_summary(self):
+        """
+        Print the statistics of every stage and the number of overruns
+        """
+
+        if not self.enabled:
+            return
+
+        stats = self.summary()
+        print(f"\33[1m[profiler] Loop stages [us] ({self.iterations} iterations, {self.overruns} overruns of {self.budget_ns/1e3:.0f} us)\33[0m")
+        print(f"{'stage':>16s} {'count':>10s} {'p50':>10s} {'p99':>10s} {'max':>10s} {'recent p99':>11s}")
+        for stage, s in stats.items():
+            print(f"{stage:>16s} {s['count']:10d} {s['p50']:10.1f} {s['p99']:10.1f} {s['max']:10.1f} {s['recent_p99']:11.1f}")
+
+
+    def print_periodically(self):
+        """
+        Print the summary every period seconds (runs on the background thread)
+        """
+
+        while True:
+            time.sleep(self.period)
+            self.print_summary()
+
+
+
+if __name__ == "__main__":
+
+    # Check the histogram percentiles against the exact ones and measure the cost of recording a stage
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=10, sigma=1, size=100000).astype(np.int64)
+    hist = histogram()
+    for value in values:
+        hist.record(int(value))
+    for p in [50, 90, 99, 99.9]:
+        exact = np.percentile(values, p)
+        print(f"p{p}: histogram {hist.percentile(p)}, exact {exact:.0f}, relative error {hist.percentile(p)/exact-1:+.3f}")
+
+    profiler = loop_profiler(budget=0.001)
+    n = 100000
+    t0 = time.perf_counter()
+    for i in range(n):
+        profiler.start_iteration()
+        t = profiler.now()
+        t = profiler.record('stage', t)
+        profiler.end_iteration()
+    print(f"Cost of one iteration with one stage: {(time.perf_counter()-t0)/n*1e6:.2f} us")
+    profiler.print_summary()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Flight recorder
+# Appends one row per simulation step to a columnar binary log: one raw float64 file per column and a meta.json file that describes them
+# The rows are written into preallocated chunks in the simulation loop, and a writer thread appends the full chunks to the column files
+# The logs are read back as memory maps (see load), without parsing and without loading the whole flight in memory
+
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+
+
+# Data type of every column
+DTYPE = np.float64
+# Version of the layout of the log
+LOG_VERSION = 1
+
+
+def flight_columns(act_num):
+    """
+    Columns of the state of one vehicle recorded by sim4cd at every step
+
+    Parameters:
+        act_num (int): Number of actuators of the vehicle
+
+    Returns:
+        (list of tuple): Name and width of each column, in the order of the values given to flight_recorder.record
+    """
+
+    return [
+        ('t', 1),               # Simulated time at the end of the step [s]
+        ('dt', 1),              # Time step [s]
+        ('p', 3),               # Position in the world frame [m]
+        ('v', 3),               # Velocity in the world frame [m/s]
+        ('q', 4),               # Orientation quaternion [qw, qx, qy, qz]
+        ('w', 3),               # Angular velocity in the body frame [rad/s]
+        ('status', 1),          # Vehicle status (0: landed, 1: flying, 2: landing)
+        ('act_speed', act_num), # Rotation speed of each actuator [rad/s]
+        ('act_current', act_num), # Current of each actuator [A]
+        ('act_force', act_num), # Force of each actuator [N]
+        ('bat_voltage', 1),     # Output voltage of the battery [V]
+        ('bat_soc', 1),         # State of charge of the battery (from 0 to 1)
+        ('acc', 3),             # Last accelerometer measurement [m/s2]
+        ('gyro', 3),            # Last gyro measurement [rad/s]
+        ('mag', 3),             # Last magnetometer measurement [G]
+        ('baro', 1),            # Last barometer measurement [hPa]
+        ('sens_new', 1),        # 1 if the sensors were sampled in this step
+        ('cmd', 8),             # Actuator commands applied in this step (as received from HIL_ACTUATOR_CONTROLS)
+        ('cmd_new', 1),         # 1 if a new actuator command was received in this step
+    ]
+
+
+def flatten(widths, values):
+    """
+    Flatten the values of one row into a list (cheaper to write at once than one numpy assignment per column)
+
+    Parameters:
+        widths (list of int): Width of each column
+        values (list): One value (float, list or array) per column
+
+    Returns:
+        flat (list): Values of the row
+    """
+
+    flat = []
+    for width, value in zip(widths, values):
+        if width == 1:
+            flat.append(value)
+        elif type(value) is list:
+            flat.extend(value)
+        else:
+            flat.extend(value.tolist())
+
+    return flat
+
+
+class flight_recorder:
+    """
+    Class that records rows of fixed width columns into a columnar binary log
+    """
+
+    def __init__(self, directory, columns, chunk_rows=4096, n_chunks=4, meta=None):
+        """
+        Constructor for the flight_recorder class
+
+        Parameters:
+            directory (str): Directory of the log (created if it does not exist)
+            columns (list of tuple): Name and width of each column
+            chunk_rows (int): Number of rows of each chunk handed to the writer thread
+            n_chunks (int): Number of preallocated chunks (the loop only allocates a new one if the writer falls behind all of them)
+            meta (dict): Extra information stored in meta.json (e.g. seed and step rate of the run)
+        """
+
+        self.directory = directory
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.meta = meta if meta is not None else {}
+
+        # Position of each column in the rows of the chunks
+        self.slices = []
+        offset = 0
+        for name, width in columns:
+            self.slices.append(slice(offset, offset + width))
+            offset = offset + width
+        self.width = offset
+        self.widths = [width for name, width in columns]
+
+        # Pool of free chunks and queue of full chunks for the writer thread
+        self.free = queue.Queue()
+        for i in range(n_chunks):
+            self.free.put(np.zeros((chunk_rows, self.width), dtype=DTYPE))
+        self.full = queue.Queue()
+        # Number of chunks allocated because the pool was empty
+        self.extra_chunks = 0
+
+        # Chunk being filled by the loop and index of its next row
+        self.chunk = self.free.get()
+        self.index = 0
+        # Number of rows in the chunks already handed to the writer thread
+        self.handed_rows = 0
+        # Number of rows written to disk by the writer thread
+        self.rows = 0
+        self.closed = False
+        self.created = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+        # Create the log directory and one file per column
+        os.makedirs(directory, exist_ok=True)
+        self.files = [open(os.path.join(directory, name + '.bin'), 'wb') for name, width in columns]
+        self.write_meta()
+
+        # Start the writer thread
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+
+    def record(self, values):
+        """
+        Append one row to the log (called by the simulation loop)
+
+        Parameters:
+            values (list): One value (float or array) per column, in the order of the columns
+        """
+
+        # Write the whole row at once
+        self.chunk[self.index] = flatten(self.widths, values)
+        self.index = self.index + 1
+
+        # Hand the full chunk to the writer thread
+        if self.index == self.chunk_rows:
+            self.full.put((self.chunk, self.index))
+            self.handed_rows = self.handed_rows + self.index
+            self.next_chunk()
+
+
+    def recorded_rows(self):
+        """
+        Get the index of the next row of the log
+
+        Returns:
+            (int): Number of rows recorded so far (including the ones not written to disk yet)
+        """
+
+        return self.handed_rows + self.index
+
+
+    def next_chunk(self):
+        """
+        Take a free chunk from the pool (a new one is allocated if the writer thread is behind)
+        """
+
+        try:
+            self.chunk = self.free.get_nowait()
+        except queue.Empty:
+            self.chunk = np.zeros((self.chunk_rows, self.width), dtype=DTYPE)
+            self.extra_chunks = self.extra_chunks + 1
+        self.index = 0
+
+
+    def writer(self):
+        """
+        Append the full chunks to the column files (runs on the writer thread)
+        """
+
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            chunk, n_rows = item
+            for file, s in zip(self.files, self.slices):
+                # Each column of the chunk is copied to a contiguous array before being written
+                file.write(np.ascontiguousarray(chunk[0:n_rows, s]).tobytes())
+            for file in self.files:
+                file.flush()
+            self.rows = self.rows + n_rows
+            self.free.put(chunk)
+
+
+    def write_meta(self):
+        """
+        Write the description of the log (at the beginning and at the end of the recording)
+        If the recording is interrupted by a crash, the number of rows is recovered from the size of the column files (see load)
+        """
+
+        meta = dict(self.meta)
+        meta.update({
+            'version': LOG_VERSION,
+            'dtype': np.dtype(DTYPE).str,
+            'rows': self.rows,
+            'complete': self.closed,
+            'columns': [{'name': name, 'width': width} for name, width in self.columns],
+            'created': self.created,
+        })
+
+        # Replace the file atomically
+        file_name = os.path.join(self.directory, 'meta.json')
+        with open(file_name + '.tmp', 'w') as file:
+            json.dump(meta, file, indent=4)
+        os.replace(file_name + '.tmp', file_name)
+
+
+    def close(self):
+        """
+        Write the last partial chunk, stop the writer thread and close the files
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.index > 0:
+            self.full.put((self.chunk, self.index))
+        self.full.put(None)
+        self.thread.join()
+        for file in self.files:
+            file.close()
+        self.write_meta()
+
+        if self.extra_chunks > 0:
+            print(f"\33[93m[recorder] The writer fell behind the loop: {self.extra_chunks} extra chunks of {self.chunk_rows} rows were allocated\33[0m")
+        print(f"\33[92m[recorder] Saved {self.rows} rows: {self.directory}\33[0m")
+
+
+def save_params(directory, params, row=None):
+    """
+    Save the parameters of the run in the log directory, as a parameter file that can be loaded by parameter_server
+
+    Parameters:
+        directory (str): Directory of the log
+        params (<parameter_server.parameter_server>): Parameter server object of the run
+        row (int): Row from which the parameters apply, if they were reloaded during the run (None for the parameters of the start)
+    """
+
+    file_name = 'params.json' if row is None else f'params_{row}.json'
+    with open(os.path.join(directory, file_name), 'w') as file:
+        json.dump(params.data, file, indent=4)
+
+
+def reloaded_params(directory):
+    """
+    Find the parameter files saved when the parameters were reloaded during the run (see save_params)
+
+    Parameters:
+        directory (str): Directory of the log
+
+    Returns:
+        (list of tuple): Row from which each file applies and path of the file, sorted by row
+    """
+
+    reloads = []
+    for file_name in os.listdir(directory):
+        name, extension = os.path.splitext(file_name)
+        if extension == '.json' and name.startswith('params_') and name[len('params_'):].isdigit():
+            reloads.append((int(name[len('params_'):]), os.path.join(directory, file_name)))
+
+    return sorted(reloads)
+
+
+def load(directory):
+    """
+    Open a log written by flight_recorder
+
+    Parameters:
+        directory (str): Directory of the log
+
+    Returns:
+        data (dict): Memory map of each column, shape (rows,) for the columns of width 1 and (rows, width) for the others
+        meta (dict): Contents of meta.json
+
+    Raises:
+        OSError, ValueError: If the description of the log can not be read
+    """
+
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+    except Exception as e:
+        print(f"\33[91m[recorder] Could not load the log {directory}: {str(e)}\33[0m")
+        raise
+
+    dtype = np.dtype(meta['dtype'])
+    rows = meta['rows']
+    if not meta.get('complete', False):
+        # Interrupted recording: keep the rows that reached every column file
+        rows = min(os.path.getsize(os.path.join(directory, column['name'] + '.bin'))//(column['width']*dtype.itemsize) for column in meta['columns'])
+        print(f"\33[93m[recorder] The log {directory} was not closed. Reading the {rows} rows found in the files\33[0m")
+        meta['rows'] = rows
+    data = {}
+    for column in meta['columns']:
+        name, width = column['name'], column['width']
+        shape = (rows,) if width == 1 else (rows, width)
+        if rows == 0:
+            data[name] = np.zeros(shape, dtype=dtype)
+        else:
+            # Only the complete rows are mapped (the files of an interrupted recording may hold part of a chunk)
+            data[name] = np.memmap(os.path.join(directory, name + '.bin'), dtype=dtype, mode='r', shape=shape)
+
+    return data, meta
+
+
+def default_directory():
+    """
+    Directory of a new log in the logs folder of the package, named after the current date and time
+
+    Returns:
+        (str): Path of the directory
+    """
+
+    logs = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../logs')
+
+    return os.path.abspath(os.path.join(logs, time.strftime('flight_%Y%m%d_%H%M%S')))
+
+
+
+if __name__ == "__main__":
+
+    # Record a synthetic flight, read it back and measure the cost of one row
+    import tempfile
+
+    act_num = 4
+    columns = flight_columns(act_num)
+    directory = tempfile.mkdtemp(prefix='sim4cd_log_')
+    rec = flight_recorder(directory, columns, chunk_rows=1000, meta={'act_num': act_num})
+
+    n = 20000
+    p = np.zeros(3)
+    q = np.array([1.0, 0.0, 0.0, 0.0])
+    zeros3 = np.zeros(3)
+    act = np.ones(act_num)
+    cmd = [0.5]*8
+    costs = np.zeros(n)
+    for k in range(n):
+        p[2] = k*1e-3
+        t0 = time.perf_counter()
+        rec.record([k*1e-3, 1e-3, p, zeros3, q, zeros3, 1, act, act, act, 16.0, 0.9, zeros3, zeros3, zeros3, 1013.0, k % 2, cmd, 0])
+        costs[k] = time.perf_counter() - t0
+    rec.close()
+
+    data, meta = load(directory)
+    print(f"Rows: {meta['rows']}, t[-1] = {data['t'][-1]}, p[-1] = {data['p'][-1]}, intact: {np.array_equal(data['p'][:,2], np.arange(n)*1e-3)}")
+    print(f"Cost of one row: median {np.median(costs)*1e6:.2f} us, p99 {np.percentile(costs, 99)*1e6:.2f} us, max {costs.max()*1e6:.2f} us")
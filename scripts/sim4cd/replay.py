@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Deterministic replay of a recorded flight
+# Feeds the actuator commands of a flight log (see recorder.py) back into vehicle_dynamics.model_step, without PX4 and as fast as possible,
+# and compares the resulting states and sensor outputs against the recording
+# With the same code and parameters the replay is exact, so any difference points to a change in the physics (e.g. to bisect a regression offline)
+
+import sys
+import os
+import time
+import numpy as np
+
+import dynamics as DYN
+import parameter_server as PRM
+import recorder as REC
+import param_watcher as WATCH
+
+
+# Exit status when the replay can not run (any value other than 0, 1 and 125, which git bisect run reads as good, bad and skip)
+EXIT_ERROR = 2
+
+# Columns of the log compared against the replay (the sensors are only compared at the steps where they were sampled)
+STATE_COLUMNS = ['p', 'v', 'q', 'w', 'status', 'act_speed', 'act_current', 'act_force', 'bat_voltage', 'bat_soc']
+SENSOR_COLUMNS = ['acc', 'gyro', 'mag', 'baro']
+
+
+def load_flight(directory, param_file_name=None):
+    """
+    Load a flight log and the parameters used to replay it
+
+    Parameters:
+        directory (str): Directory of the log
+        param_file_name (str): Parameter file used instead of the one saved with the log (e.g. to test the effect of a parameter change)
+
+    Returns:
+        data (dict): Columns of the log
+        meta (dict): Description of the log
+        params (<parameter_server.parameter_server>): Parameter server object, with the seed of the recorded run
+        reloads (list of tuple): Row and parameter server object of each reload of the parameters during the run
+    """
+
+    data, meta = REC.load(directory)
+    if meta['rows'] == 0:
+        print(f"\33[91m[replay] The log {directory} has no rows. Exiting.\33[0m")
+        sys.exit(EXIT_ERROR)
+
+    # Parameters changed during the run (only replayed with the parameters saved with the log)
+    reloads = []
+    if param_file_name is None:
+        param_file_name = os.path.join(directory, 'params.json')
+        reloads = [(row, PRM.parameter_server(file_name)) for row, file_name in REC.reloaded_params(directory)]
+    elif len(REC.reloaded_params(directory)) > 0:
+        print(f"\33[93m[replay] The parameters were reloaded during the run. Replaying the whole flight with {param_file_name}\33[0m")
+    params = PRM.parameter_server(param_file_name)
+
+    # Same sensor noise of the recorded run
+    params.set_parameter_value('SIM_SEED', meta['seed'])
+
+    return data, meta, params, reloads
+
+
+def replay(data, params, reloads=None):
+    """
+    Replay the recorded actuator commands through the vehicle model
+
+    Parameters:
+        data (dict): Columns of the log (at least dt, cmd and sens_new)
+        params (<parameter_server.parameter_server>): Parameter server object
+        reloads (list of tuple): Row and parameter server object of each reload of the parameters, applied before the step of that row (None if there are none)
+
+    Returns:
+        traces (dict): Replayed values of the STATE_COLUMNS and SENSOR_COLUMNS, with the same shapes of the log
+    """
+
+    # Load the commands in memory (the log columns are memory maps)
+    dt = np.array(data['dt'])
+    cmd = np.array(data['cmd'])
+    sens_new = np.array(data['sens_new']) > 0
+    n_steps = len(dt)
+
+    # Vehicle at the initial state of the recorded run
+    quad = DYN.vehicle_dynamics(params)
+    act = quad.vehicle_geo.actuators
+    bat = quad.vehicle_geo.battery
+
+    traces = {name: np.zeros(data[name].shape) for name in STATE_COLUMNS + SENSOR_COLUMNS}
+    acc = gyro = mag = np.zeros(3)
+    bar = 0.0
+    reload_rows = dict(reloads) if reloads is not None else {}
+    for k in range(n_steps):
+        # Same parameter changes of the recorded run
+        if k in reload_rows:
+            new_params = reload_rows[k]
+            quad.reload_parameters(new_params, WATCH.changed_keys(params.data, new_params.data))
+            params = new_params
+
+        quad.model_step(cmd[k], dt[k])
+
+        # Sensors sampled at the same steps of the recorded run (same order of the random number streams)
+        if sens_new[k]:
+            acc = quad.get_acc()
+            gyro = quad.get_gyro()
+            mag = quad.get_mag()
+            bar = quad.get_baro()
+
+        traces['p'][k] = quad.p
+        traces['v'][k] = quad.v
+        traces['q'][k] = quad.q
+        traces['w'][k] = quad.w
+        traces['status'][k] = quad.status
+        traces['act_speed'][k] = act.speed
+        traces['act_current'][k] = act.current
+        traces['act_force'][k] = act.force
+        traces['bat_voltage'][k] = bat.output_voltage()
+        traces['bat_soc'][k] = bat.soc
+        traces['acc'][k] = acc
+        traces['gyro'][k] = gyro
+        traces['mag'][k] = mag
+        traces['baro'][k] = bar
+
+    return traces
+
+
+def compare(data, traces, tolerance=0.0):
+    """
+    Compare the replayed values against the recorded ones
+
+    Parameters:
+        data (dict): Columns of the log
+        traces (dict): Replayed values returned by replay
+        tolerance (float): Largest absolute difference accepted
+
+    Returns:
+        (list of tuple): Name, maximum absolute difference and first step with a difference above the tolerance (None if there is none) of each column
+    """
+
+    results = []
+    for name in STATE_COLUMNS + SENSOR_COLUMNS:
+        recorded = np.asarray(data[name]).reshape(len(traces[name]), -1)
+        replayed = traces[name].reshape(len(traces[name]), -1)
+        error = np.abs(recorded - replayed).max(axis=1)
+        # Not a number in only one of them is a difference
+        error[np.isnan(recorded).any(axis=1) != np.isnan(replayed).any(axis=1)] = np.inf
+        error[np.isnan(error)] = 0.0
+        above = np.nonzero(error > tolerance)[0]
+        results.append((name, float(error.max()), int(above[0]) if len(above) > 0 else None))
+
+    return results
+
+
+
+if __name__ == "__main__":
+    """
+    Replay main function
+
+    Parameters:
+        log_directory (str): Directory of the flight log
+        tolerance (float): Largest absolute difference accepted (optional, default 0)
+        param_file_name (str): Parameter file used instead of the one saved with the log (optional)
+
+    The exit status is 1 if any column differs from the recording (e.g. for git bisect run), and EXIT_ERROR if the replay can not run
+    """
+
+    if len(sys.argv) < 2:
+        print("\33[91m[replay] Usage: replay.py log_directory [tolerance] [params.json]\33[0m")
+        sys.exit(EXIT_ERROR)
+    directory = sys.argv[1]
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    param_file_name = sys.argv[3] if len(sys.argv) > 3 else None
+
+    # A log or parameter file that can not be loaded must not look like a match (parameter_server exits with status 0)
+    try:
+        data, meta, params, reloads = load_flight(directory, param_file_name)
+    except (Exception, SystemExit) as e:
+        if isinstance(e, SystemExit) and e.code == EXIT_ERROR:
+            raise
+        print(f"\33[91m[replay] Could not load the flight {directory}. Exiting.\33[0m")
+        sys.exit(EXIT_ERROR)
+    n_steps = meta['rows']
+
+    # Replay the flight
+    t0 = time.perf_counter()
+    with np.errstate(all='ignore'):
+        traces = replay(data, params, reloads)
+    elapsed = time.perf_counter() - t0
+    print(f"\33[94m[replay] {n_steps} steps ({data['t'][-1]:.3f} s) replayed in {elapsed:.3f} s ({data['t'][-1]/elapsed:.1f}x real time)\33[0m")
+
+    # Compare against the recording
+    results = compare(data, traces, tolerance)
+    print(f"{'column':>12s} {'max diff':>10s} {'first step':>11s} {'time [s]':>9s}")
+    for name, error, first in results:
+        color = "\33[92m" if first is None else "\33[91m"
+        first_step = f"{first:11d} {data['t'][first]:9.3f}" if first is not None else f"{'-':>11s} {'-':>9s}"
+        print(f"{color}{name:>12s} {error:10.2e} {first_step}\33[0m")
+
+    diverged = [first for name, error, first in results if first is not None]
+    if len(diverged) > 0:
+        print(f"\33[91m[replay] The replay differs from the recording (tolerance {tolerance}) from step {min(diverged)}\33[0m")
+        sys.exit(1)
+    print(f"\33[92m[replay] The replay matches the recording (tolerance {tolerance})\33[0m")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Random number service
+# Hands out independent numpy Generator streams derived from one seed (SIM_SEED)
+# Each stream is identified by a name (e.g. "vehicle/0/sensors"), so a stream does not change when other streams are added, removed or used in a different order
+
+import zlib
+import numpy as np
+
+
+class rng_service:
+    """
+    Class that creates reproducible and independent random number streams from one seed
+    """
+
+    def __init__(self, seed=-1):
+        """
+        Constructor for the rng_service class
+
+        Parameters:
+            seed (int): Seed of all of the streams (a new seed is drawn from the operating system entropy if negative)
+        """
+
+        # Draw a new seed if none was given, and keep it so that the run can be repeated
+        if seed is None or seed < 0:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self.seed = int(seed)
+
+
+    def seed_sequence(self, name):
+        """
+        Get the seed sequence of a named stream
+
+        Parameters:
+            name (str): Name of the stream, with the levels separated by slashes (e.g. "vehicle/0/sensors")
+
+        Returns:
+            (<numpy.random.SeedSequence>): Seed sequence of the stream (it can be spawned into sub-streams)
+        """
+
+        # Stable (not salted) hash of each level of the name
+        key = [zlib.crc32(level.encode()) for level in name.split('/')]
+
+        return np.random.SeedSequence(self.seed, spawn_key=key)
+
+
+    def stream(self, name):
+        """
+        Get a new generator of a named stream
+
+        Parameters:
+            name (str): Name of the stream (see seed_sequence)
+
+        Returns:
+            (<numpy.random.Generator>): Generator of the stream (every call returns a generator at the beginning of the stream)
+        """
+
+        return np.random.default_rng(self.seed_sequence(name))
+
+
+
+def from_params(params):
+    """
+    Create the random number service configured by the simulator parameters
+
+    Parameters:
+        params (<parameter_server.parameter_server>): Parameter server object with SIM_SEED
+
+    Returns:
+        (<rng.rng_service>): Random number service
+    """
+
+    return rng_service(params.snapshot().sim.seed)
+
+
+
+if __name__ == "__main__":
+
+    # Same seed and name give the same stream, different names give different streams
+    a = rng_service(7)
+    b = rng_service(7)
+    print("Reproducible:", np.array_equal(a.stream("vehicle/0/sensors").random(5), b.stream("vehicle/0/sensors").random(5)))
+    print("Independent:", not np.array_equal(a.stream("vehicle/0/sensors").random(5), a.stream("vehicle/1/sensors").random(5)))
+    print("Random seed:", rng_service().seed)
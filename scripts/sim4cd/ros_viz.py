@@ -3,21 +3,68 @@
 
 # ROS support to visualize the simulation on RViz and publish the drones state as ROS topics
 
+import time
+import threading
+import numpy as np
 import rospy
 from geometry_msgs.msg import Twist, Pose, Point, Quaternion
 from nav_msgs.msg import Odometry
 from visualization_msgs.msg import Marker, MarkerArray
-from math import pi, cos, sin
+from math import cos, sin, atan2
 
 import math_utils as MU
+import state_buffer as SB
+import timer as TIM
+import profiler as PROF
+
+
+# Levels of detail of the markers (SIM_ROS_MARKER_LOD)
+LOD_FULL = 0    # Body, heading, arms and propellers
+LOD_SIMPLE = 1  # Body and heading only (the first markers of the array)
+LOD_SIMPLE_MARKERS = 2
+
+# Layout of the state handed to the publisher thread: p, vw, q, omega, p0, q0
+STATE_SLICES = [slice(0,3), slice(3,6), slice(6,10), slice(10,13), slice(13,16), slice(16,20)]
+STATE_SIZE = 20
+
+
+def quat_from_z(direction):
+    """
+    Compute the rotation that takes the z axis to a direction (RViz cylinders and disks are aligned with the z axis)
+
+    Parameters:
+        direction (numpy.ndarray): Direction [x, y, z] (not necessarily unit norm)
+
+    Returns:
+        (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
+    """
+
+    d = MU.normalize(np.array(direction, dtype=float))
+    axis = np.cross([0.0, 0.0, 1.0], d)
+    sin_angle = MU.norm(axis)
+    if sin_angle < 1e-9:
+        # Parallel or opposite to the z axis
+        return np.array([1.0, 0.0, 0.0, 0.0]) if d[2] > 0 else np.array([0.0, 1.0, 0.0, 0.0])
+    angle = atan2(sin_angle, d[2])
+    axis = axis/sin_angle
+
+    return np.array([cos(angle/2), sin(angle/2)*axis[0], sin(angle/2)*axis[1], sin(angle/2)*axis[2]])
 
 
 class drone_show(object):
     """
     Drone state and markers publisher
+    The messages are built once (see build_templates) and only their poses and stamps are updated before each publication
+    Each topic has its own rate, and a topic is only published when it has subscribers
     """
 
-    def __init__(self):
+    def __init__(self, params):
+        """
+        Constructor for the drone_show class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object, with the geometry of the vehicle (VEH_*) and its dimensions (VIZ_*)
+        """
 
         # Publishers
         self.pub_gt = None
@@ -27,6 +74,22 @@ class drone_show(object):
 
         self.init_node()
 
+        # Messages reused in every publication
+        self.build_templates(params)
+
+        # Rate of each topic (a rate of 0 disables the topic)
+        sim = params.snapshot().sim
+        self.timer_odom = TIM.timer(frequency=sim.ros_odom_hz if sim.ros_odom_hz > 0 else 1, slip_correction=True, enabled=sim.ros_odom_hz > 0)
+        self.timer_gt = TIM.timer(frequency=sim.ros_gt_hz if sim.ros_gt_hz > 0 else 1, slip_correction=True, enabled=sim.ros_gt_hz > 0)
+        self.timer_pose = TIM.timer(frequency=sim.ros_pose_hz if sim.ros_pose_hz > 0 else 1, slip_correction=True, enabled=sim.ros_pose_hz > 0)
+        self.timer_marker = TIM.timer(frequency=sim.ros_marker_hz if sim.ros_marker_hz > 0 else 1, slip_correction=True, enabled=sim.ros_marker_hz > 0)
+        for name, hz in [('SIM_ROS_ODOM_HZ', sim.ros_odom_hz), ('SIM_ROS_GT_HZ', sim.ros_gt_hz), ('SIM_ROS_POSE_HZ', sim.ros_pose_hz), ('SIM_ROS_MARKER_HZ', sim.ros_marker_hz)]:
+            if hz > sim.ros_hz:
+                print(f"\33[93m[ros_viz] {name} ({hz} Hz) is limited by SIM_ROS_HZ ({sim.ros_hz} Hz)\33[0m")
+
+        # Number of publications of each topic, and of publications skipped because the topic had no subscribers
+        self.topic_stats = {topic: [0, 0] for topic in ['odom', 'gt', 'pose', 'robot']}
+
 
     def init_node(self):
         """
@@ -34,8 +97,6 @@ class drone_show(object):
         """
         rospy.init_node("drone_sim")
 
-        self.robot_arm_len = 0.3 # TODO: config param
-
         # self.history = []
         # self.history.append([self.state[0], self.state[1], self.state[2]])
 
@@ -47,6 +108,83 @@ class drone_show(object):
         # self.pub_rviz_hist = rospy.Publisher("/drone/history", MarkerArray, queue_size=1)
 
 
+    def build_templates(self, params):
+        """
+        Build the messages of every topic once, with all of the fields that do not change between publications
+        The markers are generated from the actual actuator layout: one disk per actuator along its direction of propulsion, and one arm from its base to the actuator
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object, with the geometry of the vehicle (VEH_*) and its dimensions (VIZ_*)
+        """
+
+        snap = params.snapshot()
+        size = snap.viz.size
+
+        # Odometry messages (rospy serializes a message when it is published, so the same object can be modified afterwards)
+        self.odom_msg = Odometry()
+        self.odom_msg.header.frame_id = "drone"
+        self.odom_msg.child_frame_id = "world"
+        self.gt_msg = Odometry()
+        self.gt_msg.header.frame_id = "drone"
+        self.gt_msg.child_frame_id = "world"
+
+        # Pose message
+        self.pose_msg = Pose()
+
+        # Anchor of each marker in the body frame, and its orientation with respect to the body
+        anchors = []
+        orientations = []
+        self.marker_array = MarkerArray()
+
+        def add_marker(marker_type, scale, color, anchor, orientation):
+            marker = Marker()
+            marker.header.frame_id = "world"
+            marker.id = len(self.marker_array.markers)
+            marker.type = marker_type
+            marker.action = Marker.ADD
+            marker.lifetime = rospy.Duration(3)
+            marker.scale.x, marker.scale.y, marker.scale.z = [float(value) for value in scale]
+            marker.color.r, marker.color.g, marker.color.b, marker.color.a = [float(value) for value in color]
+            self.marker_array.markers.append(marker)
+            anchors.append(anchor)
+            orientations.append(orientation)
+
+        # Body of the drone
+        add_marker(Marker.CUBE, size, (0.0, 0.0, 0.0, 0.5), [0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0])
+
+        # Heading of the drone (as long as the farthest actuator)
+        arrow_len = max([MU.norm(position) for position in snap.vehicle.positions] + [size[0]])
+        add_marker(Marker.ARROW, (arrow_len, arrow_len/5.0, arrow_len/5.0), (0.0, 0.0, 1.0, 0.99), [0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0])
+
+        disk_d = size[0] + size[1]
+        arm_d = (size[0] + size[1])/15.0
+        for i in range(snap.vehicle.act_num):
+            position = snap.vehicle.positions[i]
+            base = snap.viz.act_bases[i]
+
+            # Spinning blades, colored by spin direction (same colors of the vehicle configuration GUI)
+            spin = snap.actuators.spin[i]
+            color = (0.25, 0.5, 1.0, 0.3) if spin == 1 else ((0.5, 1.0, 0.25, 0.3) if spin == -1 else (0.5, 0.5, 0.5, 0.3))
+            add_marker(Marker.CYLINDER, (disk_d, disk_d, size[2]/10.0), color, position.tolist(), quat_from_z(snap.vehicle.directions[i]))
+
+            # Arm from its base to the actuator
+            arm = position - base
+            arm_len = MU.norm(arm)
+            if arm_len > 0:
+                add_marker(Marker.CYLINDER, (arm_d, arm_d, arm_len), (0.0, 0.0, 0.0, 0.9), ((position + base)/2).tolist(), quat_from_z(arm))
+
+        # Level of detail: the simple representation publishes only the first markers (body and heading)
+        if snap.sim.ros_marker_lod == LOD_SIMPLE:
+            del self.marker_array.markers[LOD_SIMPLE_MARKERS:]
+            del anchors[LOD_SIMPLE_MARKERS:]
+            del orientations[LOD_SIMPLE_MARKERS:]
+        self.marker_anchors = np.array(anchors, dtype=float)
+        self.marker_orientations = np.array(orientations, dtype=float)
+        # Poses of the markers in the world frame (written by send_marker)
+        self.marker_positions_w = np.zeros(self.marker_anchors.shape)
+        self.marker_orientations_w = np.zeros(self.marker_orientations.shape)
+
+
     def update_ros_info(self,p,vw,q,omega,p0,q0):
         """
         Publish information as ROS topics
@@ -58,23 +196,76 @@ class drone_show(object):
             omega (numpy.ndarray): Body angular velocity [wx, wy, wz]
             p0 (numpy.ndarray): Initial position vector [x, y, z]
             q0 (numpy.ndarray): Initial orientation quaternion [qw, qx, qy, qz]
-        """
-
-        # Compute the body velocity
-        vb = MU.quat_apply_rot(MU.quat_conj(q),vw)
-
-        # Compute odometry 
-        p_odom, q_odom = self.compute_odometry(p,q,p0,q0)
 
+        Returns:
+            (bool): True if any topic was published
+        """
 
+        # Topics due in this call (the timers are checked even without subscribers, to keep their rates)
+        odom_due = self.timer_odom.tick()
+        gt_due = self.timer_gt.tick()
+        pose_due = self.timer_pose.tick()
+        marker_due = self.timer_marker.tick()
+
+        # Topics that are due and have subscribers (the others cost nothing)
+        send_odom = odom_due and self.has_subscribers('odom', self.pub_odom)
+        send_gt = gt_due and self.has_subscribers('gt', self.pub_gt)
+        send_pose = pose_due and self.has_subscribers('pose', self.pub_pose)
+        send_marker = marker_due and self.has_subscribers('robot', self.pub_rviz_robot)
+        if not (send_odom or send_gt or send_pose or send_marker):
+            return False
+
+        # Same stamp for all of the messages of this publication
+        stamp = rospy.Time.now()
+
+        if send_odom or send_gt:
+            # Compute the body velocity
+            vb = MU.quat_apply_inv_rot_fast(q,vw)
+
+        #Publish odometry topic (with respect to the initial pose)
+        if send_odom:
+            p_odom, q_odom = self.compute_odometry(p,q,p0,q0)
+            self.send_odom(self.pub_odom, self.odom_msg, stamp, p_odom,q_odom,vb,omega)
         #Publish groung truth (odometry) topic
-        self.send_odom(self.pub_odom, p_odom,q_odom,vb,omega)
-        #Publish groung truth (odometry) topic
-        self.send_odom(self.pub_gt, p,q,vb,omega)
+        if send_gt:
+            self.send_odom(self.pub_gt, self.gt_msg, stamp, p,q,vb,omega)
         #Publish pose topic
-        self.send_pose(p,q)
+        if send_pose:
+            self.send_pose(p,q)
         #Publish marker array topic that represents the drone (visualization n RViz)
-        self.send_marker(p,q)
+        if send_marker:
+            self.send_marker(stamp, p,q)
+
+        return True
+
+
+    def has_subscribers(self, topic, pub):
+        """
+        Check if a topic that is due has subscribers, and count its publications
+
+        Parameters:
+            topic (str): Name of the topic in topic_stats
+            pub (rospy.topics.Publisher): Publisher of the topic
+
+        Returns:
+            (bool): True if the topic has to be published
+        """
+
+        if pub.get_num_connections() > 0:
+            self.topic_stats[topic][0] += 1
+            return True
+        self.topic_stats[topic][1] += 1
+
+        return False
+
+
+    def print_stats(self):
+        """
+        Print the number of publications of each topic
+        """
+
+        counts = ', '.join(f"{topic} {published} ({skipped} without subscribers)" for topic, (published, skipped) in self.topic_stats.items())
+        print(f"\33[94m[ros_viz] Publications: {counts}\33[0m")
 
 
     def compute_odometry(self,p,q,p0,q0):
@@ -99,39 +290,30 @@ class drone_show(object):
         return p_odom, q_odom 
 
 
-    def send_odom(self,pub,p,q,vb,omega):
+    def send_odom(self,pub,odom_msg,stamp,p,q,vb,omega):
         """
         Publish ROS odometry topic
 
         Parameters:
             pub (rospy.topics.Publisher): Publisher to a geometry_msgs/Odometry  topic
+            odom_msg (nav_msgs.msg.Odometry): Message of the topic, updated in place
+            stamp (rospy.Time): Time stamp of the message
             p (numpy.ndarray): Position vector [x, y, z]
             q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
             vb (numpy.ndarray): Body velocity vector [vx, vy, vz]
             omega (numpy.ndarray): Body angular velocity [wx, wy, wz]
         """
 
-        odom_msg = Odometry()
-
         #Publish robots odometry
-        odom_msg.header.stamp = rospy.Time.now()
-        odom_msg.header.frame_id = "drone"
-        odom_msg.child_frame_id = "world"
+        odom_msg.header.stamp = stamp
         #
-        odom_msg.pose.pose.position.x = p[0]
-        odom_msg.pose.pose.position.y = p[1]
-        odom_msg.pose.pose.position.z = p[2]
-        odom_msg.pose.pose.orientation.x = q[1]
-        odom_msg.pose.pose.orientation.y = q[2]
-        odom_msg.pose.pose.orientation.z = q[3]
-        odom_msg.pose.pose.orientation.w = q[0]
+        pose = odom_msg.pose.pose
+        pose.position.x, pose.position.y, pose.position.z = p[0], p[1], p[2]
+        pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w = q[1], q[2], q[3], q[0]
         #
-        odom_msg.twist.twist.linear.x = vb[0]
-        odom_msg.twist.twist.linear.y = vb[1]
-        odom_msg.twist.twist.linear.z = vb[2]
-        odom_msg.twist.twist.angular.x = omega[0]
-        odom_msg.twist.twist.angular.y = omega[1]
-        odom_msg.twist.twist.angular.z = omega[2]
+        twist = odom_msg.twist.twist
+        twist.linear.x, twist.linear.y, twist.linear.z = vb[0], vb[1], vb[2]
+        twist.angular.x, twist.angular.y, twist.angular.z = omega[0], omega[1], omega[2]
 
         pub.publish(odom_msg)
 
@@ -145,284 +327,113 @@ class drone_show(object):
             q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
         """
 
-        pose_msg = Pose()
-
         #Publish robots pose
-        pose_msg.position.x = p[0]
-        pose_msg.position.y = p[1]
-        pose_msg.position.z = p[2]
-        pose_msg.orientation.x = q[1]
-        pose_msg.orientation.y = q[2]
-        pose_msg.orientation.z = q[3]
-        pose_msg.orientation.w = q[0]
+        pose_msg = self.pose_msg
+        pose_msg.position.x, pose_msg.position.y, pose_msg.position.z = p[0], p[1], p[2]
+        pose_msg.orientation.x, pose_msg.orientation.y, pose_msg.orientation.z, pose_msg.orientation.w = q[1], q[2], q[3], q[0]
 
         self.pub_pose.publish(pose_msg)
 
 
-    def send_marker(self,p,q):
+    def send_marker(self,stamp,p,q):
         """
-        Construct and publish ROS marker array topic that represents the drones body
+        Update the poses of the markers that represent the drones body and publish them
 
         Parameters:
+            stamp (rospy.Time): Time stamp of the markers
             p (numpy.ndarray): Position vector [x, y, z]
             q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
         """
 
-        robot_marker_array = MarkerArray()
-
-        # Define marker representing the drones body
-        marker_robot = Marker()
-        marker_robot.header.frame_id = "world"
-        marker_robot.header.stamp = rospy.Time.now()
-        marker_robot.id = 0
-        marker_robot.type = marker_robot.CUBE
-        marker_robot.action = marker_robot.ADD
-        marker_robot.lifetime = rospy.Duration(3)
-        # Size of robots body
-        marker_robot.scale.x = self.robot_arm_len/2.0
-        marker_robot.scale.y = self.robot_arm_len/2.0
-        marker_robot.scale.z = self.robot_arm_len/6.0
-        # Color of the marker
-        marker_robot.color.a = 0.5
-        marker_robot.color.r = 0.0
-        marker_robot.color.g = 0.0
-        marker_robot.color.b = 0.0
-        # Position of the marker
-        marker_robot.pose.position.x = p[0]
-        marker_robot.pose.position.y = p[1]
-        marker_robot.pose.position.z = p[2]
-        # Orientation of the marker
-        marker_robot.pose.orientation.x = q[1]
-        marker_robot.pose.orientation.y = q[2]
-        marker_robot.pose.orientation.z = q[3]
-        marker_robot.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_robot)
-
-
-        # Define marker representing the drones arms in one diagonal
-        q0 = [cos((pi/4)/2),0,0,sin((pi/4)/2)]
-        qarm1 = MU.quat_mult(q,q0)
-        marker_arm1 = Marker()
-        marker_arm1.header.frame_id = "world"
-        marker_arm1.header.stamp = rospy.Time.now()
-        marker_arm1.id = 1
-        marker_arm1.type = marker_arm1.CUBE
-        marker_arm1.action = marker_arm1.ADD
-        marker_arm1.lifetime = rospy.Duration(3)
-        # Size of arms
-        marker_arm1.scale.x = 2*self.robot_arm_len
-        marker_arm1.scale.y = self.robot_arm_len/10.0
-        marker_arm1.scale.z = self.robot_arm_len/10.0
-        # Color of the marker
-        marker_arm1.color.a = 0.9
-        marker_arm1.color.r = 0.0
-        marker_arm1.color.g = 0.0
-        marker_arm1.color.b = 0.0
-        # Position of the marker
-        marker_arm1.pose.position.x = p[0]
-        marker_arm1.pose.position.y = p[1]
-        marker_arm1.pose.position.z = p[2]
-        # Orientation of the marker
-        marker_arm1.pose.orientation.x = qarm1[1]
-        marker_arm1.pose.orientation.y = qarm1[2]
-        marker_arm1.pose.orientation.z = qarm1[3]
-        marker_arm1.pose.orientation.w = qarm1[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_arm1)
-
-
-        # Define marker representing the drones arms in the other diagonal
-        q0 = [cos((pi/4)/2),0,0,sin((pi/4)/2)]
-        qarm2 = MU.quat_mult(q,q0)
-        marker_arm2 = Marker()
-        marker_arm2.header.frame_id = "world"
-        marker_arm2.header.stamp = rospy.Time.now()
-        marker_arm2.id = 2
-        marker_arm2.type = marker_arm2.CUBE
-        marker_arm2.action = marker_arm2.ADD
-        marker_arm2.lifetime = rospy.Duration(3)
-        # Size of arms
-        marker_arm2.scale.x = self.robot_arm_len/10.0
-        marker_arm2.scale.y = 2*self.robot_arm_len
-        marker_arm2.scale.z = self.robot_arm_len/10.0
-        # Color of the marker
-        marker_arm2.color.a = 0.9
-        marker_arm2.color.r = 0.0
-        marker_arm2.color.g = 0.0
-        marker_arm2.color.b = 0.0
-        # Position of the marker
-        marker_arm2.pose.position.x = p[0]
-        marker_arm2.pose.position.y = p[1]
-        marker_arm2.pose.position.z = p[2]
-        # Orientation of the marker
-        marker_arm2.pose.orientation.x = qarm2[1]
-        marker_arm2.pose.orientation.y = qarm2[2]
-        marker_arm2.pose.orientation.z = qarm2[3]
-        marker_arm2.pose.orientation.w = qarm2[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_arm2)
-
-
-        # Define marker representing one of the drones spinning blades
-        d_arm = 0.7071067811865476*self.robot_arm_len
-        helix_d = self.robot_arm_len*0.8
-        helix_h = self.robot_arm_len/15.0
-        h1_pos_b = [d_arm,d_arm,self.robot_arm_len/10.0]
-        h1_pos_w = MU.quat_apply_rot(q,h1_pos_b)
-        marker_h1 = Marker()
-        marker_h1.header.frame_id = "world"
-        marker_h1.header.stamp = rospy.Time.now()
-        marker_h1.id = 3
-        marker_h1.type = marker_h1.CYLINDER
-        marker_h1.action = marker_h1.ADD
-        marker_h1.lifetime = rospy.Duration(3)
-        # Size of disk
-        marker_h1.scale.x = helix_d
-        marker_h1.scale.y = helix_d
-        marker_h1.scale.z = helix_h
-        # Color of the marker
-        marker_h1.color.a = 0.3
-        marker_h1.color.r = 0.5
-        marker_h1.color.g = 0.5
-        marker_h1.color.b = 0.5
-        # Position of the marker
-        marker_h1.pose.position.x = p[0] + h1_pos_w[0]
-        marker_h1.pose.position.y = p[1] + h1_pos_w[1]
-        marker_h1.pose.position.z = p[2] + h1_pos_w[2]
-        # Orientation of the marker
-        marker_h1.pose.orientation.x = q[1]
-        marker_h1.pose.orientation.y = q[2]
-        marker_h1.pose.orientation.z = q[3]
-        marker_h1.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_h1)
-
-
-        # Define marker representing one of the drones spinning blades
-        h2_pos_b = [-d_arm,d_arm,self.robot_arm_len/10.0]
-        h2_pos_w = MU.quat_apply_rot(q,h2_pos_b)
-        marker_h2 = Marker()
-        marker_h2.header.frame_id = "world"
-        marker_h2.header.stamp = rospy.Time.now()
-        marker_h2.id = 4
-        marker_h2.type = marker_h2.CYLINDER
-        marker_h2.action = marker_h2.ADD
-        marker_h2.lifetime = rospy.Duration(3)
-        # Size of disk
-        marker_h2.scale.x = helix_d
-        marker_h2.scale.y = helix_d
-        marker_h2.scale.z = helix_h
-        # Color of the marker
-        marker_h2.color.a = 0.3
-        marker_h2.color.r = 0.5
-        marker_h2.color.g = 0.5
-        marker_h2.color.b = 0.5
-        # Position of the marker
-        marker_h2.pose.position.x = p[0] + h2_pos_w[0]
-        marker_h2.pose.position.y = p[1] + h2_pos_w[1]
-        marker_h2.pose.position.z = p[2] + h2_pos_w[2]
-        # Orientation of the marker
-        marker_h2.pose.orientation.x = q[1]
-        marker_h2.pose.orientation.y = q[2]
-        marker_h2.pose.orientation.z = q[3]
-        marker_h2.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_h2)
-
-
-        # Define marker representing one of the drones spinning blades
-        h3_pos_b = [-d_arm,-d_arm,self.robot_arm_len/10.0]
-        h3_pos_w = MU.quat_apply_rot(q,h3_pos_b)
-        marker_h3 = Marker()
-        marker_h3.header.frame_id = "world"
-        marker_h3.header.stamp = rospy.Time.now()
-        marker_h3.id = 5
-        marker_h3.type = marker_h3.CYLINDER
-        marker_h3.action = marker_h3.ADD
-        marker_h3.lifetime = rospy.Duration(3)
-        # Size of disk
-        marker_h3.scale.x = helix_d
-        marker_h3.scale.y = helix_d
-        marker_h3.scale.z = helix_h
-        # Color of the marker
-        marker_h3.color.a = 0.3
-        marker_h3.color.r = 0.5
-        marker_h3.color.g = 0.5
-        marker_h3.color.b = 0.5
-        # Position of the marker
-        marker_h3.pose.position.x = p[0] + h3_pos_w[0]
-        marker_h3.pose.position.y = p[1] + h3_pos_w[1]
-        marker_h3.pose.position.z = p[2] + h3_pos_w[2]
-        # Orientation of the marker
-        marker_h3.pose.orientation.x = q[1]
-        marker_h3.pose.orientation.y = q[2]
-        marker_h3.pose.orientation.z = q[3]
-        marker_h3.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_h3)
-
-
-        # Define marker representing one of the drones spinning blades
-        h4_pos_b = [d_arm,-d_arm,self.robot_arm_len/10.0]
-        h4_pos_w = MU.quat_apply_rot(q,h4_pos_b)
-        marker_h4 = Marker()
-        marker_h4.header.frame_id = "world"
-        marker_h4.header.stamp = rospy.Time.now()
-        marker_h4.id = 6
-        marker_h4.type = marker_h4.CYLINDER
-        marker_h4.action = marker_h4.ADD
-        marker_h4.lifetime = rospy.Duration(3)
-        # Size of disk
-        marker_h4.scale.x = helix_d
-        marker_h4.scale.y = helix_d
-        marker_h4.scale.z = helix_h
-        #Color of the marker
-        marker_h4.color.a = 0.3
-        marker_h4.color.r = 0.5
-        marker_h4.color.g = 0.5
-        marker_h4.color.b = 0.5
-        # Position of the marker
-        marker_h4.pose.position.x = p[0] + h4_pos_w[0]
-        marker_h4.pose.position.y = p[1] + h4_pos_w[1]
-        marker_h4.pose.position.z = p[2] + h4_pos_w[2]
-        # Orientation of the marker
-        marker_h4.pose.orientation.x = q[1]
-        marker_h4.pose.orientation.y = q[2]
-        marker_h4.pose.orientation.z = q[3]
-        marker_h4.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_h4)
-
-
-        # Define marker representing the drone heading
-        marker_arrow = Marker()
-        marker_arrow.header.frame_id = "world"
-        marker_arrow.header.stamp = rospy.Time.now()
-        marker_arrow.id = 7
-        marker_arrow.type = marker_arrow.ARROW
-        marker_arrow.action = marker_arrow.ADD
-        marker_arrow.lifetime = rospy.Duration(3)
-        # Size of arrow
-        marker_arrow.scale.x = self.robot_arm_len*1.0
-        marker_arrow.scale.y = self.robot_arm_len/5.0
-        marker_arrow.scale.z = self.robot_arm_len/5.0
-        # Color of the marker
-        marker_arrow.color.a = 0.99
-        marker_arrow.color.r = 0.0
-        marker_arrow.color.g = 0.0
-        marker_arrow.color.b = 1.0
-        # Position of the marker
-        marker_arrow.pose.position.x = p[0]
-        marker_arrow.pose.position.y = p[1]
-        marker_arrow.pose.position.z = p[2]
-        # Orientation of the marker
-        marker_arrow.pose.orientation.x = q[1]
-        marker_arrow.pose.orientation.y = q[2]
-        marker_arrow.pose.orientation.z = q[3]
-        marker_arrow.pose.orientation.w = q[0]
-        # Append marker to array
-        robot_marker_array.markers.append(marker_arrow)
+        # Poses of all of the markers in the world frame at once
+        positions, quats = MU.transform_poses(p, q, self.marker_anchors, self.marker_orientations, self.marker_positions_w, self.marker_orientations_w)
+
+        for marker, position, quat in zip(self.marker_array.markers, positions.tolist(), quats.tolist()):
+            marker.header.stamp = stamp
+            pose = marker.pose
+            pose.position.x, pose.position.y, pose.position.z = position[0], position[1], position[2]
+            pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w = quat[1], quat[2], quat[3], quat[0]
 
         # Publish marker array
-        self.pub_rviz_robot.publish(robot_marker_array)
+        self.pub_rviz_robot.publish(self.marker_array)
+
+
+class threaded_show(drone_show):
+    """
+    Drone state and markers publisher that runs on its own thread
+    The simulation loop only writes the latest state into a double buffer, so it never waits for rospy (slow subscribers, rosmaster)
+    """
+
+    def __init__(self, params):
+        """
+        Constructor for the threaded_show class
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object (see drone_show)
+        """
+
+        drone_show.__init__(self, params)
+
+        # Latest state written by the simulation loop
+        self.buffer = SB.double_buffer(STATE_SIZE)
+        self.new_state = threading.Event()
+
+        # Age of the published states (from the write in the loop to the end of the publication) [ns]
+        self.staleness = PROF.histogram()
+        # Number of states published and of states overwritten before they could be published
+        self.published = 0
+        self.skipped = 0
+
+        # Start the publisher thread
+        self.thread = threading.Thread(target=self.publisher, daemon=True)
+        self.thread.start()
+
+
+    def update_ros_info(self,p,vw,q,omega,p0,q0):
+        """
+        Hand the state to the publisher thread (called by the simulation loop, returns without publishing)
+
+        Parameters:
+            p (numpy.ndarray): Position vector [x, y, z]
+            vw (numpy.ndarray): World velocity vector [vx, vy, vz]
+            q (numpy.ndarray): Orientation quaternion [qw, qx, qy, qz]
+            omega (numpy.ndarray): Body angular velocity [wx, wy, wz]
+            p0 (numpy.ndarray): Initial position vector [x, y, z]
+            q0 (numpy.ndarray): Initial orientation quaternion [qw, qx, qy, qz]
+        """
+
+        self.buffer.write(np.concatenate((p,vw,q,omega,p0,q0)))
+        self.new_state.set()
+
+
+    def publisher(self):
+        """
+        Publish the latest state every time the loop writes a new one (runs on the publisher thread)
+        """
+
+        last_seq = 0
+        while not rospy.is_shutdown():
+            # Wake up with every new state (the timeout allows to check for the shutdown)
+            if not self.new_state.wait(timeout=0.5):
+                continue
+            self.new_state.clear()
+
+            state, stamp, seq = self.buffer.read()
+            if seq == last_seq:
+                continue
+            self.skipped = self.skipped + seq - last_seq - 1
+            last_seq = seq
+
+            if drone_show.update_ros_info(self, *[state[s] for s in STATE_SLICES]):
+                self.staleness.record(time.perf_counter_ns() - stamp)
+                self.published = self.published + 1
+
+
+    def print_stats(self):
+        """
+        Print the number of publications of each topic, the number of published states and how old they were when published
+        """
+
+        drone_show.print_stats(self)
+        print(f"\33[94m[ros_viz] Published {self.published} states ({self.skipped} overwritten before being published). "
+              f"Staleness [us]: p50 {self.staleness.percentile(50)/1e3:.1f}, p99 {self.staleness.percentile(99)/1e3:.1f}, max {self.staleness.max/1e3:.1f}\33[0m")
@@ -13,12 +13,11 @@
 # GPS
 
 import numpy as np
-import random
 from math import pi, sqrt, exp, sin, cos
-from random import random
 import time
 
 import math_utils as MU
+import noise as NOI
 
 
 class sensors(object):
@@ -26,17 +25,29 @@ class sensors(object):
     Sensors class
     """
 
-    def __init__(self, params):
+    def __init__(self, params, seed=None):
         """
         Constructor for the sensors class
 
         Parameters:
             params (<parameter_server.parameter_server>): Parameter server object
+            seed (int or <numpy.random.SeedSequence>): Seed of the sensor noise, usually given by the rng service (the noise is not reproducible if None)
         """
 
         # Load model parameters
         self.load_parameters(params)
 
+        # Independent noise stream for each sensor, so the noise of one sensor does not depend on how often the others are sampled
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        acc_seed, gyro_seed, mag_seed, baro_seed, gps_seed, gps_uniform_seed = seed.spawn(6)
+        self.acc_noise = NOI.noise_buffer(acc_seed)
+        self.gyro_noise = NOI.noise_buffer(gyro_seed)
+        self.mag_noise = NOI.noise_buffer(mag_seed)
+        self.baro_noise = NOI.noise_buffer(baro_seed)
+        self.gps_noise = NOI.noise_buffer(gps_seed)
+        self.gps_uniform_noise = NOI.noise_buffer(gps_uniform_seed, distribution='uniform')
+
 
     def get_acc(self, q,f,m,induced_noises):
         """
@@ -53,7 +64,7 @@ class sensors(object):
         """
 
         # Compute accelerometer measurement and add random noise
-        acc = MU.quat_apply_rot(MU.quat_conj(q),f/m) + np.random.normal(loc=0.0, scale=self.acc_noise_std, size=3)
+        acc = MU.quat_apply_inv_rot_fast(q,f/m) + self.acc_noise.draw(3)*self.acc_noise_std
 
         # Add noise induced by the actuators
         acc = acc + induced_noises
@@ -77,7 +88,7 @@ class sensors(object):
         """
 
         # Compute gyroscope measurement and add random noise
-        gyro = w + np.random.normal(loc=0.0, scale=self.gyro_noise_std, size=3)
+        gyro = w + self.gyro_noise.draw(3)*self.gyro_noise_std
 
         # Add noise induced by the actuators
         gyro = gyro + induced_noises
@@ -103,7 +114,7 @@ class sensors(object):
         mag = np.array(self.earth_mag_field)
 
         # Compute Earth magnetic field on the body frame and add noise
-        mag =  MU.quat_apply_rot(MU.quat_conj(q),mag) + np.random.normal(loc=0.0, scale=self.mag_noise_std, size=3)
+        mag =  MU.quat_apply_inv_rot_fast(q,mag) + self.mag_noise.draw(3)*self.mag_noise_std
 
         # Add the influence of the magnetic field generated internally on the local frame
         mag = mag + internal_field
@@ -129,7 +140,7 @@ class sensors(object):
         bar = self.pressure_sea * exp(-(z+self.h0) / self.C_bar)
 
         # Add noise to barometric pressure
-        bar = bar + np.random.normal(loc=0.0, scale=self.bar_noise_std, size=1)
+        bar = bar + self.baro_noise.draw_one()*self.bar_noise_std
 
         # Inverse model
         # z =  -self.C_bar*ln(bar/self.pressure_sea)-self.h0
@@ -152,17 +163,21 @@ class sensors(object):
         # Dictionary with the GPS information
         gps = {}
 
+        # Noise samples of the position and of the remaining fields
+        noise = self.gps_noise.draw(3)*self.gps_noise_std_xy
+        uniform = self.gps_uniform_noise.draw(6)
+
         # Populate dictionary
-        gps['i_lat__degE7'] = ( self.lat0+(p[1]+np.random.normal(scale=self.gps_noise_std_xy))*self.meters2deg_lat )*1e7    # Latitude (WGS84) [degE7] (type:int32_t)
-        gps['i_lon__degE7'] = ( self.lon0+(p[0]+np.random.normal(scale=self.gps_noise_std_xy))*self.meters2deg_lon )*1e7    # Longitude (WGS84) [degE7] (type:int32_t)
-        gps['i_alt__mm'] = ( self.h0 + p[2] + np.random.normal(scale=self.gps_noise_std_xy) )*1000                          # Altitude (MSL). Positive for up. [mm] (type:int32_t)
-        gps['i_eph__cm'] = ( 0 + random()*0.001 )*100                                                                       # GPS HDOP horizontal dilution of position (unitless). If unknown, set to: UINT16_MAX (type:uint16_t)
-        gps['i_epv__cm'] = ( 0 + random()*0.001 )*100                                                                       # GPS VDOP vertical dilution of position (unitless). If unknown, set to: UINT16_MAX (type:uint16_t)
+        gps['i_lat__degE7'] = ( self.lat0+(p[1]+noise[0])*self.meters2deg_lat )*1e7                                         # Latitude (WGS84) [degE7] (type:int32_t)
+        gps['i_lon__degE7'] = ( self.lon0+(p[0]+noise[1])*self.meters2deg_lon )*1e7                                         # Longitude (WGS84) [degE7] (type:int32_t)
+        gps['i_alt__mm'] = ( self.h0 + p[2] + noise[2] )*1000                                                               # Altitude (MSL). Positive for up. [mm] (type:int32_t)
+        gps['i_eph__cm'] = ( 0 + uniform[0]*0.001 )*100                                                                     # GPS HDOP horizontal dilution of position (unitless). If unknown, set to: UINT16_MAX (type:uint16_t)
+        gps['i_epv__cm'] = ( 0 + uniform[1]*0.001 )*100                                                                     # GPS VDOP vertical dilution of position (unitless). If unknown, set to: UINT16_MAX (type:uint16_t)
         gps['i_vel__cm/s'] = 65535                                                                                          # GPS ground speed. If unknown, set to: 65535 [cm/s] (type:uint16_t)
-        gps['i_vn__cm/s'] = ( vw[1] + random()*0.001 )*100                                                                  # GPS velocity in north direction in earth-fixed NED frame [cm/s] (type:int16_t)
-        gps['i_ve__cm/s'] = ( vw[0] + random()*0.001 )*100                                                                  # GPS velocity in east direction in earth-fixed NED frame [cm/s] (type:int16_t)
-        gps['i_vd__cm/s'] = ( -vw[2] + random()*0.001 )*100                                                                 # GPS velocity in down direction in earth-fixed NED frame [cm/s] (type:int16_t)
-        gps['i_cog__cdeg'] = ( 0 + self.crandom()*0.001 )*100                                                               # Course over ground (NOT heading, but direction of movement), 0.0..359.99 degrees. If unknown, set to: 65535 [cdeg] (type:uint16_t)  
+        gps['i_vn__cm/s'] = ( vw[1] + uniform[2]*0.001 )*100                                                                # GPS velocity in north direction in earth-fixed NED frame [cm/s] (type:int16_t)
+        gps['i_ve__cm/s'] = ( vw[0] + uniform[3]*0.001 )*100                                                                # GPS velocity in east direction in earth-fixed NED frame [cm/s] (type:int16_t)
+        gps['i_vd__cm/s'] = ( -vw[2] + uniform[4]*0.001 )*100                                                               # GPS velocity in down direction in earth-fixed NED frame [cm/s] (type:int16_t)
+        gps['i_cog__cdeg'] = ( 0 + (uniform[5]-0.5)*0.001 )*100                                                             # Course over ground (NOT heading, but direction of movement), 0.0..359.99 degrees. If unknown, set to: 65535 [cdeg] (type:uint16_t)  
         
         return gps
 
@@ -208,13 +223,6 @@ class sensors(object):
         return gt
 
 
-    def crandom(self):
-        """
-        Return a random value with distribution around 0
-        """
-        return random()-0.5
-
-
     def load_parameters(self, params):
         """
         Load parameters necessary for the sensors and store them in the instance variables
@@ -223,22 +231,23 @@ class sensors(object):
             params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
         """
 
+        snap = params.snapshot()
+        env = snap.env
+        sens = snap.sensors
+
         # Global environmental values
-        self.pressure_sea = params.get_parameter_value('ENV_PRES_SEA') # Sea level standard atmospheric pressure [hPa]
-        g =  params.get_parameter_value('ENV_GRAVITY') # Earth-surface gravitational acceleration [m/ss]
-        M = params.get_parameter_value('ENV_MOL_MASS') # Molar mass of dry air [kg/mol]
-        T0 = params.get_parameter_value('ENV_TMP_SEA') # Sea level standard temperature [K]
-        R0 = params.get_parameter_value('ENV_GAS_CTE') # Universal gas constant [J/(mol*K)]
+        self.pressure_sea = env.pres_sea # Sea level standard atmospheric pressure [hPa]
+        g = env.gravity # Earth-surface gravitational acceleration [m/ss]
+        M = env.mol_mass # Molar mass of dry air [kg/mol]
+        T0 = env.tmp_sea # Sea level standard temperature [K]
+        R0 = env.gas_cte # Universal gas constant [J/(mol*K)]
         self.C_bar = (T0*R0)/(g*M)
             
         # Local environmental values
-        self.lat0 = params.get_parameter_value('SENS_LAT_ORIGIN') # initial latitude (degrees)
-        self.lon0 = params.get_parameter_value('SENS_LON_ORIGIN') # initial longitude (degrees)
-        self.h0 = params.get_parameter_value('SENS_ALT_ORIGIN') # initial altitude (meters above average sea level)
-        magx = params.get_parameter_value('SENS_MAG_FIELD_E')
-        magy = params.get_parameter_value('SENS_MAG_FIELD_N')
-        magz = params.get_parameter_value('SENS_MAG_FIELD_U')
-        self.earth_mag_field = [magx, magy, magz] # Local Earth magnetic field (East, North, UP) in Gauss
+        self.lat0 = sens.lat_origin # initial latitude (degrees)
+        self.lon0 = sens.lon_origin # initial longitude (degrees)
+        self.h0 = sens.alt_origin # initial altitude (meters above average sea level)
+        self.earth_mag_field = sens.mag_field.tolist() # Local Earth magnetic field (East, North, UP) in Gauss
 
         # Values for the conversion between local position and geographic coordinates
         earth_radius = 6378100
@@ -247,17 +256,16 @@ class sensors(object):
         self.meters2deg_lon =  180 / ( small_radius * pi)
 
         # Standard deviations of sensor noise
-        self.acc_noise_std = [params.get_parameter_value('SENS_ACC_STD_X'), params.get_parameter_value('SENS_ACC_STD_Y'), params.get_parameter_value('SENS_ACC_STD_Z')]
-        self.gyro_noise_std = [params.get_parameter_value('SENS_GYRO_STD_X'), params.get_parameter_value('SENS_GYRO_STD_Y'), params.get_parameter_value('SENS_GYRO_STD_Z') ]
-        self.mag_noise_std = [params.get_parameter_value('SENS_MAG_STD_X'), params.get_parameter_value('SENS_MAG_STD_Y'), params.get_parameter_value('SENS_MAG_STD_Z')]
-        # self.gps_noise_std = [params.get_parameter_value('SENS_GPS_STD_X'), params.get_parameter_value('SENS_GPS_STD_Y'), params.get_parameter_value('SENS_GPS_STD_Z')]
-        self.gps_noise_std_xy = params.get_parameter_value('SENS_GPS_STD_XY')
-        self.gps_noise_std_z = params.get_parameter_value('SENS_GPS_STD_Z')
-        self.bar_noise_std = params.get_parameter_value('SENS_BAR_STD')
+        self.acc_noise_std = sens.acc_std.copy()
+        self.gyro_noise_std = sens.gyro_std.copy()
+        self.mag_noise_std = sens.mag_std.copy()
+        self.gps_noise_std_xy = sens.gps_std_xy
+        self.gps_noise_std_z = sens.gps_std_z
+        self.bar_noise_std = sens.bar_std
 
         # Bias of sensors
-        self.acc_bias = [params.get_parameter_value('SENS_ACC_BIAS_X'), params.get_parameter_value('SENS_ACC_BIAS_Y'), params.get_parameter_value('SENS_ACC_BIAS_Z')]
-        self.gyro_bias = [params.get_parameter_value('SENS_GYRO_BIAS_X'), params.get_parameter_value('SENS_GYRO_BIAS_Y'), params.get_parameter_value('SENS_GYRO_BIAS_Z')]
-        self.mag_bias = [params.get_parameter_value('SENS_MAG_BIAS_X'), params.get_parameter_value('SENS_MAG_BIAS_Y'), params.get_parameter_value('SENS_MAG_BIAS_Z')]
+        self.acc_bias = sens.acc_bias.tolist()
+        self.gyro_bias = sens.gyro_bias.tolist()
+        self.mag_bias = sens.mag_bias.tolist()
 
         
\ No newline at end of file
@@ -7,10 +7,11 @@
 
 import time
 import atexit
-from random import random
+import select
 from pymavlink import mavutil
 from math import log
 from constants import * #TODO: remove this
+import mavlink_encoder as ENC
 
 
 class px4_connection:
@@ -18,9 +19,15 @@ class px4_connection:
     Class for the connection of the simulator with PX4
     """
 
-    def __init__(self, protocol='tcpin', host='localhost', port='4560'):
+    def __init__(self, protocol='tcpin', host='localhost', port='4560', fast_encoder=True):
         """
         Constructor for the px4_connection class
+
+        Parameters:
+            protocol (str): Connection protocol
+            host (str): Host address
+            port (str): Port number
+            fast_encoder (bool): Use the preallocated encoder (True) or the pymavlink messages (False) for the high rate HIL messages
         """
 
         # Input parameters for PX4 connection
@@ -31,18 +38,42 @@ class px4_connection:
         # Connection object
         self.vehicle = False
 
+        # Fast encoder of the high rate messages (created after the connection is established)
+        self.fast_encoder = fast_encoder
+        self.encoder = None
+
         # Bot time
         self.t_boot__us = False
 
+        # Table of handlers of the received messages indexed by the MAVLink message id
+        self.handlers = {}
+        # Maximum number of bytes read from the socket at once
+        self.recv_size = 65536
+
+        # Counter of received messages per type
+        self.msg_count = {}
+        # Number of messages received in the last receive call and maximum observed value
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+        # Newest actuator command received and flag indicating if it was not consumed yet
+        self.actuator_commands = None
+        self.actuator_update = False
+        # Number of actuator commands that were overwritten before being applied
+        self.actuator_dropped = 0
+
+        # Register the handler of the actuator controls
+        self.register_handler(mavutil.mavlink.MAVLINK_MSG_ID_HIL_ACTUATOR_CONTROLS, self.handle_actuator_controls)
+
 
     def connect(self):
         """
         Stablish a connection with PX4 on the port dedicated for the simulator
         """
 
-        # Try to connect to PX4 on tcp, in localhost, at port 4560
-        print("Waiting to connect...")
-        self.vehicle = mavutil.mavlink_connection('tcpin:localhost:4560')
+        # Try to connect to PX4 with the given protocol, host and port (e.g. tcpin:localhost:4560)
+        print(f"Waiting to connect on {self.protocol}:{self.host}:{self.port}...")
+        self.vehicle = mavutil.mavlink_connection(f"{self.protocol}:{self.host}:{self.port}")
 
         # Wait for a command long from PX4
         msg = self.vehicle.recv_match(blocking = True)
@@ -54,6 +85,12 @@ class px4_connection:
         if msg.get_type() != "HEARTBEAT":
             raise Exception("error")
 
+        # Create the fast encoder for the dialect negotiated with PX4
+        if self.fast_encoder:
+            self.encoder = ENC.hil_encoder(self.vehicle.mav)
+            if not self.encoder.is_supported():
+                self.encoder = None
+
         # Save the boot time
         t_abs__s    = time.time()
         t_abs__us   = int(t_abs__s * 1e6)
@@ -63,19 +100,42 @@ class px4_connection:
         return self.vehicle
 
 
-    def send_system_time(self):
+    def time_since_boot(self, time_usec=None):
+        """
+        Compute the absolute time and the time since the boot of PX4
+
+        Parameters:
+            time_usec (int): Simulated time in microseconds, the wall time is used if None [us]
+
+        Returns:
+            t_abs__us (int): Timestamp (UNIX epoch time) [us]
+            since_boot__ms (int): Time since the boot of PX4 [ms]
+        """
+
+        if time_usec is None:
+            # Get current time
+            t_abs__s    = time.time()
+            t_abs__us   = int(t_abs__s * 1e6)
+            since_boot__us = t_abs__us - self.t_boot__us
+        else:
+            # PX4 boots with the simulation (the same time base as the HIL messages)
+            t_abs__us   = self.t_boot__us + time_usec
+            since_boot__us = time_usec
+
+        return t_abs__us, int(since_boot__us / 1000)
+
+
+    def send_system_time(self, time_usec=None):
         """
         Send system time information to PX4
+
+        Parameters:
+            time_usec (int): Simulated time in microseconds, the wall time is used if None [us]
         """
-        
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
 
-        # Compute time since boot
-        since_boot__us = t_abs__us - self.t_boot__us
-        since_boot__ms = int(since_boot__us / 1000)
-        
+        # Get the time (simulated if provided) and the time since boot
+        t_abs__us, since_boot__ms = self.time_since_boot(time_usec)
+
         # Send SYSTEM_TIME message through mavlink
         if self.vehicle != None:
             self.vehicle.mav.system_time_send(
@@ -102,20 +162,22 @@ class px4_connection:
     
 
 
-    def send_gps(self,gps):
+    def send_gps(self,gps,time_usec=None):
         """
         Send GPS information to PX4
 
         Parameters:
             gps (dict): Dictionary with the GPS information
+            time_usec (int): Timestamp of the data in microseconds, the wall time is used if None [us]
         """
 
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
+        # Get current time (wall time is used if the simulated time is not provided)
+        if time_usec is None:
+            t_abs__s    = time.time()
+            time_usec   = int(t_abs__s * 1e6)
 
         # Extract GPS information from dictionary and round when necessary
-        time_usec          = t_abs__us                     # Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
+        # time_usec: Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
         fix_type           = 3                             # 0-1: no fix, 2: 2D fix, 3: 3D fix. Some applications will not use the value of this field unless it is at least two, so always correctly fill in the fix. (type:uint8_t)
         lat                = int(gps['i_lat__degE7'])    # Latitude (WGS84) [degE7] (type:int32_t)
         lon                = int(gps['i_lon__degE7'])    # Longitude (WGS84) [degE7] (type:int32_t)
@@ -132,7 +194,10 @@ class px4_connection:
         yaw                = 0                             # Yaw of vehicle relative to Earth's North, zero means not available, use 36000 for north [cdeg] (type:uint16_t)
         
         # Send HIL_GPS message through mavlink
-        if self.vehicle != None:
+        if self.vehicle != None and self.encoder is not None:
+            # Fast path with the preallocated encoder
+            self.vehicle.write(self.encoder.hil_gps(time_usec, fix_type, lat, lon, alt, eph, epv, vel, vn, ve, vd, cog, satellites_visible, the_id, yaw))
+        elif self.vehicle != None:
             self.vehicle.mav.hil_gps_send(
             # self.vehicle.mav.hil_gps_encode(
                 time_usec           = time_usec             ,
@@ -149,26 +214,28 @@ class px4_connection:
                 cog                 = cog                   ,
                 satellites_visible  = satellites_visible    ,
                 id                  = the_id                ,
-                yaw                 = 0                     ,
+                yaw                 = yaw                   ,
             )
 
         return
 
 
-    def send_ground_truth(self,gt):
+    def send_ground_truth(self,gt,time_usec=None):
         """
         Send Ground Truth information to PX4
 
         Parameters:
             gt (dict): Dictionary with the Ground Truth information
+            time_usec (int): Timestamp of the data in microseconds, the wall time is used if None [us]
         """
 
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
+        # Get current time (wall time is used if the simulated time is not provided)
+        if time_usec is None:
+            t_abs__s    = time.time()
+            time_usec   = int(t_abs__s * 1e6)
         
         # Extract Ground Truth information from dictionary and round when necessary
-        time_usec           = t_abs__us                    # Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
+        # time_usec: Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
         attitude_quaternion = gt['attitude_quaternion']    # Vehicle attitude expressed as normalized quaternion in w, x, y, z order (with 1 0 0 0 being the null-rotation) (type:float)
         rollspeed           = gt['rollspeed']              # Body frame roll / phi angular speed [rad/s] (type:float)
         pitchspeed          = gt['pitchspeed']             # Body frame pitch / theta angular speed [rad/s] (type:float)
@@ -186,7 +253,10 @@ class px4_connection:
         zacc                = int(gt['zacc'])            # Z acceleration [mG] (type:int16_t)
 
         # Send HIL_STATE_QUATERNION message through mavlink
-        if self.vehicle != None:
+        if self.vehicle != None and self.encoder is not None:
+            # Fast path with the preallocated encoder
+            self.vehicle.write(self.encoder.hil_state_quaternion(time_usec, attitude_quaternion, rollspeed, pitchspeed, yawspeed, lat, lon, alt, vx, vy, vz, ind_airspeed, true_airspeed, xacc, yacc, zacc))
+        elif self.vehicle != None:
             self.vehicle.mav.hil_state_quaternion_send(
             # self.vehicle.mav.hil_state_quaternion_encode(
                 time_usec           = time_usec             ,
@@ -208,7 +278,7 @@ class px4_connection:
             )
 
 
-    def send_sensors(self,acc,gyro,mag,bar):
+    def send_sensors(self,acc,gyro,mag,bar,time_usec=None):
         """
         Send sensor measurement information to PX4
 
@@ -217,14 +287,16 @@ class px4_connection:
             gyro (numpy.ndarray): Angular velocity measured by the gyro
             mag (numpy.ndarray): Magnetic field measured by the magnetometer
             bar (numpy.ndarray): Barometric pressure measured by the barometer
+            time_usec (int): Timestamp of the data in microseconds, the wall time is used if None [us]
         """
 
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
+        # Get current time (wall time is used if the simulated time is not provided)
+        if time_usec is None:
+            t_abs__s    = time.time()
+            time_usec   = int(t_abs__s * 1e6)
         
         # Get all the information to populate the sensor message
-        time_usec           = t_abs__us                       # Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
+        # time_usec: Timestamp (UNIX Epoch time or time since system boot). The receiving end can infer timestamp format (since 1.1.1970 or since system boot) by checking for the magnitude of the number. [us] (type:uint64_t)
         xacc                = acc[0]                          # X acceleration [m/s/s] (type:float)
         yacc                = acc[1]                          # Y acceleration [m/s/s] (type:float)
         zacc                = acc[2]                          # Z acceleration [m/s/s] (type:float)
@@ -242,7 +314,10 @@ class px4_connection:
         the_id              = 0                               # Sensor ID (zero indexed). Used for multiple sensor inputs (type:uint8_t)
 
         # Send HIL_SENSOR message through mavlink
-        if self.vehicle != None:
+        if self.vehicle != None and self.encoder is not None:
+            # Fast path with the preallocated encoder
+            self.vehicle.write(self.encoder.hil_sensor(time_usec, xacc, yacc, zacc, xgyro, ygyro, zgyro, xmag, ymag, zmag, abs_pressure, diff_pressure, pressure_alt, temperature, fields_updated, the_id))
+        elif self.vehicle != None:
             self.vehicle.mav.hil_sensor_send(
                 time_usec      = time_usec      ,
                 xacc           = xacc           ,
@@ -262,21 +337,17 @@ class px4_connection:
                 id             = the_id         ,
             )
 
-    def send_rc_commands(self, channels):
+    def send_rc_commands(self, channels, time_usec=None):
         """
         Send RC command information to PX4
 
         Parameters:
             channels (numpy.ndarray): Array with dimension 18 with the values of the channels (between 1000 and 2000)
+            time_usec (int): Simulated time in microseconds, the wall time is used if None [us]
         """
 
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
-
-        # Compute time since boot
-        since_boot__us = t_abs__us - self.t_boot__us
-        since_boot__ms = int(since_boot__us / 1000)
+        # Get the time since boot (simulated if provided)
+        t_abs__us, since_boot__ms = self.time_since_boot(time_usec)
 
         # Send RC_CHANNELS message through mavlink
         if self.vehicle != None:
@@ -305,53 +376,162 @@ class px4_connection:
             )
 
 
-    def get_actuator_controls(self):
+    def register_handler(self, msg_id, handler):
+        """
+        Register the function that handles a given type of received message
+
+        Parameters:
+            msg_id (int): MAVLink id of the message type (e.g. mavutil.mavlink.MAVLINK_MSG_ID_HIL_ACTUATOR_CONTROLS)
+            handler (function): Function called with the received message as argument
+        """
+
+        self.handlers[msg_id] = handler
+
+
+    def receive(self):
+        """
+        Drain all of the data available in the socket and dispatch each received message to its handler
+
+        Returns:
+            n_msgs (int): Number of messages received in this call
+        """
+
+        n_msgs = 0
+
+        # Keep reading until the socket has no data left
+        while True:
+            data = self.vehicle.recv(self.recv_size)
+            if not data:
+                break
+
+            # Parse all of the messages contained in the data (incomplete messages are kept for the next read)
+            msgs = self.vehicle.mav.parse_buffer(data)
+            if msgs is None:
+                continue
+
+            for msg in msgs:
+                n_msgs = n_msgs + 1
+
+                # Count the messages received of each type
+                msg_type = msg.get_type()
+                self.msg_count[msg_type] = self.msg_count.get(msg_type, 0) + 1
+
+                # Dispatch the message to the registered handler
+                handler = self.handlers.get(msg.get_msgId())
+                if handler is not None:
+                    handler(msg)
+
+        # Store the queue depth statistics
+        self.queue_depth = n_msgs
+        self.max_queue_depth = max(self.max_queue_depth, n_msgs)
+
+        return n_msgs
+
+
+    def handle_actuator_controls(self, msg):
+        """
+        Handler of the HIL_ACTUATOR_CONTROLS messages. Only the newest command is kept.
+
+        Parameters:
+            msg (<pymavlink.dialects.v20.common.MAVLink_hil_actuator_controls_message>): Received message
+        """
+
+        # Count the commands that were overwritten before being applied
+        if self.actuator_update:
+            self.actuator_dropped = self.actuator_dropped + 1
+
+        # Extract motor control commands from the message
+        self.actuator_commands = msg.controls #values in [0.0, 1.0]
+        self.actuator_update = True
+
+
+    def get_actuator_controls(self, blocking=False, timeout=None):
         """
         Get actuator controls from PX4
 
+        Parameters:
+            blocking (bool): Wait for a HIL_ACTUATOR_CONTROLS message (True) or return immediately (False)
+            timeout (float): Maximum time to wait for the message when blocking, waits indefinitely if None [s]
+
         Returns:
             update (bool): Flag indicating that a new message was received
             actuator_controls (numpy.ndarray): Array with the values of the new actuator controls (returns None if there is no new value)
         """
 
-        #Initialize variables
-        update = False
-        actuator_commands = None
+        # Receive all of the pending MAVLink messages
+        self.receive()
 
-        # Receive MAVLink messages (blocking non operation)
-        msg = self.vehicle.recv_match(blocking=False)
+        # When blocking, wait for the socket to have data until the actuator controls arrive
+        if blocking:
+            t_start = time.time()
+            while not self.actuator_update:
+                remaining = None if timeout is None else timeout - (time.time() - t_start)
+                if remaining is not None and remaining <= 0:
+                    break
+                select.select([self.vehicle.fd], [], [], remaining)
+                self.receive()
 
-        # Is a message is received
-        if msg is not None:
-            # Check if the message is an actuator control
-            if msg.get_type() == "HIL_ACTUATOR_CONTROLS":
+        return self.take_actuator_controls()
 
-                    # Extract motor control commands from the message
-                    actuator_commands = msg.controls #values in [0.0, 1.0]
 
-                    # Indicate that the motors were updated
-                    update = True
-            
-        return update, actuator_commands
+    def take_actuator_controls(self):
+        """
+        Get the newest actuator controls already received, without reading from the socket
 
+        Returns:
+            update (bool): Flag indicating that a new message was received
+            actuator_controls (numpy.ndarray): Array with the values of the new actuator controls (returns None if there is no new value)
+        """
 
+        # Return the newest command only once
+        if not self.actuator_update:
+            return False, None
+        self.actuator_update = False
 
+        return True, self.actuator_commands
 
 
+    def fileno(self):
+        """
+        Get the file descriptor of the connection, so it can be watched by a selector
 
+        Returns:
+            (int): File descriptor of the socket connected to PX4
+        """
 
+        return self.vehicle.fd
 
 
-    # TODO: Implementation of battery levels. PX4 will require changes to receive it.
-    def send_battery(self):
+    def get_receive_stats(self):
+        """
+        Get statistics of the received messages
 
-        # Get current time
-        t_abs__s    = time.time()
-        t_abs__us   = int(t_abs__s * 1e6)
+        Returns:
+            stats (dict): Dictionary with the number of received messages per type (msg_count), the number of messages received in the last call (queue_depth), the maximum number of messages received in a single call (max_queue_depth) and the number of actuator commands overwritten before being applied (actuator_dropped)
+        """
+
+        stats = {
+            'msg_count': dict(self.msg_count),
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'actuator_dropped': self.actuator_dropped,
+        }
+
+        return stats
+
+
+
+
+
+
+
+
+
+    # TODO: Implementation of battery levels. PX4 will require changes to receive it.
+    def send_battery(self, time_usec=None):
 
-        # Compute time since boot
-        since_boot__us = t_abs__us - self.t_boot__us
-        since_boot__ms = int(since_boot__us / 1000)
+        # Get the time since boot (simulated if provided)
+        t_abs__us, since_boot__ms = self.time_since_boot(time_usec)
 
         # Send BATTERY_STATUS message through mavlink
         if self.vehicle != None:
@@ -7,7 +7,7 @@ import time
 import threading
 import signal
 import numpy as np
-from math import pi, sin, cos
+from math import sin, cos
 import os
 import sys
 
@@ -16,6 +16,11 @@ import ros_viz as VIZ
 import dynamics as DYN
 import parameter_server as PRM
 import timer as TIM
+import clock as CLK
+import profiler as PROF
+import recorder as REC
+import param_watcher as WATCH
+import state_bus as BUS
 # import joystick as JOY
 
 
@@ -35,32 +40,32 @@ class sim4cd(object):
         # Load model parameters
         self.load_parameters(params)
 
-        # Set the minimum desired frequency [Hz]
-        sim_frequency_alert = 400 # an alert will show if a simulation step takes more than 1/sim_frequency_alert seconds
-
-        # Calculate the maximum desired time interval for one simulated step [s]
-        max_sim_interval = 1 / sim_frequency_alert
-
         # Register the custom_handler function to be called when Ctrl+C is pressed
         signal.signal(signal.SIGINT, self.custom_handler)
 
-        # Create an object responsible by providing ROS  wih the simulated information
-        self.ros_aux = VIZ.drone_show()
+        # Create an object responsible by providing ROS  wih the simulated information (published from its own thread if enabled)
+        self.ros_aux = VIZ.threaded_show(params) if self.ros_thread_en else VIZ.drone_show(params)
 
         # Create a object that is able to connect to px4_sitl
-        self.PX4 = COM.px4_connection("tcpin", "localhost", "4560")
+        self.PX4 = COM.px4_connection("tcpin", "localhost", self.px4_port)
         # Connect to px4_sitl
         self.PX4.connect()
 
         # Create an object to simulate the vehicle dynamics
-        self.quad = DYN.vehicle_dynamics(max_sim_interval, params)
+        self.quad = DYN.vehicle_dynamics(params)
+        # Seed of the run (set SIM_SEED to this value to repeat the same noise)
+        print(f"\33[94mRandom seed: {self.quad.rng.seed}\33[0m")
+
+        # Create the clock that hands the same fixed time step to every simulated subsystem
+        self.clock = CLK.sim_clock(self.step_hz, self.clock_mode, self.speed_factor)
 
         # Timers to control the frequency of communication with px4
         self.timer_sys_time = TIM.timer(period=4)
         self.timer_heart_beat = TIM.timer( period=1)
-        self.timer_sensors = TIM.timer(frequency=self.sens_hz)
-        self.timer_gps = TIM.timer(frequency=self.gps_hz)
-        self.timer_gt = TIM.timer(frequency=self.gt_hz, enabled=self.gt_en)
+        # Simulated data is timed with the simulation clock
+        self.timer_sensors = TIM.timer(frequency=self.sens_hz, slip_correction=True, clock=self.clock)
+        self.timer_gps = TIM.timer(frequency=self.gps_hz, slip_correction=True, clock=self.clock)
+        self.timer_gt = TIM.timer(frequency=self.gt_hz, enabled=self.gt_en, slip_correction=True, clock=self.clock)
         # self.timer_rc = TIM.timer(frequency=self.rc_hz)
         self.timer_ros_viz = TIM.timer(frequency=self.ros_hz, enabled=self.ros_en)
         self.timer_print = TIM.timer(frequency=self.print_hz, enabled=self.print_en)
@@ -68,6 +73,32 @@ class sim4cd(object):
         # Variable that stores the actuator PWMs
         self.actuator_commands = [0]*8
 
+        # Profiler of the stages of the simulation loop (the work of one iteration should fit in one sensor period)
+        self.prof = PROF.loop_profiler(1.0/self.sens_hz, enabled=self.prof_en, period=self.prof_period)
+
+        # Flight recorder of the state of every step (optional)
+        self.rec = None
+        if self.rec_en:
+            act_num = self.quad.vehicle_geo.act_num
+            meta = {'seed': self.quad.rng.seed, 'step_hz': self.step_hz, 'act_num': act_num}
+            self.rec = REC.flight_recorder(REC.default_directory(), REC.flight_columns(act_num), chunk_rows=self.rec_chunk, meta=meta)
+            REC.save_params(self.rec.directory, params)
+            print(f"\33[94mRecording the flight: {self.rec.directory}\33[0m")
+
+        # Shared memory state bus, with the same columns as the flight log, for local processes (optional)
+        self.bus = None
+        if self.bus_en:
+            act_num = self.quad.vehicle_geo.act_num
+            meta = {'seed': self.quad.rng.seed, 'step_hz': self.step_hz, 'act_num': act_num}
+            self.bus = BUS.state_bus(BUS.bus_name(self.px4_port), REC.flight_columns(act_num), slots=self.bus_slots, meta=meta)
+            print(f"\33[94mPublishing the state on the shared memory bus: {self.bus.name}\33[0m")
+
+        # Watcher of the parameter file, whose changes are applied between two steps (optional)
+        self.watcher = None
+        if self.reload_en:
+            self.watcher = WATCH.param_watcher(params, self.reload_period)
+            print(f"\33[94mWatching the parameter file: {params.json_path}\33[0m")
+
 
     def custom_handler(self, signal, frame):
         """
@@ -76,8 +107,21 @@ class sim4cd(object):
 
         print("\33[92mCtrl+C pressed. Running cleanup function\33[0m")
         # Terminate ROS node
+        if self.ros_en:
+            self.ros_aux.print_stats()
         del self.ros_aux
 
+        # Print the final summary of the profiler
+        self.prof.print_summary()
+
+        # Write the rest of the flight log
+        if self.rec is not None:
+            self.rec.close()
+
+        # Remove the shared memory block
+        if self.bus is not None:
+            self.bus.close()
+
         # Terminate sim4cd
         print("\33[92mExiting\33[0m") 
         exit()
@@ -91,64 +135,139 @@ class sim4cd(object):
         t0 = time.time()
         # Start the loop
         iteration = 0
+        # In lockstep mode, the simulation runs in real time until PX4 starts sending actuator controls
+        lockstep_active = False
+        # Last sensor measurements (held between samples for the flight recorder)
+        acc = gyro = mag = np.zeros(3)
+        bar = 0.0
         while True:
-            loop_start_time = time.time()
+            # Start timing the iteration
+            t = self.prof.start_iteration()
 
             # Increment iteration count
             iteration += 1
 
             # Check for new actuator controls from PX4
-            new, value = self.PX4.get_actuator_controls()
+            if(lockstep_active):
+                # Wait for the actuator controls PX4 computes in response to the last sensor data
+                new, value = self.PX4.get_actuator_controls(blocking=True, timeout=self.lockstep_timeout)
+                t = self.prof.record_wait('mavlink_rx', t)
+            else:
+                new, value = self.PX4.get_actuator_controls()
+                t = self.prof.record('mavlink_rx', t)
+            cmd_new = new
             if(new):
                 self.actuator_commands = value
+                lockstep_active = self.clock.is_lockstep()
+            elif(lockstep_active):
+                # PX4 did not answer in time, keep the heart beat without advancing the simulation
+                if (self.timer_heart_beat.tick()):
+                    self.PX4.send_heart_beat()
+                self.prof.end_iteration()
+                continue
+            elif(self.clock.is_lockstep()):
+                # Pace the simulation in real time while PX4 is booting
+                self.clock.wait()
+
+            # Advance the simulation clock (waits for the wall time if required by the clock mode)
+            dt = self.clock.step()
+            t = self.prof.record_wait('clock_wait', t)
+
+            # Timestamp of the simulated data (in lockstep mode PX4 follows the simulated time)
+            time_usec = self.clock.get_time_us() if self.clock.is_lockstep() else None
+
+            # Apply the changes of the parameter file (between two steps, so a step never mixes old and new values)
+            if self.watcher is not None:
+                keys = self.watcher.poll()
+                if keys is not None:
+                    self.quad.reload_parameters(self.watcher.params, keys)
+                    # Keep the parameters of the flight log in sync, so it can still be replayed
+                    if self.rec is not None:
+                        REC.save_params(self.rec.directory, self.watcher.params, self.rec.recorded_rows())
+                    t = self.prof.record('reload', t)
 
             # Perform the dynamic model integration step
-            self.quad.model_step(self.actuator_commands)
+            self.quad.model_step(self.actuator_commands, dt)
+            self.prof.record('physics', t)
 
             # Send system time to PX4
             if(self.timer_sys_time.tick()):
-                self.PX4.send_system_time()
+                t = self.prof.now()
+                self.PX4.send_system_time(time_usec)
+                self.prof.record('send_sys_time', t)
 
             # Send heart beat to PX4
             if (self.timer_heart_beat.tick()):
+                t = self.prof.now()
                 self.PX4.send_heart_beat()
+                self.prof.record('send_heart_beat', t)
 
-            # Send sensors data to PX4
-            if(self.timer_sensors.tick()):
+            # Send sensors data to PX4 (in lockstep mode, every step is answered with sensor data)
+            sens_new = self.timer_sensors.tick() or lockstep_active
+            if(sens_new):
                 # Get the current sensor values
+                t = self.prof.now()
                 acc = self.quad.get_acc()
                 gyro = self.quad.get_gyro()
                 mag = self.quad.get_mag()
                 bar = self.quad.get_baro()
-                self.PX4.send_sensors(acc,gyro,mag,bar)
+                t = self.prof.record('sensors', t)
+                self.PX4.send_sensors(acc,gyro,mag,bar,time_usec)
+                self.prof.record('send_sensors', t)
 
             # Send GPS data to PX4
             if (self.timer_gps.tick()):
+                t = self.prof.now()
                 gps = self.quad.get_gps()
-                self.PX4.send_gps(gps)
+                t = self.prof.record('gps', t)
+                self.PX4.send_gps(gps,time_usec)
+                self.prof.record('send_gps', t)
 
             # Send Ground Truth data to PX4 (for logging and comparison purposes)
             if (self.timer_gt.tick()):
+                t = self.prof.now()
                 gt = self.quad.get_ground_truth()
-                self.PX4.send_ground_truth(gt)
+                t = self.prof.record('ground_truth', t)
+                self.PX4.send_ground_truth(gt,time_usec)
+                self.prof.record('send_gt', t)
+
+            # Append the state of the step to the flight log and to the state bus
+            if self.rec is not None or self.bus is not None:
+                bat = self.quad.vehicle_geo.battery
+                act = self.quad.vehicle_geo.actuators
+                row = [self.clock.get_time(), dt, self.quad.p, self.quad.v, self.quad.q, self.quad.w, self.quad.status,
+                       act.speed, act.current, act.force, bat.output_voltage(), bat.soc,
+                       acc, gyro, mag, bar, sens_new, list(self.actuator_commands[0:8]), cmd_new]
+                if self.rec is not None:
+                    t = self.prof.now()
+                    self.rec.record(row)
+                    self.prof.record('record', t)
+                if self.bus is not None:
+                    t = self.prof.now()
+                    self.bus.write(row)
+                    self.prof.record('state_bus', t)
 
             # # Send RC data to PX4
             # if (self.timer_rc.tick()):
-            #     self.PX4.send_rc_commands(channels)
+            #     self.PX4.send_rc_commands(channels, time_usec)
             
             # Update ROS visualization
             if (self.timer_ros_viz.tick()):
+                t = self.prof.now()
                 p, v, q, w = self.quad.get_states()
                 self.ros_aux.update_ros_info(p,v,q,w,self.p0,self.q0)
+                self.prof.record('ros_publish', t)
 
             # Print info
             if (self.timer_print.tick()):
+                t = self.prof.now()
                 # Get some state variables for sensor simulation
                 p, v, q, w = self.quad.get_states()
                 tau = self.quad.get_tau()
                 total_force = self.quad.get_total_force()
                 m = self.quad.m
                 print("\33[1mIteration:", iteration, "\33[0m")
+                print("\33[0m\33[97mSim time:", self.clock.get_time(), "\33[0m")
                 print("\33[0m\33[40mAverage freq:", iteration/(time.time()-t0), "\33[0m")
                 print("\33[0m\33[97m  pos: ", p, "\33[0m")
                 print("\33[0m\33[40m  vel: ", v, "\33[0m")
@@ -161,10 +280,16 @@ class sim4cd(object):
                 # print("\33[0m\33[97mbar:   ", bar, "\33[0m")
                 print("\33[0m\33[40mactuator_commands: %f  %f  %f  %f\33[0m" % (self.actuator_commands[0], self.actuator_commands[1], self.actuator_commands[2], self.actuator_commands[3]))
                 print("\33[0m\33[97mBattery: ", self.quad.vehicle_geo.battery.output_voltage(), "   ", self.quad.vehicle_geo.battery.soc, "\33[0m")
+                rx = self.PX4.get_receive_stats()
+                print("\33[0m\33[40mMAVLink rx: ", rx['msg_count'], " queue depth: ", rx['queue_depth'], "/", rx['max_queue_depth'], " dropped actuator cmds: ", rx['actuator_dropped'], "\33[0m")
                 color = ['\33[92m','\33[91m','\33[93m']
                 status = self.quad.get_status()
                 print(color[status]+"status: ", status,'\33[0m')
                 print("\33[0m")
+                self.prof.record('print', t)
+
+            # End of the iteration (checked against the sensor period)
+            self.prof.end_iteration()
 
 
     def load_parameters(self, params):
@@ -176,18 +301,31 @@ class sim4cd(object):
         """
 
         # Load parameters
-        self.ros_en = params.get_parameter_value('SIM_ROS_EN')
-        self.ros_hz = params.get_parameter_value('SIM_ROS_HZ')
-        self.sens_hz = params.get_parameter_value('SIM_SENS_HZ')
-        self.gps_hz = params.get_parameter_value('SIM_GPS_HZ')
-        self.gt_en = params.get_parameter_value('SIM_GT_EN')
-        self.gt_hz = params.get_parameter_value('SIM_GT_HZ')
-        self.print_en = params.get_parameter_value('SIM_PRINT_EN')
-        self.print_hz = params.get_parameter_value('SIM_PRINT_HZ')
-        self.init_pos_x = params.get_parameter_value('SIM_INIT_POS_X')
-        self.init_pos_y = params.get_parameter_value('SIM_INIT_POS_Y')
-        self.init_yaw = (pi/180)*params.get_parameter_value('SIM_INIT_YAW') # Converted to radians
-        self.p0 = np.array([self.init_pos_x,self.init_pos_y,0])
+        sim = params.snapshot().sim
+        self.ros_en = sim.ros_en
+        self.ros_hz = sim.ros_hz
+        self.ros_thread_en = sim.ros_thread_en
+        self.sens_hz = sim.sens_hz
+        self.gps_hz = sim.gps_hz
+        self.gt_en = sim.gt_en
+        self.gt_hz = sim.gt_hz
+        self.print_en = sim.print_en
+        self.print_hz = sim.print_hz
+        self.step_hz = sim.step_hz
+        self.clock_mode = sim.clock_mode
+        self.speed_factor = sim.speed_factor
+        self.lockstep_timeout = sim.lockstep_timeout
+        self.px4_port = sim.px4_port
+        self.prof_en = sim.prof_en
+        self.prof_period = sim.prof_period
+        self.rec_en = sim.rec_en
+        self.rec_chunk = sim.rec_chunk
+        self.reload_en = sim.reload_en
+        self.reload_period = sim.reload_period
+        self.bus_en = sim.bus_en
+        self.bus_slots = sim.bus_slots
+        self.init_yaw = sim.init_yaw # Already in radians
+        self.p0 = sim.init_pos.copy()
         self.q0 = np.array([cos(self.init_yaw/2),0,0,sin(self.init_yaw/2)])
 
 
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Double buffer to hand the latest state of the simulation to another thread
+# The writer (simulation loop) never waits: it fills the buffer that is not being published and then flips the sequence number
+# The reader copies the latest buffer and retries if the writer completed a new write in the meantime (the copy could be torn)
+
+import time
+import numpy as np
+
+
+class double_buffer:
+    """
+    Class that keeps the last written array and the one before it, so a reader always has a complete one to copy
+    """
+
+    def __init__(self, size):
+        """
+        Constructor for the double_buffer class
+
+        Parameters:
+            size (int): Number of values of each write
+        """
+
+        self.buffers = [np.zeros(size), np.zeros(size)]
+        # Time of each write, given by time.perf_counter_ns [ns]
+        self.stamps = [0, 0]
+        # Number of completed writes (the latest one is in buffers[seq % 2])
+        self.seq = 0
+        # Number of copies discarded by the reader because of a concurrent write
+        self.retries = 0
+
+
+    def write(self, values, stamp=None):
+        """
+        Write new values (called by the single writer thread, never waits)
+
+        Parameters:
+            values (numpy.ndarray): Values to be written, shape (size,)
+            stamp (int): Time of the values [ns] (current time if None)
+        """
+
+        # Fill the buffer that does not hold the latest values, and only then publish it
+        i = (self.seq + 1) % 2
+        self.buffers[i][:] = values
+        self.stamps[i] = stamp if stamp is not None else time.perf_counter_ns()
+        self.seq = self.seq + 1
+
+
+    def read(self):
+        """
+        Copy the latest values
+
+        Returns:
+            values (numpy.ndarray): Copy of the latest values written
+            stamp (int): Time of the values [ns]
+            seq (int): Number of the write (0 if nothing was written yet)
+        """
+
+        while True:
+            seq = self.seq
+            i = seq % 2
+            values = self.buffers[i].copy()
+            stamp = self.stamps[i]
+            # Buffer i is only written again after a new write completes, so the copy is whole if the sequence did not change
+            if self.seq == seq:
+                return values, stamp, seq
+            self.retries = self.retries + 1
+
+
+
+if __name__ == "__main__":
+
+    # Write consecutive values from one thread while another reads them, and check that no copy is torn
+    import threading
+
+    size = 20
+    buffer = double_buffer(size)
+    n = 200000
+    done = threading.Event()
+
+    def writer():
+        for k in range(1, n + 1):
+            buffer.write(np.full(size, float(k)))
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    reads = torn = 0
+    last = 0
+    while not done.is_set():
+        values, stamp, seq = buffer.read()
+        reads = reads + 1
+        if np.any(values != values[0]) or values[0] != seq or seq < last:
+            torn = torn + 1
+        last = seq
+    thread.join()
+
+    t0 = time.perf_counter()
+    for k in range(n):
+        buffer.write(np.zeros(size))
+    print(f"Reads: {reads}, torn: {torn}, retries: {buffer.retries}, cost of one write: {(time.perf_counter()-t0)/n*1e6:.2f} us")
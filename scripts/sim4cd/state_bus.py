@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Shared memory state bus
+# The simulator writes the state of every step into a ring of slots in a shared memory block, with the same columns of the flight recorder
+# Local processes attach to the block by name and read the latest or the last samples without sockets, serialization or load on the loop
+# Each slot is protected by a seqlock: the writer makes the sequence number of the slot odd while it writes it, and even again when it is done,
+# so a reader knows that its copy of a slot is whole if the sequence number was even and did not change during the copy
+#
+# Layout of the block:
+#   header: int64[HEADER_FIELDS] (magic, version, number of slots, width of a slot, number of completed writes, size of the description)
+#   description: META_SIZE bytes of JSON with the columns of the slots and extra information of the writer
+#   sequence numbers: int64[slots]
+#   slots: float64[slots, width]
+
+import sys
+import json
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+import recorder as REC
+
+
+# Identification of the block
+MAGIC = 0x53494d3443445342 # "SIM4CDSB"
+BUS_VERSION = 1
+# Fields of the header
+H_MAGIC = 0
+H_VERSION = 1
+H_SLOTS = 2
+H_WIDTH = 3
+H_COUNT = 4
+H_META_SIZE = 5
+HEADER_FIELDS = 8
+# Space reserved for the JSON description [bytes]
+META_SIZE = 4096
+
+
+def bus_name(port):
+    """
+    Name of the shared memory block of a simulator instance
+
+    Parameters:
+        port (int): PX4 port of the simulator (SIM_PX4_PORT), unique for each running instance
+
+    Returns:
+        (str): Name of the block
+    """
+
+    return f"sim4cd_{port}"
+
+
+def block_views(buffer, slots, width):
+    """
+    Create the numpy views of the parts of a shared memory block
+
+    Parameters:
+        buffer (memoryview): Buffer of the block
+        slots (int): Number of slots
+        width (int): Number of values of each slot
+
+    Returns:
+        header (numpy.ndarray): Header fields, shape (HEADER_FIELDS,)
+        meta (numpy.ndarray): Bytes of the JSON description, shape (META_SIZE,)
+        seq (numpy.ndarray): Sequence number of each slot, shape (slots,)
+        data (numpy.ndarray): Slots, shape (slots, width)
+    """
+
+    offset = 0
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer, offset=offset)
+    offset = offset + header.nbytes
+    meta = np.ndarray((META_SIZE,), dtype=np.uint8, buffer=buffer, offset=offset)
+    offset = offset + meta.nbytes
+    seq = np.ndarray((slots,), dtype=np.int64, buffer=buffer, offset=offset)
+    offset = offset + seq.nbytes
+    data = np.ndarray((slots, width), dtype=np.float64, buffer=buffer, offset=offset)
+
+    return header, meta, seq, data
+
+
+def block_size(slots, width):
+    """
+    Compute the size of a shared memory block
+
+    Parameters:
+        slots (int): Number of slots
+        width (int): Number of values of each slot
+
+    Returns:
+        (int): Size of the block [bytes]
+    """
+
+    return 8*HEADER_FIELDS + META_SIZE + 8*slots + 8*slots*width
+
+
+class state_bus:
+    """
+    Class that writes rows of fixed width columns into a ring of slots in shared memory (single writer)
+    """
+
+    def __init__(self, name, columns, slots=4096, meta=None):
+        """
+        Constructor for the state_bus class
+
+        Parameters:
+            name (str): Name of the shared memory block (a stale block with the same name, left by a crashed run, is replaced)
+            columns (list of tuple): Name and width of each column (see recorder.flight_columns)
+            slots (int): Number of slots of the ring (history available to the readers)
+            meta (dict): Extra information stored in the description (e.g. seed and step rate of the run)
+        """
+
+        self.columns = columns
+        self.widths = [width for column, width in columns]
+        self.width = sum(self.widths)
+        self.slots = slots
+
+        # Description of the slots, read by the readers when they attach
+        description = dict(meta) if meta is not None else {}
+        description.update({'columns': [{'name': column, 'width': width} for column, width in columns], 'created': time.strftime('%Y-%m-%dT%H:%M:%S%z')})
+        description = json.dumps(description).encode()
+        if len(description) > META_SIZE:
+            print(f"\33[91m[state_bus] The description of the bus has {len(description)} bytes (maximum {META_SIZE}). Exiting.\33[0m")
+            exit()
+
+        # Create the block
+        size = block_size(slots, self.width)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            print(f"\33[93m[state_bus] Replacing the stale shared memory block {name}\33[0m")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+
+        self.header, meta_bytes, self.seq, self.data = block_views(self.shm.buf, slots, self.width)
+        meta_bytes[0:len(description)] = np.frombuffer(description, dtype=np.uint8)
+        self.seq[:] = 0
+        self.header[H_SLOTS] = slots
+        self.header[H_WIDTH] = self.width
+        self.header[H_COUNT] = 0
+        self.header[H_META_SIZE] = len(description)
+        self.header[H_VERSION] = BUS_VERSION
+        # The magic number is written last, so a reader never attaches to a block that is not ready
+        self.header[H_MAGIC] = MAGIC
+
+        # Number of completed writes
+        self.count = 0
+        self.closed = False
+
+
+    def write(self, values):
+        """
+        Write one row into the next slot (called by the simulation loop, never waits for the readers)
+
+        Parameters:
+            values (list): One value (float, list or array) per column, in the order of the columns
+        """
+
+        i = self.count % self.slots
+        # Odd sequence number while the slot is being written
+        self.seq[i] = 2*(self.count // self.slots) + 1
+        self.data[i] = REC.flatten(self.widths, values)
+        self.seq[i] = 2*(self.count // self.slots) + 2
+        self.count = self.count + 1
+        self.header[H_COUNT] = self.count
+
+
+    def close(self):
+        """
+        Release the block (the readers that are still attached keep their mapping until they close it)
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+
+        # Drop the views before closing the block
+        del self.header, self.seq, self.data
+        self.shm.close()
+        self.shm.unlink()
+
+
+class state_bus_reader:
+    """
+    Class that attaches to a state bus and reads its slots
+    """
+
+    def __init__(self, name):
+        """
+        Constructor for the state_bus_reader class
+
+        Parameters:
+            name (str): Name of the shared memory block (see bus_name)
+        """
+
+        # Attach without registering the block in the resource tracker, which would remove it when this process exits
+        try:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Python < 3.13
+                from multiprocessing import resource_tracker
+                self.shm = shared_memory.SharedMemory(name=name)
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except FileNotFoundError:
+            print(f"\33[91m[state_bus] There is no state bus {name}. Is the simulator running with SIM_BUS_EN?\33[0m")
+            exit()
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        if header[H_MAGIC] != MAGIC or header[H_VERSION] != BUS_VERSION:
+            print(f"\33[91m[state_bus] {name} is not a state bus of version {BUS_VERSION}. Exiting.\33[0m")
+            exit()
+        self.slots = int(header[H_SLOTS])
+        self.width = int(header[H_WIDTH])
+        self.header, meta_bytes, self.seq, self.data = block_views(self.shm.buf, self.slots, self.width)
+        self.meta = json.loads(meta_bytes[0:int(self.header[H_META_SIZE])].tobytes().decode())
+
+        # Position of each column in the slots
+        self.columns = {}
+        offset = 0
+        for column in self.meta['columns']:
+            self.columns[column['name']] = slice(offset, offset + column['width']) if column['width'] > 1 else offset
+            offset = offset + column['width']
+
+        # Number of copies discarded because the writer was writing the slot
+        self.retries = 0
+
+
+    def count(self):
+        """
+        Get the number of rows written so far
+
+        Returns:
+            (int): Number of completed writes
+        """
+
+        return int(self.header[H_COUNT])
+
+
+    def read_slot(self, index):
+        """
+        Copy the row with a given index, checking it against concurrent writes
+
+        Parameters:
+            index (int): Index of the row (from 0 to count()-1)
+
+        Returns:
+            (numpy.ndarray): Copy of the row, shape (width,) (None if the row was already overwritten)
+        """
+
+        i = index % self.slots
+        expected = 2*(index // self.slots) + 2
+        while True:
+            seq = self.seq[i]
+            row = self.data[i].copy()
+            if self.seq[i] == seq and seq == expected:
+                return row
+            if seq > expected:
+                # The ring has wrapped around
+                return None
+            self.retries = self.retries + 1
+
+
+    def read_latest(self):
+        """
+        Copy the latest row
+
+        Returns:
+            (numpy.ndarray): Copy of the latest row, shape (width,) (None if nothing was written yet)
+        """
+
+        while True:
+            count = self.count()
+            if count == 0:
+                return None
+            row = self.read_slot(count - 1)
+            if row is not None:
+                return row
+
+
+    def read_history(self, n):
+        """
+        Copy the last rows (at most the number of slots minus one, since the writer may be writing the oldest one)
+
+        Parameters:
+            n (int): Number of rows
+
+        Returns:
+            (numpy.ndarray): Copy of the rows, oldest first, shape (rows, width) (rows overwritten during the copy are dropped)
+        """
+
+        count = self.count()
+        n = min(n, count, self.slots - 1)
+        first = count - n
+        # Copy all of the rows at once, then check each of them against its sequence number
+        indexes = np.arange(first, count) % self.slots
+        rows = self.data[indexes]
+        expected = 2*(np.arange(first, count) // self.slots) + 2
+        valid = self.seq[indexes] == expected
+
+        return rows[valid]
+
+
+    def column(self, rows, name):
+        """
+        Extract a column from rows read from the bus
+
+        Parameters:
+            rows (numpy.ndarray): Row of shape (width,) or rows of shape (n, width)
+            name (str): Name of the column
+
+        Returns:
+            (numpy.ndarray or float): Values of the column
+        """
+
+        return rows[..., self.columns[name]]
+
+
+    def view(self):
+        """
+        Get the slots as a read-only array mapped to the shared memory (zero copy, but without any protection against concurrent writes)
+
+        Returns:
+            (numpy.ndarray): Slots, shape (slots, width)
+        """
+
+        view = self.data.view()
+        view.flags.writeable = False
+
+        return view
+
+
+    def close(self):
+        """
+        Detach from the block
+        """
+
+        del self.header, self.seq, self.data
+        self.shm.close()
+
+
+
+if __name__ == "__main__":
+    """
+    State bus reader
+
+    Parameters:
+        px4_port (int): SIM_PX4_PORT of a running simulator, whose latest state is printed (optional)
+
+    Without arguments, a writer process fills a bus while this process reads it, to check that no copy is torn
+    """
+
+    if len(sys.argv) > 1:
+        # Follow the state of a running simulator
+        reader = state_bus_reader(bus_name(int(sys.argv[1])))
+        print(f"\33[94m[state_bus] Attached to {reader.shm.name}: {reader.slots} slots of {reader.width} values, seed {reader.meta.get('seed')}\33[0m")
+        while True:
+            row = reader.read_latest()
+            if row is not None:
+                print(f"t {reader.column(row, 't'):9.3f} s  pos {np.array2string(reader.column(row, 'p'), precision=3)}  status {reader.column(row, 'status'):.0f}  battery {reader.column(row, 'bat_voltage'):.2f} V")
+            time.sleep(0.1)
+
+    import multiprocessing
+
+    columns = REC.flight_columns(4)
+    name = bus_name('selfcheck')
+    ready = multiprocessing.Event()
+    attached = multiprocessing.Event()
+
+    def writer(n):
+        # The writer owns the block, as the simulator does, and waits for the reader before it starts
+        bus = state_bus(name, columns, slots=256, meta={'act_num': 4})
+        ready.set()
+        attached.wait()
+        # Every value of row k is k, so a torn copy has different values
+        for k in range(1, n + 1):
+            row = [float(k) if width == 1 else np.full(width, float(k)) for column, width in columns]
+            bus.write(row)
+        bus.close()
+
+    n = 200000
+    process = multiprocessing.Process(target=writer, args=(n,))
+    process.start()
+    ready.wait()
+    reader = state_bus_reader(name)
+    attached.set()
+    reads = torn = 0
+    while process.is_alive():
+        row = reader.read_latest()
+        history = reader.read_history(100)
+        for rows in ([row] if row is not None else []) + list(history):
+            reads = reads + 1
+            if np.any(rows != rows[0]):
+                torn = torn + 1
+    process.join()
+    print(f"Rows written: {reader.count()}, rows read: {reads}, torn: {torn}, retries: {reader.retries}")
+    reader.close()
+
+    # Cost of one write with the layout of sim4cd
+    values = [0.0, 1e-3, np.zeros(3), np.zeros(3), np.array([1.0, 0, 0, 0]), np.zeros(3), 1, np.ones(4), np.ones(4), np.ones(4), 16.0, 0.9,
+              np.zeros(3), np.zeros(3), np.zeros(3), 1013.0, 1, [0.5]*8, 0]
+    bus = state_bus(name, columns, slots=256)
+    costs = np.zeros(20000)
+    for k in range(len(costs)):
+        t0 = time.perf_counter()
+        bus.write(values)
+        costs[k] = time.perf_counter() - t0
+    print(f"Cost of one write: median {np.median(costs)*1e6:.2f} us, p99 {np.percentile(costs, 99)*1e6:.2f} us")
+
+    bus.close()
@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Batched rigid body dynamics
+# Simulates N vehicles at once with the same model of vehicle_dynamics, with the states stored as arrays of shape (N,3) and (N,4)
+
+import numpy as np
+
+import vehicle as VEH
+import sensors as SENS
+import battery as BAT
+import polynomial as POLY
+import math_utils as MU
+import integrators as INT
+import rng as RNG
+
+
+class swarm_dynamics:
+    """
+    Class that simulates the rigid body dynamics of a set of vehicles in a single vectorized pass
+    Each vehicle has its own parameters, loaded from its own parameter server
+    """
+
+    def __init__(self, params_list, rng=None):
+        """
+        Constructor for the swarm_dynamics class
+
+        Parameters:
+            params_list (list of <parameter_server.parameter_server>): One parameter server object per vehicle
+            rng (<rng.rng_service>): Random number service (by default, one created with the SIM_SEED of the first vehicle)
+        """
+
+        # Random number service of the simulation (vehicle i uses the same streams as a vehicle_dynamics with vehicle_id i)
+        self.rng = rng if rng is not None else RNG.from_params(params_list[0])
+
+        # Number of vehicles
+        self.n = len(params_list)
+        if self.n == 0:
+            print(f"\33[91mThe swarm needs at least one vehicle. Exiting.\33[0m")
+            exit()
+
+        # Load model parameters of all of the vehicles
+        self.load_parameters(params_list)
+
+        # Initialize states, one row per vehicle
+        self.p = self.p0*1 # positions in the world frame
+        self.v = np.zeros((self.n,3)) # velocities in the world frame
+        self.q = self.q0*1 # orientations (as quaternions) in the world frame
+        self.w = np.zeros((self.n,3)) # angular velocities in the body frames
+
+        # Integers representing the status of each vehicle
+        self.status = np.zeros(self.n, dtype=int)
+            # 0: Landed
+            # 1: Flying
+            # 2: Landing
+
+        # Important variables
+        self.Force_b = np.zeros((self.n,3))
+        self.Torque_b = np.zeros((self.n,3))
+        self.total_force_w = np.zeros((self.n,3))
+
+        # Initialize the current landing pose information
+        self.z_land = self.p[:,2]*1
+        self.q_land = self.q*1
+
+        # Actuators states, shape (N,act_max) (the unused slots of vehicles with less actuators stay at zero)
+        self.cmds = np.zeros((self.n,self.act_max))
+        self.act_speed = np.zeros((self.n,self.act_max))
+        self.act_position = np.zeros((self.n,self.act_max))
+        self.act_current = np.zeros((self.n,self.act_max))
+        self.I_actuators = np.zeros(self.n)
+
+        # Gravity acceleration of each vehicle, shape (N,3)
+        self.gravity = np.zeros((self.n,3))
+        self.gravity[:,2] = -self.g
+
+
+    def load_parameters(self, params_list):
+        """
+        Load parameters for all of the vehicles and store them in arrays (one row per vehicle)
+
+        Parameters:
+            params_list (list of <parameter_server.parameter_server>): One parameter server object per vehicle
+        """
+
+        snaps = [params.snapshot() for params in params_list]
+
+        # Rigid body parameters
+        self.g = np.array([snap.env.gravity for snap in snaps], dtype=float)
+        self.m = np.array([snap.dynamics.mass for snap in snaps], dtype=float)
+        self.drag_v = np.array([snap.dynamics.drag_v for snap in snaps], dtype=float)
+        self.drag_w = np.array([snap.dynamics.drag_w for snap in snaps], dtype=float)
+        # The moments of inertia matrices are diagonal, so only the diagonals are stored
+        self.J = np.array([snap.dynamics.moi for snap in snaps], dtype=float)
+        self.Jinv = 1/self.J
+        self.wind_vw = np.array([snap.dynamics.wind for snap in snaps], dtype=float)
+
+        # Initial poses
+        self.p0 = np.array([snap.sim.init_pos for snap in snaps], dtype=float)
+        self.q0 = np.zeros((self.n,4))
+        for i, snap in enumerate(snaps):
+            init_yaw = snap.sim.init_yaw
+            self.q0[i] = [np.cos(init_yaw/2), 0, 0, np.sin(init_yaw/2)]
+
+        # The single vehicle geometries load the actuators and battery parameters
+        geometries = [VEH.vehicle_geometry(params) for params in params_list]
+
+        # Actuators parameters, padded to the largest number of actuators
+        self.act_num = np.array([geo.act_num for geo in geometries])
+        self.act_max = self.act_num.max()
+        self.act_mask = np.arange(self.act_max) < self.act_num[:,None]
+        self.act_spin = np.zeros((self.n,self.act_max))
+        self.act_time_cte = np.ones((self.n,self.act_max)) # padded with ones to avoid divisions by zero
+        self.act_Jr = np.zeros((self.n,self.act_max))
+        self.volt_to_speed = np.zeros((self.n,self.act_max,3))
+        self.speed_to_thrust = np.zeros((self.n,self.act_max,3))
+        self.speed_to_torque = np.zeros((self.n,self.act_max,3))
+        self.torque_to_current = np.zeros((self.n,self.act_max,3))
+        self.directions = np.zeros((self.n,self.act_max,3))
+        self.moment_arms = np.zeros((self.n,self.act_max,3))
+        for i, geo in enumerate(geometries):
+            k = geo.act_num
+            bank = geo.actuators
+            self.act_spin[i,:k] = bank.spin
+            self.act_time_cte[i,:k] = bank.time_cte
+            self.act_Jr[i,:k] = bank.Jr
+            self.volt_to_speed[i,:k] = bank.volt_to_speed
+            self.speed_to_thrust[i,:k] = bank.speed_to_thrust
+            self.speed_to_torque[i,:k] = bank.speed_to_torque
+            self.torque_to_current[i,:k] = bank.torque_to_current
+            self.directions[i,:k] = bank.directions
+            self.moment_arms[i,:k] = bank.moment_arms
+        # Gyroscopic momentum is taken along the direction of the first actuator (same as actuator_bank)
+        self.gyro_axis = self.directions[:,0]*1
+
+        # Noise asymmetry vectors (same as actuator_bank)
+        self.acc_noise_distribution = geometries[0].actuators.acc_noise_distribution
+        self.gyro_noise_distribution = geometries[0].actuators.gyro_noise_distribution
+
+        # Battery parameters and states
+        self.bat_full_charge = np.array([geo.battery.full_charge for geo in geometries], dtype=float)
+        self.bat_n_cells = np.array([geo.battery.n_cells for geo in geometries], dtype=float)
+        self.bat_idle_current = np.array([geo.battery.idle_current for geo in geometries], dtype=float)
+        self.bat_internal_R = np.array([geo.battery.internal_R for geo in geometries], dtype=float)
+        self.bat_q = np.array([geo.battery.q for geo in geometries], dtype=float)
+        self.bat_soc = np.array([geo.battery.soc for geo in geometries], dtype=float)
+        self.bat_V = np.zeros(self.n)
+        self.cell_voltage = np.array(BAT.CELL_VOLTAGE_COEFFICIENTS)
+
+        # Integration method (shared by all of the vehicles, taken from the first one)
+        self.integrator = snaps[0].sim.integrator
+        self.integrate = INT.get_integrator(self.integrator)
+
+        # Create one sensors object per vehicle, each one with the noise streams of its vehicle
+        self.sensors = [SENS.sensors(params, self.rng.seed_sequence(f"vehicle/{i}/sensors")) for i, params in enumerate(params_list)]
+        # Stack the parameters of the sensors sampled for all of the vehicles at once (see get_sensors)
+        self.acc_noise_std = np.array([sens.acc_noise_std for sens in self.sensors], dtype=float)
+        self.gyro_noise_std = np.array([sens.gyro_noise_std for sens in self.sensors], dtype=float)
+        self.mag_noise_std = np.array([sens.mag_noise_std for sens in self.sensors], dtype=float)
+        self.earth_mag_field = np.array([sens.earth_mag_field for sens in self.sensors], dtype=float)
+        self.bar_noise_std = np.array([sens.bar_noise_std for sens in self.sensors], dtype=float)
+        self.pressure_sea = np.array([sens.pressure_sea for sens in self.sensors], dtype=float)
+        self.C_bar = np.array([sens.C_bar for sens in self.sensors], dtype=float)
+        self.h0 = np.array([sens.h0 for sens in self.sensors], dtype=float)
+        # Conversion from the simulator frame to the PX4 standard (NED)
+        self.ned = np.array([1.0, -1.0, -1.0])
+
+
+    def model_step(self, cmds, dt):
+        """
+        Perform the dynamic integration step of all of the vehicles
+
+        Parameters:
+            cmds (numpy.ndarray): PWM values (from 0 to 1) for each actuator of each vehicle, shape (N,act_max)
+                                  Vehicles with less actuators ignore the extra columns
+            dt (float): Time step given by the simulation clock [s]
+        """
+
+        # Store the current actuator commands locally (the unused slots are kept at zero)
+        self.cmds = np.where(self.act_mask, np.asarray(cmds, dtype=float)[:,:self.act_max], 0.0)
+
+        # Compute the forces and torques that the actuators are applying to the vehicle bodies
+        self.Force_b, self.Torque_b = self.actuators_step(self.battery_step(dt), dt)
+
+        # Deal with ground interaction during take off and landing
+        self.check_ground_interaction()
+
+        # Compute non inertial forces acting on the drones at the beginning of the step (used by the accelerometers)
+        self.total_force_w = MU.quat_apply_rot_batch(self.q,self.Force_b) - self.drag_v[:,None]*(self.v-self.wind_vw)
+
+        # Gyroscopic momentum of the actuators, held constant during the step
+        self.L_act = (self.act_spin*self.act_speed*self.act_Jr).sum(axis=1)
+
+        # Model integration (fixed time step) with the selected integrator
+        self.p, self.v, self.q, self.w = self.integrate(self.derivatives, self.p, self.v, self.q, self.w, dt)
+
+
+    def derivatives(self, p, v, q, w):
+        """
+        Compute the derivatives of the rigid body states of all of the vehicles (see vehicle_dynamics.derivatives)
+
+        Parameters:
+            p (numpy.ndarray): Positions in the world frame, shape (N,3) [m]
+            v (numpy.ndarray): Velocities in the world frame, shape (N,3) [m/s]
+            q (numpy.ndarray): Orientation quaternions, shape (N,4) [qw, qx, qy, qz]
+            w (numpy.ndarray): Angular velocities in the body frames, shape (N,3) [rad/s]
+
+        Returns:
+            p_dot, v_dot, q_dot, w_dot (numpy.ndarray): Derivatives of the states, same shapes as the states
+        """
+
+        # Compute linear drag
+        f_drag = -self.drag_v[:,None]*(v-self.wind_vw)
+        # Compute angular drag
+        T_drag = -self.drag_w[:,None]*w
+
+        # Compute torque due to gyroscopic effect
+        Tg = -self.L_act[:,None]*MU.cross_batch(w, self.gyro_axis)
+
+        # Compute non inertial forces acting on the drones
+        total_force_w = MU.quat_apply_rot_batch(q,self.Force_b) + f_drag
+        # Compute kinematic acceleraions
+        acc_w = self.gravity + total_force_w/self.m[:,None]
+
+        # Dynamic model
+        p_dot = v
+        v_dot = acc_w
+        q_dot = MU.quaternion_derivative_batch(q,w)
+        w_dot = self.Jinv*(-MU.cross_batch(w,self.J*w) + self.Torque_b + T_drag + Tg)
+
+        return p_dot, v_dot, q_dot, w_dot
+
+
+    def battery_step(self, dt):
+        """
+        Perform the integration step of the batteries, given the current drawn by the actuators in the last step
+
+        Parameters:
+            dt (float): Time step given by the simulation clock [s]
+
+        Returns:
+            self.bat_V (numpy.ndarray): Voltage in the output of each battery, shape (N,) [V]
+        """
+
+        # Same model of battery.battery_sim_step
+        I = self.I_actuators + self.bat_idle_current
+        self.bat_q = self.bat_q - I*dt
+        self.bat_soc = (self.bat_q/3.6)/self.bat_full_charge
+        self.bat_V = POLY.eval_rows(self.cell_voltage, self.bat_soc[:,None])[:,0]*self.bat_n_cells - self.bat_internal_R*I
+
+        return self.bat_V
+
+
+    def actuators_step(self, V, dt):
+        """
+        Perform the integration step of the actuators of all of the vehicles
+
+        Parameters:
+            V (numpy.ndarray): Voltage in the output of each battery, shape (N,) [V]
+            dt (float): Time step given by the simulation clock [s]
+
+        Returns:
+            total_force (numpy.ndarray): Collective force the actuators apply to each vehicle body, shape (N,3) [N]
+            total_torque (numpy.ndarray): Collective torque the actuators apply to each vehicle body, shape (N,3) [Nm]
+        """
+
+        # Same model of actuator_bank.sim_step, with one row per vehicle
+        self.act_position = self.act_position + self.act_speed*dt
+        speed_ss = POLY.eval_rows(self.volt_to_speed, self.cmds*V[:,None])
+        self.act_speed = ((self.act_time_cte-dt)/self.act_time_cte)*self.act_speed + (dt/self.act_time_cte)*speed_ss
+
+        force = POLY.eval_rows(self.speed_to_thrust, self.act_speed)
+        torque = POLY.eval_rows(self.speed_to_torque, self.act_speed)
+        self.act_current = POLY.eval_rows(self.torque_to_current, np.abs(torque))*self.act_mask
+        self.I_actuators = self.act_current.sum(axis=1)
+
+        # Collective force and torque of each vehicle
+        total_force = np.einsum('na,nad->nd', force, self.directions)
+        total_torque = np.einsum('na,nad->nd', force, self.moment_arms) + np.einsum('na,nad->nd', torque, self.directions)
+
+        return total_force, total_torque
+
+
+    def check_ground_interaction(self):
+        """
+        Check for interaction between the drones and the floor (same state machine of vehicle_dynamics, applied with masks)
+        """
+
+        status = self.status*1
+        mg = self.m*self.g
+
+        # Landed stage
+        landed = status == 0
+        if landed.any():
+            take_off = landed & (self.Force_b[:,2] > mg)
+            hold = landed & ~take_off
+            self.status[take_off] = 1
+            self.v[hold] = 0
+            self.w[hold] = 0
+            self.Torque_b[hold] = 0
+            self.Force_b[hold] = 0
+            self.Force_b[hold,2] = mg[hold]
+
+        # Flying stage
+        start_landing = (status == 1) & (self.p[:,2] < self.z_land)
+        if start_landing.any():
+            self.status[start_landing] = 2
+            # As in vehicle_dynamics, the roll and pitch components of the attitude are cleared when the landing starts
+            self.q[start_landing,1:3] = 0
+            self.q_land[start_landing] = MU.normalize_rows(self.q[start_landing])
+
+        # Landing stage
+        landing = status == 2
+        if landing.any():
+            v_norm = np.sqrt((self.v*self.v).sum(axis=1))
+            w_norm = np.sqrt((self.w*self.w).sum(axis=1))
+            touch_down = landing & (v_norm < 0.001) & (w_norm < 0.001) & (self.q[:,1] < 0.001) & (self.q[:,2] < 0.001)
+            align = landing & ~touch_down
+
+            if touch_down.any():
+                self.status[touch_down] = 0
+                self.v[touch_down] = 0
+                self.w[touch_down] = 0
+                self.z_land[touch_down] = self.p[touch_down,2]
+                self.q[touch_down,1:3] = 0
+                self.q[touch_down] = MU.normalize_rows(self.q[touch_down])
+                self.Force_b[touch_down] = 0
+                self.Force_b[touch_down,2] = mg[touch_down]
+                self.Torque_b[touch_down] = 0
+
+            if align.any():
+                q = self.q[align]
+                w_align = MU.quat_mult_batch(MU.quat_conj_batch(self.q_land[align]),q)
+                w_align = np.where(w_align[:,0:1] < 0, -w_align, w_align)[:,1:4]
+                m = self.m[align,None]
+                break_force_w = -m*self.v[align]*20
+                break_force_w[:,2] = break_force_w[:,2]*5 + mg[align] - self.p[align,2]*500
+                self.Force_b[align] = MU.quat_apply_inv_rot_batch(q,break_force_w)
+                self.Torque_b[align] = -self.J[align]*self.w[align]*10 - w_align*20
+
+
+    def get_status(self):
+        """
+        Return the status of the vehicles
+
+        Returns:
+            self.status (numpy.ndarray): Integers representing the vehicle status, shape (N,)
+                0: Landed
+                1: Flying
+                2: Landing
+        """
+
+        return self.status
+
+
+    def get_states(self):
+        """
+        Return the states of the vehicles, one row per vehicle
+
+        Returns:
+            self.p (numpy.ndarray): Vehicle positions, shape (N,3) [m]
+            self.v (numpy.ndarray): Vehicle world velocities, shape (N,3) [m/s]
+            self.q (numpy.ndarray): Vehicle orientations (qw, qx, qy, qz), shape (N,4)
+            self.w (numpy.ndarray): Vehicle angular velocities, shape (N,3) [rad/s]
+        """
+
+        return self.p, self.v, self.q, self.w
+
+
+    def get_actuators_positions(self, i):
+        """
+        Get the angular positions of the actuators of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (numpy.ndarray): Angular position of each actuator [rad]
+        """
+
+        return self.act_position[i,:self.act_num[i]]
+
+
+    def get_induced_noise_phase(self, i):
+        """
+        Compute the sum of the speed weighted phases of the noise the actuators of one vehicle induce on it (see actuator_bank.noise_phase_sum)
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (float): Sum over the actuators of speed*phase [rad/s]
+        """
+
+        position = self.act_position[i]
+        phase = np.sin(position) + np.sin(2*position)/2 + np.sin(3*position)/5
+
+        return self.act_speed[i]@phase
+
+
+    def get_induced_noise_phases(self):
+        """
+        Compute the sum of the speed weighted phases of the noise the actuators of each vehicle induce on it
+
+        Returns:
+            (numpy.ndarray): Sum over the actuators of speed*phase of each vehicle, shape (N,) [rad/s]
+        """
+
+        position = self.act_position
+        phase = np.sin(position) + np.sin(2*position)/2 + np.sin(3*position)/5
+
+        return (self.act_speed*phase).sum(axis=1)
+
+
+    def get_sensors(self):
+        """
+        Return the accelerometer, gyro, magnetometer and barometer measurements of all of the vehicles at once
+        Same models and noise streams of the sensors class, with the measurements of all of the vehicles computed at once
+
+        Returns:
+            acc (numpy.ndarray): Accelerometer measurements (3 axis), shape (N,3) [m/s2]
+            gyro (numpy.ndarray): Gyro measurements (3 axis), shape (N,3) [rad/s]
+            mag (numpy.ndarray): Magnetometer measurements (3 axis), shape (N,3) [G]
+            bar (numpy.ndarray): Barometer measurements, shape (N,) [hPa]
+        """
+
+        # Noise induced by the actuators
+        phases = self.get_induced_noise_phases()[:,None]
+
+        # Random noise from the stream of each vehicle
+        acc_noise = np.array([sens.acc_noise.draw(3) for sens in self.sensors])
+        gyro_noise = np.array([sens.gyro_noise.draw(3) for sens in self.sensors])
+        mag_noise = np.array([sens.mag_noise.draw(3) for sens in self.sensors])
+        bar_noise = np.array([sens.baro_noise.draw_one() for sens in self.sensors])
+
+        # Accelerometer
+        acc = MU.quat_apply_inv_rot_batch(self.q, self.total_force_w/self.m[:,None]) + acc_noise*self.acc_noise_std
+        acc = (acc + (phases/280)*self.acc_noise_distribution)*self.ned
+
+        # Gyro
+        gyro = self.w + gyro_noise*self.gyro_noise_std
+        gyro = (gyro + (phases/1450)*self.gyro_noise_distribution)*self.ned
+
+        # Magnetometer (with the field generated by the current of the actuators, same as vehicle_geometry)
+        internal_field = np.array([-0.14, -0.02, -0.08])*((self.I_actuators[:,None]/40)**2)
+        mag = MU.quat_apply_inv_rot_batch(self.q, self.earth_mag_field) + mag_noise*self.mag_noise_std
+        mag = (mag + internal_field)*self.ned
+
+        # Barometer
+        bar = self.pressure_sea*np.exp(-(self.p[:,2]+self.h0)/self.C_bar) + bar_noise*self.bar_noise_std
+
+        return acc, gyro, mag, bar
+
+
+    def get_acc(self, i):
+        """
+        Return the accelerometer measurement of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (numpy.ndarray): Accelerometer measurement (3 axis) in meters per second square [m/s2]
+        """
+
+        induced_noise = (self.get_induced_noise_phase(i)/280)*self.acc_noise_distribution
+        return self.sensors[i].get_acc(self.q[i], self.total_force_w[i], self.m[i], induced_noise)
+
+
+    def get_gyro(self, i):
+        """
+        Return the gyro measurement of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (numpy.ndarray): Gyro measurement (3 axis) in radians per second [rad/s]
+        """
+
+        induced_noise = (self.get_induced_noise_phase(i)/1450)*self.gyro_noise_distribution
+        return self.sensors[i].get_gyro(self.w[i], induced_noise)
+
+
+    def get_mag(self, i):
+        """
+        Return the magnetometer measurement of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (numpy.ndarray): Magnetometer measurement (3 axis) Gauss [G]
+        """
+
+        # Internal magnetic field caused by the current of the actuators (same as vehicle_geometry)
+        internal_field = np.array([-0.14, -0.02, -0.08])*(self.I_actuators[i]/40)**2
+        return self.sensors[i].get_mag(self.q[i], internal_field)
+
+
+    def get_baro(self, i):
+        """
+        Return the barometer measurement of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (float): Barometer measurement Hectopascal [hPa]
+        """
+
+        return self.sensors[i].get_baro(self.p[i,2])
+
+
+    def get_gps(self, i):
+        """
+        Return the GPS measurement data of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (dict): Python dictionary with the GPS measurement data
+        """
+
+        return self.sensors[i].get_gps(self.p[i],self.v[i])
+
+
+    def get_ground_truth(self, i):
+        """
+        Return the ground truth data of one vehicle
+
+        Parameters:
+            i (int): Index of the vehicle
+
+        Returns:
+            (dict): Python dictionary with the ground truth data
+        """
+
+        return self.sensors[i].get_ground_truth(self.p[i],self.v[i],self.q[i],self.w[i])
+
+
+
+if __name__ == "__main__":
+
+    # Check the batched engine against the single vehicle model and measure how it scales with the number of vehicles
+    # Usage: python3 swarm_dynamics.py [params.json ...]
+    import sys
+    import time
+    import os
+    import parameter_server as PRM
+    import dynamics as DYN
+
+    files = sys.argv[1:] if len(sys.argv) > 1 else [os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../config/sim_params.json')]
+    params_list = [PRM.parameter_server(f) for f in files]
+    dt = 0.001
+
+    # Take off, fly and land again with every vehicle using the same command profile
+    def commands(k, act_num):
+        level = 0.8 if k < 800 else (0.5 if k < 6000 else 0.0)
+        cmd = np.full(act_num, level)
+        cmd[0] = cmd[0] + 0.01*np.sin(k*0.01)
+        return cmd
+
+    rng = RNG.rng_service(1)
+    singles = [DYN.vehicle_dynamics(params, i, rng) for i, params in enumerate(params_list)]
+    swarm = swarm_dynamics(params_list, rng)
+    error = 0
+    for k in range(11000):
+        cmds = np.zeros((swarm.n, swarm.act_max))
+        for i, single in enumerate(singles):
+            cmds[i,:swarm.act_num[i]] = commands(k, swarm.act_num[i])
+            single.model_step(cmds[i,:swarm.act_num[i]], dt)
+        swarm.model_step(cmds, dt)
+        for i, single in enumerate(singles):
+            error = max(error, np.abs(np.concatenate(single.get_states()) - np.concatenate([s[i] for s in swarm.get_states()])).max())
+    print(f"Maximum difference to vehicle_dynamics after 11000 steps: {error:.3e}")
+    print(f"Final status: single {[s.get_status() for s in singles]} swarm {swarm.get_status().tolist()}")
+    # The sensors of each vehicle use the same noise streams in both engines
+    acc, gyro, mag, bar = swarm.get_sensors()
+    error = max(max(np.abs(single.get_acc()-acc[i]).max(), np.abs(single.get_gyro()-gyro[i]).max(), np.abs(single.get_mag()-mag[i]).max(), abs(single.get_baro()-bar[i])) for i, single in enumerate(singles))
+    print(f"Maximum difference of the sensors to vehicle_dynamics: {error:.3e}")
+
+    # Scaling
+    for n in [1, 8, 64, 256]:
+        swarm = swarm_dynamics([params_list[i%len(params_list)] for i in range(n)])
+        cmds = np.full((n, swarm.act_max), 0.62)
+        steps = 1000
+        t0 = time.perf_counter()
+        for k in range(steps):
+            swarm.model_step(cmds, dt)
+        elapsed = (time.perf_counter()-t0)/steps
+        print(f"{n:4d} vehicles: {elapsed*1e6:8.1f} us/step ({elapsed*1e6/n:6.2f} us/vehicle), {dt/elapsed:6.1f}x real time at {1/dt:.0f} Hz")
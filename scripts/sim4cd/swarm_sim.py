@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Multi-vehicle simulation integrated with PX4
+# One process serves several PX4 instances: their MAVLink I/O is multiplexed by a single selector and they share one physics step
+
+import time
+import signal
+import selectors
+import numpy as np
+import sys
+
+import silsim_comm as COM
+import swarm_dynamics as SWARM
+import parameter_server as PRM
+import timer as TIM
+import clock as CLK
+
+
+class swarm_sim(object):
+    """
+    Multi-vehicle PX4 simulation class
+    """
+
+    def __init__(self, params_list):
+        """
+        Constructor for the swarm_sim class
+
+        Parameters:
+            params_list (list of <parameter_server.parameter_server>): One parameter server object per vehicle
+                The simulation settings (SIM_* rates, clock and port) are taken from the first vehicle
+        """
+
+        # Load the simulation parameters
+        self.load_parameters(params_list[0])
+
+        # Number of vehicles
+        self.n = len(params_list)
+
+        # Register the custom_handler function to be called when Ctrl+C is pressed
+        signal.signal(signal.SIGINT, self.custom_handler)
+
+        # Create one connection per vehicle (the PX4 instance i connects to the port SIM_PX4_PORT + i)
+        self.PX4 = [COM.px4_connection("tcpin", "localhost", self.px4_port + i) for i in range(self.n)]
+        # Connect to all of the PX4 instances
+        for px4 in self.PX4:
+            px4.connect()
+
+        # Watch all of the connections with a single selector (the vehicle index is attached to each socket)
+        self.selector = selectors.DefaultSelector()
+        for i, px4 in enumerate(self.PX4):
+            self.selector.register(px4.fileno(), selectors.EVENT_READ, i)
+
+        # Create an object to simulate the dynamics of all of the vehicles at once
+        self.swarm = SWARM.swarm_dynamics(params_list)
+        # Seed of the run (set SIM_SEED to this value to repeat the same noise)
+        print(f"\33[94m[swarm_sim] Random seed: {self.swarm.rng.seed}\33[0m")
+
+        # Create the clock that hands the same fixed time step to every simulated subsystem
+        self.clock = CLK.sim_clock(self.step_hz, self.clock_mode, self.speed_factor)
+
+        # Timers to control the frequency of communication with px4 (shared by all of the vehicles)
+        self.timer_sys_time = TIM.timer(period=4)
+        self.timer_heart_beat = TIM.timer(period=1)
+        # Simulated data is timed with the simulation clock
+        self.timer_sensors = TIM.timer(frequency=self.sens_hz, slip_correction=True, clock=self.clock)
+        self.timer_gps = TIM.timer(frequency=self.gps_hz, slip_correction=True, clock=self.clock)
+        self.timer_gt = TIM.timer(frequency=self.gt_hz, enabled=self.gt_en, slip_correction=True, clock=self.clock)
+        self.timer_print = TIM.timer(frequency=self.print_hz, enabled=self.print_en)
+
+        # Actuator PWMs of all of the vehicles, one row per vehicle
+        self.actuator_commands = np.zeros((self.n, self.swarm.act_max))
+        # Flags indicating which vehicles sent new actuator controls since the last step
+        self.updated = np.zeros(self.n, dtype=bool)
+        # Flags indicating which vehicles are running in lockstep (they already sent actuator controls)
+        self.lockstep_active = np.zeros(self.n, dtype=bool)
+
+
+    def custom_handler(self, signal, frame):
+        """
+        Cleanup function
+        """
+
+        print("\33[92mCtrl+C pressed. Running cleanup function\33[0m")
+        # Stop watching the connections
+        self.selector.close()
+
+        # Terminate the simulation
+        print("\33[92mExiting\33[0m")
+        exit()
+
+
+    def poll(self, timeout):
+        """
+        Wait for data on any of the connections, dispatch the received messages and collect the new actuator controls
+
+        Parameters:
+            timeout (float): Maximum time to wait for data, 0 to return immediately [s]
+        """
+
+        # Drain only the connections that have data available
+        for key, events in self.selector.select(timeout):
+            i = key.data
+            self.PX4[i].receive()
+            # Keep watching the right socket if the connection was reset
+            if self.PX4[i].fileno() != key.fd:
+                self.selector.unregister(key.fd)
+                self.selector.register(self.PX4[i].fileno(), selectors.EVENT_READ, i)
+
+        # Collect the newest actuator controls of each vehicle
+        for i, px4 in enumerate(self.PX4):
+            new, value = px4.take_actuator_controls()
+            if(new):
+                self.actuator_commands[i] = value[0:self.swarm.act_max]
+                self.updated[i] = True
+
+
+    def run(self):
+        """
+        Simulation main loop function
+        """
+
+        t0 = time.time()
+        # Start the loop
+        iteration = 0
+        while True:
+
+            # Increment iteration count
+            iteration += 1
+
+            # Check for new actuator controls from all of the PX4 instances
+            self.poll(0)
+
+            if(self.lockstep_active.any()):
+                # Wait for the actuator controls every vehicle in lockstep computes in response to the last sensor data
+                t_start = time.time()
+                while (self.lockstep_active & ~self.updated).any():
+                    remaining = self.lockstep_timeout - (time.time() - t_start)
+                    if remaining <= 0:
+                        break
+                    self.poll(remaining)
+                if (self.lockstep_active & ~self.updated).any():
+                    # Some PX4 instance did not answer in time, keep the heart beat without advancing the simulation
+                    if (self.timer_heart_beat.tick()):
+                        for px4 in self.PX4:
+                            px4.send_heart_beat()
+                    continue
+            elif(self.clock.is_lockstep()):
+                # Pace the simulation in real time while the PX4 instances are booting
+                self.clock.wait()
+
+            # Vehicles that sent actuator controls in lockstep mode start to wait for the simulation steps
+            if(self.clock.is_lockstep()):
+                self.lockstep_active = self.lockstep_active | self.updated
+            self.updated[:] = False
+
+            # Advance the simulation clock (waits for the wall time if required by the clock mode)
+            dt = self.clock.step()
+
+            # Timestamp of the simulated data (in lockstep mode PX4 follows the simulated time)
+            time_usec = self.clock.get_time_us() if self.clock.is_lockstep() else None
+
+            # Perform the dynamic model integration step of all of the vehicles
+            self.swarm.model_step(self.actuator_commands, dt)
+
+            # Send system time to PX4
+            if(self.timer_sys_time.tick()):
+                for px4 in self.PX4:
+                    px4.send_system_time(time_usec)
+
+            # Send heart beat to PX4
+            if (self.timer_heart_beat.tick()):
+                for px4 in self.PX4:
+                    px4.send_heart_beat()
+
+            # Send sensors data to PX4 (in lockstep mode, every step is answered with sensor data)
+            send_sensors = self.timer_sensors.tick()
+            if(send_sensors or self.lockstep_active.any()):
+                # Sample the sensors of all of the vehicles at once
+                acc, gyro, mag, bar = self.swarm.get_sensors()
+                for i, px4 in enumerate(self.PX4):
+                    if(send_sensors or self.lockstep_active[i]):
+                        px4.send_sensors(acc[i],gyro[i],mag[i],bar[i],time_usec)
+
+            # Send GPS data to PX4
+            if (self.timer_gps.tick()):
+                for i, px4 in enumerate(self.PX4):
+                    px4.send_gps(self.swarm.get_gps(i),time_usec)
+
+            # Send Ground Truth data to PX4 (for logging and comparison purposes)
+            if (self.timer_gt.tick()):
+                for i, px4 in enumerate(self.PX4):
+                    px4.send_ground_truth(self.swarm.get_ground_truth(i),time_usec)
+
+            # Print info
+            if (self.timer_print.tick()):
+                p, v, q, w = self.swarm.get_states()
+                status = self.swarm.get_status()
+                color = ['\33[92m','\33[91m','\33[93m']
+                print("\33[1mIteration:", iteration, "\33[0m")
+                print("\33[0m\33[97mSim time:", self.clock.get_time(), "\33[0m")
+                print("\33[0m\33[40mAverage freq:", iteration/(time.time()-t0), "\33[0m")
+                for i, px4 in enumerate(self.PX4):
+                    rx = px4.get_receive_stats()
+                    print(color[status[i]]+f"vehicle {i:2d} (port {px4.port}) status: {status[i]}  pos: {np.array2string(p[i], precision=2)}  bat: {self.swarm.bat_V[i]:.2f} V  dropped actuator cmds: {rx['actuator_dropped']}\33[0m")
+                print("\33[0m")
+
+
+    def load_parameters(self, params):
+        """
+        Load parameters for the PX4 simulation and store them in the instance variables
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
+        """
+
+        # Load parameters
+        sim = params.snapshot().sim
+        self.sens_hz = sim.sens_hz
+        self.gps_hz = sim.gps_hz
+        self.gt_en = sim.gt_en
+        self.gt_hz = sim.gt_hz
+        self.print_en = sim.print_en
+        self.print_hz = sim.print_hz
+        self.step_hz = sim.step_hz
+        self.clock_mode = sim.clock_mode
+        self.speed_factor = sim.speed_factor
+        self.lockstep_timeout = sim.lockstep_timeout
+        self.px4_port = sim.px4_port
+
+
+if __name__ == "__main__":
+    """
+    Multi-vehicle simulator main function
+
+    Parameters:
+        param_file_names (str): Full paths to the JSON config files, one per vehicle (the same file can be repeated)
+    """
+
+    # At least one parameter file is required
+    if len(sys.argv) < 2:
+        print("\33[91m[swarm_sim] Usage: swarm_sim.py params_vehicle_0.json [params_vehicle_1.json ...]\33[0m")
+        exit()
+    param_file_names = sys.argv[1:]
+    print(f"\33[94m[swarm_sim] Simulating {len(param_file_names)} vehicles\33[0m")
+
+    # Load one parameter file per vehicle
+    params_list = [PRM.parameter_server(name) for name in param_file_names]
+
+    # Create the simulator object
+    sim = swarm_sim(params_list)
+    # Spin the simulator
+    sim.run()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+# Monte Carlo and grid parameter sweeps
+# Runs the headless simulation for every sample of a set of parameter variations on a process pool and stores the summary metrics in one columnar file
+#
+# The sweep is described by a JSON file:
+# {
+#     "samples": 100,                 number of random draws for each combination of the grids (default 1)
+#     "seed": 0,                      seed of the random draws and of the sensor noise (default 0, the sample i uses SIM_SEED = seed + i)
+#     "duration": 5.0,                duration of each flight, if there is no commands file [s]
+#     "commands": "flight.csv",       optional file with the actuator commands (see headless.load_commands)
+#     "params": {
+#         "DYN_MASS": {"grid": [1.5, 2.0, 2.5]},
+#         "ACT*_TIME_CTE": {"uniform": [0.01, 0.05], "independent": true},
+#         "SENS_ACC_STD_*": {"normal": [0.01, 0.002]},
+#         "DYN_DRAG_V": {"choice": [0.1, 0.2]}
+#     }
+# }
+# The keys accept Unix shell wildcards. All of the parameters matched by a key share the same value, unless "independent" is true
+
+import sys
+import os
+import json
+import copy
+import fnmatch
+import itertools
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import parameter_server as PRM
+import headless as HDL
+
+
+# Supported distributions and the number of arguments of each one
+DISTRIBUTIONS = {'grid': None, 'uniform': 2, 'normal': 2, 'loguniform': 2, 'choice': None}
+
+# Summary metrics of each flight (see metrics)
+METRICS = ['final_x', 'final_y', 'final_z', 'max_alt', 'max_speed', 'max_tilt_deg', 'max_rate', 'takeoff_time', 'final_status', 'acc_z_std']
+
+# Base parameters loaded once by each worker process
+_worker_params = None
+
+
+def load_spec(file_name):
+    """
+    Load the description of the sweep
+
+    Parameters:
+        file_name (str): Path of the JSON file with the sweep description
+
+    Returns:
+        spec (dict): Sweep description
+    """
+
+    try:
+        with open(file_name, "r") as file:
+            spec = json.load(file)
+    except Exception as e:
+        print(f"\33[91m[sweep] Could not load the sweep file {file_name}: {str(e)}\33[0m")
+        exit()
+
+    # Validate the variations
+    for pattern, variation in spec.get('params', {}).items():
+        kinds = [kind for kind in variation if kind in DISTRIBUTIONS]
+        if len(kinds) != 1:
+            print(f"\33[91m[sweep] The variation of {pattern} must have exactly one of {list(DISTRIBUTIONS)}. Exiting.\33[0m")
+            exit()
+        n_args = DISTRIBUTIONS[kinds[0]]
+        if n_args is not None and len(variation[kinds[0]]) != n_args:
+            print(f"\33[91m[sweep] The {kinds[0]} variation of {pattern} needs {n_args} values. Exiting.\33[0m")
+            exit()
+
+    return spec
+
+
+def expand_keys(pattern, keys):
+    """
+    Get the parameters matched by a key with wildcards
+
+    Parameters:
+        pattern (str): Parameter name, possibly with Unix shell wildcards (e.g. ACT*_TIME_CTE)
+        keys (list of str): Names of all of the parameters
+
+    Returns:
+        (list of str): Sorted names of the matched parameters
+    """
+
+    matched = sorted(fnmatch.filter(keys, pattern))
+    if len(matched) == 0:
+        print(f"\33[91m[sweep] No parameter matches {pattern}. Exiting.\33[0m")
+        exit()
+
+    return matched
+
+
+def draw(variation, rng):
+    """
+    Draw one value of a random variation
+
+    Parameters:
+        variation (dict): Variation with one distribution (uniform, normal, loguniform or choice)
+        rng (<numpy.random.Generator>): Random number generator
+
+    Returns:
+        (float): Drawn value
+    """
+
+    if 'uniform' in variation:
+        return float(rng.uniform(*variation['uniform']))
+    if 'normal' in variation:
+        return float(rng.normal(*variation['normal']))
+    if 'loguniform' in variation:
+        low, high = variation['loguniform']
+        return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    return variation['choice'][rng.integers(len(variation['choice']))]
+
+
+def build_samples(spec, keys):
+    """
+    Build the list of samples of the sweep: the cartesian product of the grids, with "samples" random draws for each combination
+
+    Parameters:
+        spec (dict): Sweep description
+        keys (list of str): Names of all of the parameters of the base file
+
+    Returns:
+        samples (list of dict): Values of the swept parameters of each sample
+        columns (list of str): Names of the swept parameters
+    """
+
+    rng = np.random.default_rng(spec.get('seed', 0))
+    variations = spec.get('params', {})
+
+    # Parameters matched by each variation (the same parameter cannot be swept twice)
+    matched = {pattern: expand_keys(pattern, keys) for pattern in variations}
+    columns = [key for pattern in variations for key in matched[pattern]]
+    if len(set(columns)) != len(columns):
+        print(f"\33[91m[sweep] Some parameters are matched by more than one key. Exiting.\33[0m")
+        exit()
+
+    # Cartesian product of the grids
+    grid_patterns = [pattern for pattern in variations if 'grid' in variations[pattern]]
+    grid_points = itertools.product(*[variations[pattern]['grid'] for pattern in grid_patterns])
+
+    samples = []
+    for point in grid_points:
+        for i in range(spec.get('samples', 1)):
+            sample = {}
+            for pattern, value in zip(grid_patterns, point):
+                for key in matched[pattern]:
+                    sample[key] = value
+            for pattern, variation in variations.items():
+                if 'grid' in variation:
+                    continue
+                if variation.get('independent', False):
+                    for key in matched[pattern]:
+                        sample[key] = draw(variation, rng)
+                else:
+                    value = draw(variation, rng)
+                    for key in matched[pattern]:
+                        sample[key] = value
+            samples.append(sample)
+
+    return samples, columns
+
+
+def default_commands(dt, duration):
+    """
+    Commands used when the sweep has no commands file: take off, hover thrust and motors off for the last second
+
+    Parameters:
+        dt (float): Time step of the clock [s]
+        duration (float): Duration of the flight [s]
+
+    Returns:
+        (numpy.ndarray): Timed commands (rows of t, cmd0, ..., cmd7)
+    """
+
+    return np.array([[0.0] + [0.7]*8, [1.0] + [0.6]*8, [max(duration-1.0, 1.0)] + [0.0]*8, [duration] + [0.0]*8])
+
+
+def metrics(traces, dt):
+    """
+    Compute the summary metrics of a flight
+
+    Parameters:
+        traces (dict): Traces returned by headless_sim.run
+        dt (float): Time step of the clock [s]
+
+    Returns:
+        (dict): Summary metrics of the flight
+    """
+
+    p, v, q, w, status = traces['p'], traces['v'], traces['q'], traces['w'], traces['status']
+
+    # A flight without steps (e.g. commands that end at t <= 0) has no metrics
+    if len(status) == 0:
+        return {name: np.nan for name in METRICS}
+
+    # Tilt angle between the body and world vertical axes
+    tilt = np.degrees(np.arccos(np.clip(1 - 2*(q[:,1]**2 + q[:,2]**2), -1, 1)))
+    # Time of the first step in flight
+    flying = np.nonzero(status == 1)[0]
+
+    return {
+        'final_x': p[-1,0],
+        'final_y': p[-1,1],
+        'final_z': p[-1,2],
+        'max_alt': p[:,2].max(),
+        'max_speed': np.sqrt((v*v).sum(axis=1)).max(),
+        'max_tilt_deg': tilt.max(),
+        'max_rate': np.sqrt((w*w).sum(axis=1)).max(),
+        'takeoff_time': flying[0]*dt if len(flying) > 0 else np.nan,
+        'final_status': status[-1],
+        'acc_z_std': traces['acc'][:,2].std() if len(traces['acc']) > 1 else np.nan,
+    }
+
+
+def init_worker(param_file_name):
+    """
+    Initialize a worker process by loading the base parameters once
+
+    Parameters:
+        param_file_name (str): Path of the base JSON parameter file
+    """
+
+    global _worker_params
+    _worker_params = PRM.parameter_server(param_file_name)
+
+
+def run_sample(task):
+    """
+    Run the headless simulation of one sample (executed in the worker processes)
+
+    Parameters:
+        task (tuple): Index of the sample, values of the swept parameters, timed commands and seed
+
+    Returns:
+        index (int): Index of the sample
+        result (dict): Summary metrics of the flight
+    """
+
+    index, sample, commands, seed = task
+
+    # Apply the sample on a copy of the base parameters
+    params = copy.copy(_worker_params)
+    params.data = copy.deepcopy(_worker_params.data)
+    for key, value in sample.items():
+        params.set_parameter_value(key, value)
+
+    # Every sample has its own sensor noise streams, independent of the worker that runs it
+    params.set_parameter_value('SIM_SEED', seed + index)
+
+    t0 = time.perf_counter()
+    sim = HDL.headless_sim(params)
+    traces = sim.run(HDL.sample_commands(commands, sim.dt))
+    result = metrics(traces, sim.dt)
+    result['wall_time'] = time.perf_counter() - t0
+
+    return index, result
+
+
+def run_sweep(param_file_name, spec, workers=None):
+    """
+    Run all of the samples of a sweep on a process pool
+
+    Parameters:
+        param_file_name (str): Path of the base JSON parameter file
+        spec (dict): Sweep description
+        workers (int): Number of worker processes (by default, the number of CPUs)
+
+    Returns:
+        results (dict): Columnar results, one array per swept parameter and per metric (one element per sample)
+    """
+
+    base = PRM.parameter_server(param_file_name)
+    samples, columns = build_samples(spec, list(base.data.keys()))
+
+    # Commands of the flights
+    if 'commands' in spec:
+        commands = HDL.load_commands(spec['commands'])
+    else:
+        commands = default_commands(1.0/base.get_parameter_value('SIM_STEP_HZ'), spec.get('duration', 5.0))
+
+    seed = spec.get('seed', 0)
+    tasks = [(i, sample, commands, seed) for i, sample in enumerate(samples)]
+    if len(tasks) == 0:
+        print(f"\33[91m[sweep] The sweep has no samples (check \"samples\" and the grids). Exiting.\33[0m")
+        exit()
+    print(f"\33[94m[sweep] Running {len(tasks)} samples of {len(columns)} parameters\33[0m")
+
+    # Run the samples on the process pool
+    outputs = [None]*len(tasks)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(param_file_name,)) as executor:
+        chunksize = max(1, len(tasks)//(4*(workers or os.cpu_count() or 1)))
+        for index, result in executor.map(run_sample, tasks, chunksize=chunksize):
+            outputs[index] = result
+
+    # Store the results by column
+    results = {'sample': np.arange(len(samples))}
+    for key in columns:
+        results[key] = np.array([sample[key] for sample in samples])
+    for name in outputs[0]:
+        results[name] = np.array([output[name] for output in outputs])
+
+    return results
+
+
+
+if __name__ == "__main__":
+    """
+    Sweep main function
+
+    Parameters:
+        param_file_name (str): Base JSON parameter file
+        sweep_file_name (str): JSON file with the sweep description
+        output_file_name (str): Output file with the columnar results (.npz)
+        workers (int): Number of worker processes (optional)
+    """
+
+    if len(sys.argv) < 4:
+        print("\33[91m[sweep] Usage: sweep.py sim_params.json sweep.json results.npz [workers]\33[0m")
+        exit()
+    param_file_name = sys.argv[1]
+    spec = load_spec(sys.argv[2])
+    output_file_name = sys.argv[3]
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    t0 = time.perf_counter()
+    results = run_sweep(param_file_name, spec, workers)
+    print(f"\33[94m[sweep] {len(results['sample'])} samples in {time.perf_counter()-t0:.1f} s\33[0m")
+
+    np.savez_compressed(output_file_name, **results)
+    print(f"\33[92m[sweep] Saved results: {output_file_name}\33[0m")
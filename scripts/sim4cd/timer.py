@@ -10,17 +10,24 @@ class timer:
     Class that represents a timer
     """
 
-    def __init__(self, frequency=None, period=None, slip_correction=False, enabled=True):
+    def __init__(self, frequency=None, period=None, slip_correction=False, enabled=True, clock=None):
         """
         Constructor for the timer class
 
         Parameters:
             frequency (float): Frequency of the timer
             period (float): Period of the timer
-            slip_correction (bool): Correct for time slip (True) or not (False) [Not implemented yet]
+            slip_correction (bool): Correct for time slip (True) or not (False)
             enabled (bool): Enable (True) the timer or not (False)
+            clock (<clock.sim_clock>): Simulation clock used as time source (wall time is used if None)
         """
 
+        # Define the time source of the timer
+        if clock is None:
+            self.get_time = time.time
+        else:
+            self.get_time = clock.get_time
+
         if frequency is None and period is None:
             print("\33[91mTimer was not initialized with any value. Exiting.\33[0m")
             exit()
@@ -37,13 +44,14 @@ class timer:
             print("\33[93mTimer ignoring value of period and using the provided frequency.\33[0m")
 
         # Save the current time (or, last time a method was called)
-        self.time = time.time()
+        self.time = self.get_time()
 
         # Initialize the last time that the time ticked
         self.last_tick = -1
 
         # Save the time slip variable
         self.slip = 0.0
+        self.slip_correction = slip_correction
 
         # Save the time the timer was created
         self.t_born = self.time
@@ -63,10 +71,14 @@ class timer:
         if (not self.en):
             return False
 
-        self.time = time.time()
-        if(self.time - self.last_tick > self.T):
+        self.time = self.get_time()
+        if(self.time - self.last_tick >= self.T):
             self.slip = self.time - self.last_tick - self.T
-            self.last_tick = self.time
+            # Discount the slip from the next period so the average frequency is kept
+            if(self.slip_correction and self.slip < self.T):
+                self.last_tick = self.time - self.slip
+            else:
+                self.last_tick = self.time
             return True
         else:
             return False
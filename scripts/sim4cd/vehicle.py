@@ -4,12 +4,12 @@
 # Vehicle geometry definition
 # Responsible to compute the collective action of a set of actuators arranged in a given geometric distribution
 
-import time
 import numpy as np
 
 import actuators as ACT
 import math_utils as MU
 import battery as BAT
+import param_snapshot as SNAP
 
 class vehicle_geometry:
     """
@@ -24,9 +24,6 @@ class vehicle_geometry:
             params (<parameter_server.parameter_server>): Parameter server object
         """
 
-        self.cmds = [0, 0, 0, 0] # List of the PWM commands for the actuators
-        self.forces = [0, 0, 0, 0] # List of forces being exercised by each actuator
-        self.torques = [0, 0, 0, 0] # List of torques being exercised by each actuator
         self.total_force = np.array([0, 0, 0]) # Collective force vector exercised by the actuators
         self.total_torque = np.array([0, 0, 0]) # Collective torque vector exercised by the actuators
 
@@ -39,26 +36,24 @@ class vehicle_geometry:
         # Load model parameters
         self.load_parameters(params)
 
-        # Create the actuator objects and store them in a list
-        self.actuators = []
-        for i in range(self.act_num):
-            self.actuators.append(ACT.prop_actuator(params, i))
+        self.cmds = np.zeros(self.act_num) # PWM commands for the actuators
+
+        # Create the bank that simulates all of the actuators at once
+        self.actuators = ACT.actuator_bank(params, self.positions, self.directions)
 
         # Create the battery object
         self.battery = BAT.battery(params)
         # Initiate the current used by the set of actuators
         self.I_actuators = 0
 
-        # Initialize the last time variable for time step computation
-        self.last_time = time.time()
-
 
-    def vehicle_sim_step(self, cmds_):
+    def vehicle_sim_step(self, cmds_, dt):
         """
-        Constructor for the vehicle_geometry class
+        Perform the simulation step of the set of actuators and the battery
 
         Parameters:
             cmds_ (list): List of PWM values (from 0 to 1) for the actuators
+            dt (float): Time step given by the simulation clock [s]
 
         Returns:
             self.total_force (numpy.ndarray): Collective force the vehicle is receiving from the actuators [N]
@@ -66,37 +61,14 @@ class vehicle_geometry:
         """
 
         # Set the received command
-        self.cmds = cmds_
-
-        # Compute the simulation time step
-        time_now = time.time()
-        dt = time_now-self.last_time
-        self.last_time = time_now
-        # Reset actuator it it was not receiving commands for a while TODO: check necessity
-        if(dt > 1):
-            self.reset()
-        
+        self.cmds = np.asarray(cmds_[0:self.act_num], dtype=float)
+
         # Compute the voltage of the battery based on the current being consumed by the actuators
-        V = self.battery.battery_sim_step(self.I_actuators)
-
-        # Compute the forces and torques generated by each actuator
-        I = 0
-        for i, act in enumerate(self.actuators):
-            self.forces[i], self.torques[i] = self.actuators[i].actuator_sim_step(self.cmds[i], V)
-            I = I + act.current_map()
-        self.I_actuators = I
-        
-        # Initialize the computation of the collective force and torque
-        self.total_force = np.array([0, 0, 0])
-        self.total_torque = np.array([0, 0, 0])
-        # Include the contribution of each actuator to the collective force and torque
-        for i, act in enumerate(self.actuators):
-            # Include vehicles body force generated by the actuator force
-            self.total_force = self.total_force + self.forces[i]*self.directions[i]
-            # Include vehicles body torque generated by the actuator force
-            self.total_torque = self.total_torque + self.forces[i]*np.cross(self.positions[i],self.directions[i])
-            # Include vehicles body torque generated by the actuator torque
-            self.total_torque = self.total_torque + self.torques[i]*self.directions[i]
+        V = self.battery.battery_sim_step(self.I_actuators, dt)
+
+        # Compute the collective force and torque generated by the actuators (all of them in one vectorized pass)
+        self.total_force, self.total_torque = self.actuators.sim_step(self.cmds, V, dt)
+        self.I_actuators = self.actuators.get_total_current()
 
         # Return the collective force and torque the vehicle is receiving from the actuators
         return self.total_force, self.total_torque
@@ -113,11 +85,8 @@ class vehicle_geometry:
             Tg (numpy.ndarray): Torque in th body frame that represents the gyroscopic effect [Nm]
         """
 
-        # Initialize the Tg variable
-        Tg = np.array([0, 0, 0])
-        # Account for the effect of each actuator
-        for i, act in enumerate(self.actuators):
-            Tg = Tg + (-act.get_angular_momentum()*np.cross(omega,self.directions[0]))
+        # Account for the effect of all of the actuators
+        Tg = self.actuators.gyroscopic_torque(omega)
 
         return Tg
 
@@ -130,30 +99,50 @@ class vehicle_geometry:
             params (<parameter_server.parameter_server>): Parameter server object that contains the values of interest
         """
 
-        self.act_num = params.get_parameter_value('VEH_ACT_NUM')
+        veh = params.snapshot().vehicle
+        self.act_num = veh.act_num
         
-        self.positions = []
-        self.directions = []
-        for i in range(self.act_num):
-            self.positions.append(np.array([]))
-            self.directions.append(np.array([]))
-            for d in ['X','Y','Z']:
-                self.positions[i] = np.append(self.positions[i], params.get_parameter_value(f'VEH_ACT{i}_POS_{d}'))
-                self.directions[i] = np.append(self.directions[i], params.get_parameter_value(f'VEH_ACT{i}_DIR_{d}'))
+        # Positions and directions of the actuators, shape (act_num,3)
+        self.positions = veh.positions.copy()
+        self.directions = veh.directions.copy()
 
         # Make sure all of the directions are unit norm vectors
         for i in range(self.act_num):
             self.directions[i] = MU.normalize(self.directions[i])
 
 
+    def reload_parameters(self, params, keys):
+        """
+        Apply new values of the parameters of the actuators, of their geometry and of the battery, keeping their states
+
+        Parameters:
+            params (<parameter_server.parameter_server>): Parameter server object with the new values
+            keys (list of str): Names of the parameters that changed
+        """
+
+        groups = SNAP.key_groups(keys)
+
+        # Actuator curves and time constants
+        if len(groups & {'actuators', 'vehicle'}) > 0:
+            self.actuators.load_parameters(params)
+
+        # Positions and directions of the actuators (the number of actuators can not change)
+        if 'vehicle' in groups:
+            self.load_parameters(params)
+            self.actuators.set_geometry(self.positions, self.directions)
+
+        # Battery model, including the idle current of the power system (the charge is kept)
+        if 'battery' in groups:
+            self.battery.load_parameters(params)
+
+
     def reset(self):
         """
         Reset the forces the vehicles actuators are producing
         """
 
         # Reset actuators
-        for i, act in enumerate(self.actuators):
-            self.actuators[i].reset()
+        self.actuators.reset()
         
         # Reset total force and torque
         self.total_force = np.array([0, 0, 0])
@@ -195,14 +184,14 @@ class vehicle_geometry:
 
     def get_actuators_positions(self):
         """
-        Get a list with the angular positions of the actuators
+        Get the angular positions of the actuators
         
         Returns:
-            self.total_torque (numpy.ndarray): Collective torque vector the actuators are exercising [Nm]
+            ang_pos_list (numpy.ndarray): Angular position of each actuator [rad]
         """
 
-        ang_pos_list = [a.get_angular_position() for a in self.actuators]
-        
+        ang_pos_list = self.actuators.position
+
         return ang_pos_list
 
 
@@ -215,7 +204,7 @@ class vehicle_geometry:
         """
 
         # Add the acceleration noise induced by all of the actuators
-        acc_combined_noise = sum(a.acc_induced_noise() for a in self.actuators)
+        acc_combined_noise = self.actuators.acc_induced_noise()
 
         return acc_combined_noise # [m/s2]
 
@@ -229,7 +218,7 @@ class vehicle_geometry:
         """
 
         # Add the angular speed noise induced by all of the actuators
-        gyro_combined_noise = sum(a.gyro_induced_noise() for a in self.actuators)
+        gyro_combined_noise = self.actuators.gyro_induced_noise()
 
         return gyro_combined_noise
 
@@ -243,7 +232,7 @@ class vehicle_geometry:
         """
 
         # Add the current being consumed by all of the actuators
-        total_current = sum(a.current for a in self.actuators)
+        total_current = self.actuators.get_total_current()
 
         return total_current
 